@@ -9,9 +9,13 @@ import time
 import functools
 
 from common import (check_file_exists, idemp_mkdir, invoke_main, get_timestamp,
-                    prepare_out_file, read_json, write_json, read_config, validate_json, print_log)
+                    prepare_out_file, read_json, write_json, read_config, validate_json, print_log,
+                    render_exception)
 from dashboard_info import DashboardInfo
 from telemetry_util import start_telemetry, process_telemetry_statistics
+from calibration_util import summarize_calibration
+from results_store import append_data_file
+from series_cache import update_series_cache
 
 
 def validate_status(dirname):
@@ -32,6 +36,37 @@ def build_tvm_branch(remote, branch):
                     cwd=bash_deps)
 
 
+def run_calibration(tmp_data_dir, exp_name, stage, cores=None):
+    """
+    Runs the machine calibration suite (see calibration_util), pinned
+    to the same cores as the experiment if it is pinned, and writes the
+    results to the experiment's temporary data directory
+    """
+    calibration_dir = os.path.join(tmp_data_dir, exp_name, 'calibration')
+    script = os.path.join(os.environ['BENCHMARK_DEPS'], 'python', 'calibration_util.py')
+    command = ['python3', script, '--output-dir', calibration_dir, '--stage', stage]
+    if cores:
+        command = ['taskset', '--cpu-list', f'{cores}'] + command
+    subprocess.call(command)
+
+
+def read_calibration(exp_data_dir):
+    """
+    Returns the summary of the calibration runs around an experiment
+    (None if there were none); a stage that failed is skipped
+    """
+    calibration_dir = os.path.join(exp_data_dir, 'calibration')
+    stages = {}
+    for stage in ('before', 'after'):
+        stages[stage] = None
+        if check_file_exists(calibration_dir, f'{stage}.json'):
+            try:
+                stages[stage] = read_json(calibration_dir, f'{stage}.json')
+            except Exception:
+                pass
+    return summarize_calibration(stages['before'], stages['after'])
+
+
 def get_tvm_hash():
     tvm_home = os.environ['TVM_HOME']
     git_check = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
@@ -122,7 +157,8 @@ def target_precheck(root_dir, configs_dir, target_name,
     return ({'success': True, 'message': ''}, target_info)
 
 
-def experiment_precheck(info, experiments_dir, exp_name, default_telemetry_rate, run_cpu_telemetry, run_gpu_telemetry):
+def experiment_precheck(info, experiments_dir, exp_name, default_telemetry_rate, run_cpu_telemetry, run_gpu_telemetry,
+                        run_calibration=False):
     return target_precheck(
         experiments_dir, info.exp_configs, exp_name,
         {
@@ -134,6 +170,7 @@ def experiment_precheck(info, experiments_dir, exp_name, default_telemetry_rate,
             'telemetry_rate': default_telemetry_rate,
             'run_cpu_telemetry': run_cpu_telemetry,
             'run_gpu_telemetry': run_gpu_telemetry,
+            'run_calibration': run_calibration,
             'process_pinning': {
                 'enable': False,
                 'cores': None
@@ -303,7 +340,18 @@ def analyze_experiment(info, experiments_dir, tmp_data_dir,
             dump_data.update(read_json(tmp_analysis_dir, 'data.json'))
             # fetch time spent on the experiment
             dump_data.update(get_timing_info(info, exp_name))
-            write_json(analyzed_data_dir, 'data_{}.json'.format(date_str), dump_data)
+            calibration = read_calibration(exp_data_dir)
+            if calibration is not None:
+                dump_data['calibration'] = calibration
+            data_file = 'data_{}.json'.format(date_str)
+            write_json(analyzed_data_dir, data_file, dump_data)
+            # the file is picked up by the store and the series cache on
+            # their next reads anyway, so a failure here only gets logged
+            try:
+                append_data_file(analyzed_data_dir, data_file)
+                update_series_cache(info.exp_series_dir(exp_name), analyzed_data_dir)
+            except Exception as e:
+                print_log(f'Could not index the data of {exp_name}:\n{render_exception(e)}')
     
     info.report_exp_status(exp_name, 'analysis', status)
     return status['success']
@@ -355,7 +403,8 @@ def summarize_experiment(info, experiments_dir, exp_name):
 def run_all_experiments(info, experiments_dir, setup_dir,
                         tmp_data_dir, data_archive,
                         time_str, telemetry_script_dir, 
-                        run_cpu_telemetry=False, run_gpu_telemetry=False, telemetry_interval=15, randomize=True):
+                        run_cpu_telemetry=False, run_gpu_telemetry=False, telemetry_interval=15, randomize=True,
+                        run_calibration_suite=False):
     """
     Handles logic for setting up and running all experiments.
     """
@@ -369,7 +418,8 @@ def run_all_experiments(info, experiments_dir, setup_dir,
     # either inactive or invalid
     for exp_name in info.all_present_experiments():
         precheck, exp_info = experiment_precheck(info, experiments_dir, exp_name, telemetry_interval,
-                                                    run_cpu_telemetry, run_gpu_telemetry)
+                                                    run_cpu_telemetry, run_gpu_telemetry,
+                                                    run_calibration_suite)
         info.report_exp_status(exp_name, 'precheck', precheck)
         exp_status[exp_name] = 'active'
         exp_confs[exp_name] = exp_info
@@ -430,9 +480,14 @@ def run_all_experiments(info, experiments_dir, setup_dir,
                                                 exp_run_gpu_telemetry,
                                                 tmp_data_dir,
                                                 interval=telemetry_interval) if run_telemetry else None
+        calibrate = exp_confs[exp]['run_calibration']
+        if calibrate:
+            run_calibration(tmp_data_dir, exp, 'before', cores=cores)
         success = run_experiment(info, experiments_dir, tmp_data_dir, exp,
                                  pin_process=pin_process, cores=cores,
                                 run_cpu_telemetry=exp_run_cpu_telemetry, run_gpu_telemetry=exp_run_gpu_telemetry)
+        if calibrate:
+            run_calibration(tmp_data_dir, exp, 'after', cores=cores)
         # Telemetry can be disabled
         if run_telemetry and telemetry_process:
             telemetry_process.kill()
@@ -557,6 +612,7 @@ def main(home_dir, experiments_dir, subsystem_dir, telemetry_script_dir):
 
     # directories whose contents should not change between runs of the dashboard
     persistent_dirs = {info.exp_data,
+                       info.exp_series,
                        info.exp_configs,
                        info.subsys_configs,
                        info.subsys_output}
@@ -575,11 +631,15 @@ def main(home_dir, experiments_dir, subsystem_dir, telemetry_script_dir):
     telemetry_rate = dash_config.get('telemetry_rate', 15)
     run_cpu_telemetry = dash_config.get('run_cpu_telemetry', False)
     run_gpu_telemetry = dash_config.get('run_gpu_telemetry', False)
+    run_calibration_suite = dash_config.get('run_calibration', False)
     run_all_experiments(info, experiments_dir, setup_dir,
                         tmp_data_dir, data_archive,
                         time_str, telemetry_script_dir, run_cpu_telemetry=run_cpu_telemetry, run_gpu_telemetry=run_gpu_telemetry,
-                        telemetry_interval=telemetry_rate, randomize=randomize_exps)
+                        telemetry_interval=telemetry_rate, randomize=randomize_exps,
+                        run_calibration_suite=run_calibration_suite)
 
+    # for subsystems that rerun experiments (e.g., stat_alert's confirmation reruns)
+    os.environ['EXPERIMENTS_DIR'] = experiments_dir
     run_all_subsystems(info, subsystem_dir, time_str)
 
 
@@ -1,5 +1,5 @@
 from validate_config import validate
-from exp_templates import analysis_template
+from exp_templates import analysis_template, common_sweep_dims
 
 
 def generate_listing_settings(config):
@@ -30,8 +30,8 @@ def generate_data_query(config, dev, settings):
     special_fields = settings[1]
 
     num_reps = config['n_inputs']
-    inp = list(config['inputs'])[0]
-    hidden_size = list(config['hidden_sizes'])[0]
+    inp = sorted(config['inputs'])[0]
+    hidden_size = sorted(config['hidden_sizes'])[0]
 
     base_fields = ['device']
     relay_fields = ['configuration', 'method']
@@ -53,4 +53,6 @@ def generate_data_query(config, dev, settings):
 
 if __name__ == '__main__':
     analysis_template(validate, generate_listing_settings,
-                      generate_data_query, use_networks=False)
+                      generate_data_query, use_networks=False,
+                      sweep_dims=common_sweep_dims([('hidden_size', 'hidden_sizes'),
+                                                    ('input', 'inputs')]))
@@ -7,6 +7,8 @@ from tvm.relay import create_executor
 from tvm.relay.prelude import Prelude
 import aot
 
+from setup_stats_util import track
+
 def initialize(param):
     ty = param.type_annotation
     shape = [int(i) for i in ty.shape]
@@ -42,10 +44,11 @@ class Network:
         forward_compute = relay.Function(inputs + list([p[0] for p in self.parameters]), body, ret_type)
         self.mod[self.forward_var] = forward_compute
         self.mod['main'] = self.mod[self.forward_var]
-        if do_aot:
-            self.forward = aot.compile(self.forward_var, self.mod, ctx=self.context, tgt=self.target)
-        else:
-            self.forward = self.executor.evaluate(self.forward_var)
+        with track('compile'):
+            if do_aot:
+                self.forward = aot.compile(self.forward_var, self.mod, ctx=self.context, tgt=self.target)
+            else:
+                self.forward = self.executor.evaluate(self.forward_var)
         self.args = [None] * len(inputs) + list([p[1] for p in self.parameters])
 
     def __call__(self, *inputs):
@@ -1,5 +1,9 @@
+import numpy as np
+
 from validate_config import validate
-from exp_templates import analysis_template
+from exp_templates import analysis_template, common_sweep_dims
+from analysis_util import load_trial_table
+from run_interleaved import interleave_enabled
 
 def generate_listing_settings(config):
     frameworks = config['frameworks']
@@ -34,19 +38,67 @@ def generate_data_query(config, dev, network, settings):
     special_fields = settings[1]
 
     num_reps = config['n_inputs']
-    batch_size = list(config['batch_sizes'])[0]
+    batch_size = sorted(config['batch_sizes'])[0]
+    # the main comparison uses the most threads in the sweep
+    threads = max(config['threads'])
 
-    fields = (['network', 'device', 'batch_size', *list(special_fields.keys())])
+    fields = (['network', 'device', 'batch_size', *list(special_fields.keys()), 'threads'])
     field_values = {
         'network': network,
         'device': dev,
         'batch_size': batch_size,
-        **special_fields
+        **special_fields,
+        'threads': threads
     }
 
     return [fw, 'cnn_comp', num_reps, fields, field_values]
 
 
+def rep_means(data_dir, query):
+    fw, task, num_reps, fields, field_values = query
+    return load_trial_table(data_dir, fw, task, fields).rep_means(field_values, num_reps)
+
+
+def paired_speedups(config, data_dir, ret):
+    """
+    When the frameworks were measured in interleaved rounds, rep r of
+    every framework was measured back to back, so we compare each
+    framework to Relay round by round (mean of the per-round ratios)
+    rather than as a ratio of overall means, which cancels out drift
+    that affects both in a given round. Only rounds in which both were
+    measured count; a listing with no such round (e.g., one left out
+    by trial_filter) gets no paired speedup
+    """
+    if not interleave_enabled(config) or 'relay' not in config['frameworks']:
+        return
+
+    listing_settings = generate_listing_settings(config)
+    ret['paired_speedup'] = {}
+    for dev in config['devices']:
+        ret['paired_speedup'][dev] = {}
+        for network in config['networks']:
+            relay_means = rep_means(
+                data_dir, generate_data_query(config, dev, network,
+                                              listing_settings['Relay']))
+            for listing, settings in listing_settings.items():
+                if listing == 'Relay':
+                    continue
+                fw_means = rep_means(
+                    data_dir, generate_data_query(config, dev, network, settings))
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ratios = fw_means / relay_means
+                ratios = ratios[np.isfinite(ratios)]
+                if not len(ratios):
+                    continue
+                ret['paired_speedup'][dev].setdefault(listing, {})[network] = \
+                    float(np.mean(ratios))
+
+
+
+
 if __name__ == '__main__':
     analysis_template(validate, generate_listing_settings,
-                      generate_data_query, use_networks=True)
+                      generate_data_query, use_networks=True,
+                      extra_analysis=paired_speedups,
+                      sweep_dims=common_sweep_dims([('batch_size', 'batch_sizes'),
+                                                    ('threads', 'threads')]))
@@ -2,8 +2,10 @@ from validate_config import validate
 from exp_templates import visualize_template, common_individual_comparison
 
 
+def generate_comparisons(config, data, output_dir):
+    common_individual_comparison(
+        'Framework', 'CNN Comparison', 'cnns', use_networks=True)(config, data, output_dir)
+
+
 if __name__ == '__main__':
-    visualize_template(
-        validate,
-        common_individual_comparison(
-            'Framework', 'CNN Comparison', 'cnns', use_networks=True))
+    visualize_template(validate, generate_comparisons)
@@ -7,6 +7,9 @@ source $BENCHMARK_DEPS/bash/common.sh
 include_shared_python_deps
 add_to_pythonpath $(pwd)
 
+# if "interleave" is enabled in the config, all frameworks are measured
+# here in alternating rounds and the per-framework scripts below exit early
+python_run_trial "run_interleaved.py" $config_dir $data_dir
 python_run_trial "run_relay.py" $config_dir $data_dir
 python_run_trial "run_mxnet.py" $config_dir $data_dir
 python_run_trial "run_pt.py" $config_dir $data_dir
@@ -0,0 +1,234 @@
+"""
+Interleaved cross-framework runner for cnn_comp.
+
+Instead of measuring each framework in its own script back to back,
+keeps one warm worker process per framework (each holding the network
+it set up with its cnn_setup) and alternates measurement rounds between
+them for the same network, so machine drift over the night affects all
+frameworks alike. Round r of every framework is written as rep r, so
+the reps of different frameworks form time-paired samples.
+
+Writes the same CSVs the per-framework scripts do, including the setup
+records (see setup_stats_util), and honors trial_filter; when
+interleaving is enabled in the config, those scripts exit early. The
+other trial options (isolation, throughput, resume_trials, op_profile)
+are rejected by validate_config along with interleaving.
+
+This module is imported again by every (spawned) worker, so it must not
+import any framework itself: each worker only imports the one it runs.
+"""
+import csv
+import os
+import random
+from itertools import product
+
+from validate_config import validate, interleave_enabled
+from common import invoke_main, write_status, render_exception
+from trial_util import configure_seed, run_rep, filter_combos
+from process_util import Worker
+from setup_stats_util import start_recording, setting_up
+
+# framework -> (module with cnn_setup/cnn_trial/cnn_teardown, parameter names,
+#               frameworks to seed; see trial_util.set_seed)
+FRAMEWORKS = {
+    'relay': ('run_relay', ['network', 'device', 'batch_size', 'opt_level', 'threads'], ()),
+    'mxnet': ('run_mxnet', ['network', 'device', 'batch_size', 'threads'], ('mxnet',)),
+    'pt': ('run_pt', ['network', 'device', 'batch_size', 'threads'], ('torch',)),
+    'tf': ('run_tf', ['network', 'device', 'batch_size', 'enable_xla', 'threads'],
+           ('tensorflow',))
+}
+
+# worker-side state: the imported framework module and the current trial args
+_WORKER_STATE = {}
+
+
+def interleaved_early_exit(fw):
+    """
+    Early exit for the per-framework scripts: they should not run
+    if the framework is not configured or the interleaved runner
+    takes care of the measurements
+    """
+    def early_exit(config):
+        if fw not in config['frameworks']:
+            return True, '{} not in config frameworks'.format(fw)
+        if interleave_enabled(config):
+            return True, '{} measured by the interleaved runner'.format(fw)
+        return False, ''
+    return early_exit
+
+
+class _RowCollector:
+    """Stands in for a csv writer, keeping the rows to send back"""
+    def __init__(self):
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+def _framework_worker(msg, send):
+    """Runs in a worker process; see Worker for the protocol"""
+    cmd = msg[0]
+    try:
+        if cmd == 'init':
+            fw, device, config, output_dir = msg[1:]
+            if fw == 'tf':
+                # TF places ops on the GPU whenever it can see one
+                os.environ['CUDA_VISIBLE_DEVICES'] = '0' if device == 'gpu' else ''
+            module = __import__(FRAMEWORKS[fw][0])
+            _WORKER_STATE['module'] = module
+            configure_seed(config, FRAMEWORKS[fw][2])
+            # the parent cleared the files from earlier runs
+            start_recording(output_dir, fw, 'cnn_comp', FRAMEWORKS[fw][1], append=True)
+            send(('ok',))
+        elif cmd == 'setup':
+            args = msg[1]
+            _WORKER_STATE['args'] = args
+            # one setup serves every round, so its records go under rep 0
+            with setting_up(args, 0):
+                _WORKER_STATE['trial_args'] = _WORKER_STATE['module'].cnn_setup(*args)
+            send(('ok',))
+        elif cmd == 'measure':
+            rep, n_times, dry_run, fieldnames = msg[1:]
+            writer = _RowCollector()
+            cost = run_rep(rep, _WORKER_STATE['module'].cnn_trial,
+                           _WORKER_STATE['trial_args'], _WORKER_STATE['args'],
+                           n_times, dry_run, writer, fieldnames)
+            send(('ok', writer.rows, cost))
+        elif cmd == 'teardown':
+            _WORKER_STATE['module'].cnn_teardown(*_WORKER_STATE['trial_args'])
+            del _WORKER_STATE['trial_args']
+            send(('ok',))
+    except Exception as e:
+        send(('error', 'Exception in {} worker:\n{}'.format(cmd, render_exception(e))))
+
+
+def _request(worker, *msg):
+    worker.send(msg)
+    reply = worker.recv()
+    if reply[0] == 'error':
+        raise RuntimeError(reply[1])
+    return reply
+
+
+def gen_participants(config):
+    """
+    Returns a list of (name, framework, extra setup args) for every
+    listing to be measured; TF with and without XLA are separate
+    participants. Raises an exception if a framework cannot be
+    interleaved, since its own script would not measure it either
+    """
+    unsupported = sorted(set(config['frameworks']) - set(FRAMEWORKS.keys()))
+    if unsupported:
+        raise ValueError('Frameworks {} cannot be interleaved; '
+                         'disable interleaving to measure them'.format(unsupported))
+    participants = []
+    for fw in sorted(config['frameworks']):
+        if fw == 'relay':
+            participants.append(('relay', fw, [config['relay_opt']]))
+        elif fw == 'tf':
+            participants.append(('tf', fw, [False]))
+            if config['use_xla']:
+                participants.append(('tf_xla', fw, [True]))
+        else:
+            participants.append((fw, fw, []))
+    return participants
+
+
+def _wanted(config, args):
+    """Whether a participant's setup args pass the config's trial_filter"""
+    if config.get('trial_filter') is None:
+        return True
+    ranges = [config['networks'], config['devices'], config['batch_sizes']] + \
+             [[arg] for arg in args[3:-1]] + [config['threads']]
+    return bool(filter_combos(ranges, [args], config['trial_filter']))
+
+
+def run_interleaved(config, output_dir):
+    interleave = config['interleave']
+    randomize = interleave.get('randomize', True)
+    dry_run, n_times, n_rounds = (config['dry_run'],
+                                  config['n_times_per_input'],
+                                  config['n_inputs'])
+
+    files = {}
+    writers = {}
+    try:
+        participants = gen_participants(config)
+        for fw in {fw for (_, fw, _) in participants}:
+            fieldnames = FRAMEWORKS[fw][1] + ['rep', 'run', 'time']
+            files[fw] = open(os.path.join(output_dir, '{}-cnn_comp.csv'.format(fw)),
+                             'w', newline='')
+            writers[fw] = csv.DictWriter(files[fw], fieldnames=fieldnames)
+            writers[fw].writeheader()
+            # clears the setup records of earlier runs; the workers append to them
+            start_recording(output_dir, fw, 'cnn_comp', FRAMEWORKS[fw][1])
+
+        for dev in sorted(config['devices']):
+            # one warm worker per participant, in a fresh interpreter so
+            # each framework is imported (and configured) on its own
+            workers = {}
+            try:
+                for (name, fw, _) in participants:
+                    workers[name] = Worker(_framework_worker, context='spawn')
+                    _request(workers[name], 'init', fw, dev, config, output_dir)
+
+                for (network, batch_size, threads) in product(sorted(config['networks']),
+                                                              sorted(config['batch_sizes']),
+                                                              sorted(config['threads'])):
+                    active = [(name, fw, extra) for (name, fw, extra) in participants
+                              if _wanted(config, [network, dev, batch_size, *extra, threads])]
+                    if not active:
+                        continue
+                    for (name, fw, extra) in active:
+                        _request(workers[name], 'setup',
+                                 [network, dev, batch_size, *extra, threads])
+
+                    costs = {name: [] for (name, _, _) in active}
+                    order = list(active)
+                    for rnd in range(n_rounds):
+                        if randomize:
+                            random.shuffle(order)
+                        for (name, fw, _) in order:
+                            fieldnames = FRAMEWORKS[fw][1] + ['rep', 'run', 'time']
+                            _, rows, cost = _request(workers[name], 'measure',
+                                                     rnd, n_times, dry_run, fieldnames)
+                            for row in rows:
+                                writers[fw].writerow(row)
+                            costs[name].append(cost)
+
+                    for (name, _, _) in active:
+                        _request(workers[name], 'teardown')
+                        print(name, 'cnn_comp', (network, dev, batch_size, threads),
+                              ["%.6f" % x for x in costs[name]])
+            finally:
+                for worker in workers.values():
+                    worker.stop()
+        return (True, 'success')
+    except Exception as e:
+        return (False, 'Encountered exception:\n' + render_exception(e))
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def main(config_dir, output_dir):
+    config, msg = validate(config_dir)
+    if config is None:
+        write_status(output_dir, False, msg)
+        return 1
+
+    if not interleave_enabled(config):
+        write_status(output_dir, True, 'Interleaving not enabled')
+        return 0
+
+    # seeds the round order here; each worker seeds the framework it runs
+    configure_seed(config, frameworks=())
+    success, msg = run_interleaved(config, output_dir)
+    write_status(output_dir, success, msg)
+    if not success:
+        return 1
+
+
+if __name__ == '__main__':
+    invoke_main(main, 'config_dir', 'output_dir')
@@ -1,3 +1,4 @@
+import ctypes
 import os
 import mxnet as mx
 import numpy as np
@@ -9,7 +10,9 @@ from mxnet.gluon.model_zoo import vision
 from mx_models import mxnet_zoo
 
 from validate_config import validate
-from exp_templates import (common_trial_params, common_early_exit, run_template)
+from process_util import pin_to_cpus
+from exp_templates import (common_trial_params, run_template)
+from run_interleaved import interleaved_early_exit
 
 def get_network(name, batch_size, ctx):
     image_shape = (batch_size, 3, 224, 224)
@@ -31,7 +34,21 @@ def get_network(name, batch_size, ctx):
     return net, image_shape, is_gluon
 
 
-def cnn_setup(network, dev, batch_size):
+def set_mxnet_threads(threads):
+    """
+    Sets the size of MXNet's OpenMP thread pool (OMP_NUM_THREADS is only
+    read at startup, so we also go through the C API where the build
+    has the call); with 0, uses one thread per CPU available to us
+    """
+    cpus = pin_to_cpus(threads)
+    os.environ['OMP_NUM_THREADS'] = str(len(cpus))
+    lib = getattr(mx.base, '_LIB', None)
+    if lib is not None and hasattr(lib, 'MXSetNumOMPThreads'):
+        lib.MXSetNumOMPThreads(ctypes.c_int(len(cpus)))
+
+
+def cnn_setup(network, dev, batch_size, threads):
+    set_mxnet_threads(threads)
     ctx = mx.gpu(0) if dev == 'gpu' else mx.cpu()
 
     net, image_shape, is_gluon = get_network(network, batch_size, ctx)
@@ -68,9 +85,9 @@ def cnn_teardown(thunk):
 
 if __name__ == '__main__':
     run_template(validate_config=validate,
-                 check_early_exit=common_early_exit({'frameworks': 'mxnet'}),
+                 check_early_exit=interleaved_early_exit('mxnet'),
                  gen_trial_params=common_trial_params(
                      'mxnet', 'cnn_comp',
                      cnn_trial, cnn_setup, cnn_teardown,
-                     ['network', 'device', 'batch_size'],
-                     ['networks', 'devices', 'batch_sizes']))
+                     ['network', 'device', 'batch_size', 'threads'],
+                     ['networks', 'devices', 'batch_sizes', 'threads']))
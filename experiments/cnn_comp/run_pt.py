@@ -5,7 +5,9 @@ import torch
 import torchvision.models as models
 
 from validate_config import validate
-from exp_templates import (common_trial_params, common_early_exit, run_template)
+from process_util import pin_to_cpus
+from exp_templates import (common_trial_params, run_template)
+from run_interleaved import interleaved_early_exit
 
 from pt_models.mobilenetv2 import MOBILENET_PARAMS
 from pt_models.mobilenetv2.MobileNetV2 import MobileNetV2 as mobilenet
@@ -53,7 +55,14 @@ def instantiate_network(network, batch_size, dev):
     return (net, image_shape)
 
 
-def cnn_setup(network, dev, batch_size):
+# the number of threads PyTorch picked for itself
+DEFAULT_THREADS = torch.get_num_threads()
+
+
+def cnn_setup(network, dev, batch_size, threads):
+    pin_to_cpus(threads)
+    torch.set_num_threads(threads if threads > 0 else DEFAULT_THREADS)
+
     net, image_shape = instantiate_network(network, batch_size, dev)
     device = torch.device('cuda' if dev == 'gpu' and torch.cuda.is_available() else 'cpu')
 
@@ -74,10 +83,10 @@ def cnn_teardown(target, input):
 
 if __name__ == '__main__':
     run_template(validate_config=validate,
-                 check_early_exit=common_early_exit({'frameworks': 'pt'}),
+                 check_early_exit=interleaved_early_exit('pt'),
                  gen_trial_params=common_trial_params(
                      'pt', 'cnn_comp',
                      cnn_trial, cnn_setup, cnn_teardown,
-                     ['network', 'device', 'batch_size'],
-                     ['networks', 'devices', 'batch_sizes']))
+                     ['network', 'device', 'batch_size', 'threads'],
+                     ['networks', 'devices', 'batch_sizes', 'threads']))
 
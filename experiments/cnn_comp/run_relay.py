@@ -1,12 +1,32 @@
 from validate_config import validate
-from exp_templates import (common_trial_params, common_early_exit, run_template)
-from relay_util import cnn_setup, cnn_trial, cnn_teardown
+from exp_templates import (common_trial_params, run_template)
+from run_interleaved import interleaved_early_exit
+from relay_util import (cnn_trial, cnn_teardown, parallel_compile_params,
+                        set_relay_threads)
+from relay_util import cnn_setup as relay_cnn_setup
+from relay_util import profile_cnn_ops as relay_profile_cnn_ops
+
+
+def cnn_setup(network, dev, batch_size, opt, threads):
+    set_relay_threads(threads)
+    return relay_cnn_setup(network, dev, batch_size, opt)
+
+
+def profile_cnn_ops(network, dev, batch_size, opt, threads, number, reps):
+    set_relay_threads(threads)
+    return relay_profile_cnn_ops(network, dev, batch_size, opt, number=number, reps=reps)
+
 
 if __name__ == '__main__':
     run_template(validate_config=validate,
-                 check_early_exit=common_early_exit({'frameworks': 'relay'}),
-                 gen_trial_params=common_trial_params(
-                     'relay', 'cnn_comp',
-                     cnn_trial, cnn_setup, cnn_teardown,
-                     ['network', 'device', 'batch_size', 'opt_level'],
-                     ['networks', 'devices', 'batch_sizes', 'relay_opt']))
+                 check_early_exit=interleaved_early_exit('relay'),
+                 gen_trial_params=parallel_compile_params(
+                     common_trial_params(
+                         'relay', 'cnn_comp',
+                         cnn_trial, cnn_setup, cnn_teardown,
+                         ['network', 'device', 'batch_size', 'opt_level', 'threads'],
+                         ['networks', 'devices', 'batch_sizes', 'relay_opt', 'threads']),
+                     # the thread count does not affect compilation
+                     to_setup_args=lambda combo: list(combo[:4]),
+                     apply_settings=lambda *combo: set_relay_threads(combo[-1])),
+                 op_profiler=profile_cnn_ops)
@@ -5,7 +5,9 @@ import tensorflow as tf
 
 from validate_config import validate
 from common import invoke_main, write_status
-from trial_util import run_trials, configure_seed
+from trial_util import run_trials, configure_seed, config_trial_options
+from process_util import pin_to_cpus
+from run_interleaved import interleave_enabled
 
 from tf_models import (mobilenet, resnet, vgg, dqn, dcgan)
 
@@ -33,7 +35,8 @@ def instantiate_network(network, batch_size, data_format):
     return (net, image_shape)
 
 
-def cnn_setup(network, device, batch_size, enable_xla):
+def cnn_setup(network, device, batch_size, enable_xla, threads):
+    pin_to_cpus(threads)
     dev = '/gpu:0' if device == 'gpu' else '/cpu:0'
 
     # for CPU, the data format must be channels_last because certain
@@ -41,7 +44,10 @@ def cnn_setup(network, device, batch_size, enable_xla):
     data_format = 'channels_first' if dev == '/gpu:0' else 'channels_last'
     net, image_shape = instantiate_network(network, batch_size, data_format)
 
-    config = tf.ConfigProto(gpu_options=tf.GPUOptions(allow_growth=True), log_device_placement=False)
+    # 0 threads leaves the choice to TF
+    config = tf.ConfigProto(gpu_options=tf.GPUOptions(allow_growth=True), log_device_placement=False,
+                            intra_op_parallelism_threads=threads,
+                            inter_op_parallelism_threads=threads)
     if enable_xla:
         config.graph_options.optimizer_options.global_jit_level = tf.OptimizerOptions.ON_1
 
@@ -77,6 +83,10 @@ def main(config_dir, output_dir, device):
         write_status(output_dir, True, 'TF not run on {}'.format(device))
         return 0
 
+    if interleave_enabled(config):
+        write_status(output_dir, True, 'TF measured by the interleaved runner')
+        return 0
+
     configure_seed(config)
 
     enable_xla = [False]
@@ -87,11 +97,12 @@ def main(config_dir, output_dir, device):
         'tf', 'cnn_comp',
         config['dry_run'], config['n_times_per_input'], config['n_inputs'],
         cnn_trial, cnn_setup, cnn_teardown,
-        ['network', 'device', 'batch_size', 'enable_xla'],
+        ['network', 'device', 'batch_size', 'enable_xla', 'threads'],
         [config['networks'], [device],
-         config['batch_sizes'], enable_xla],
+         config['batch_sizes'], enable_xla, config['threads']],
         path_prefix=output_dir,
-        append_to_csv=True)
+        append_to_csv=True,
+        **config_trial_options(config))
 
     write_status(output_dir, success, msg)
     if not success:
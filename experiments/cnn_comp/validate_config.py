@@ -3,6 +3,16 @@ from common import read_config
 
 from config_util import check_config, non_negative_cond, bool_cond
 
+# dashboard-wide trial options (see trial_util.config_trial_options and
+# op_profile_util) that the interleaved runner does not support
+NON_INTERLEAVED_OPTIONS = ['isolation', 'throughput', 'op_profile']
+
+
+def interleave_enabled(config):
+    interleave = config.get('interleave', None)
+    return bool(interleave) and interleave.get('enable', False)
+
+
 def validate(config_dir):
     """
     Reads config.json in the config_dir and prepopulates with default values.
@@ -12,6 +22,14 @@ def validate(config_dir):
     is wrong with the config it read.
     """
     config = read_config(config_dir)
+    if interleave_enabled(config):
+        unsupported = [option for option in NON_INTERLEAVED_OPTIONS
+                       if (config.get(option) or {}).get('enable', False)]
+        if config.get('resume_trials', False):
+            unsupported.append('resume_trials')
+        if unsupported:
+            return (None, 'Options {} are not supported with interleave; '
+                    'disable interleaving to use them'.format(', '.join(unsupported)))
     return check_config(
         config,
         {
@@ -20,6 +38,8 @@ def validate(config_dir):
             'n_inputs': 3,
             'n_times_per_input': 10,
             'batch_sizes': {1},
+            # 0 means the framework's default
+            'threads': {0},
             'relay_opt': 3,
             'use_xla': True,
             'frameworks': {'tf', 'pt', 'relay', 'mxnet'},
@@ -37,6 +57,7 @@ def validate(config_dir):
             'n_inputs': non_negative_cond(),
             'n_times_per_input': non_negative_cond(),
             'batch_sizes': non_negative_cond(),
+            'threads': non_negative_cond(),
             'relay_opt': non_negative_cond(),
             'use_xla': bool_cond(),
             'set_seed': bool_cond(),
@@ -6,6 +6,7 @@ import numpy as np
 
 import mxnet as mx
 from mxnet_util import import_gluon_rnn
+from setup_stats_util import track
 
 import tvm
 from tvm import relay
@@ -21,7 +22,8 @@ def rnn_setup(device, method, network):
     input_symbols = [mx.sym.Variable('data')] + [mx.sym.Variable('state%s' % i)
                                                  for i in range(num_states)]
 
-    relay_net, params = relay.frontend.from_mxnet(mx_net, shape=shapes)
+    with track('import'):
+        relay_net, params = relay.frontend.from_mxnet(mx_net, shape=shapes)
     params = params.items()
 
     inputs = [
@@ -39,11 +41,12 @@ def rnn_setup(device, method, network):
                 for i in range(num_states)]
     params_v = [pair[1].asnumpy() for pair in params]
 
-    if use_aot:
-        func = aot.compile(relay_net['main'], relay_net, ctx=context, tgt=target)
-    else:
-        executor = relay.create_executor(mod=relay_net, ctx=context, target=target)
-        func = executor.evaluate(relay_net['main'])
+    with track('compile'):
+        if use_aot:
+            func = aot.compile(relay_net['main'], relay_net, ctx=context, tgt=target)
+        else:
+            executor = relay.create_executor(mod=relay_net, ctx=context, target=target)
+            func = executor.evaluate(relay_net['main'])
     thunk = lambda: func(data_v, *states_v, *params_v)
     return [thunk]
 
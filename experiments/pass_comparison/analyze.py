@@ -1,5 +1,9 @@
 from validate_config import validate
-from exp_templates import analysis_template
+from exp_templates import analysis_template, common_sweep_dims
+from analysis_util import set_nested_field
+
+# opt level 0 with no passes specified
+BASELINE_SPEC = '0;'
 
 def generate_listing_settings(config):
     passes = [';'.join([str(pass_spec[0]), '|'.join(pass_spec[1])])
@@ -9,7 +13,7 @@ def generate_listing_settings(config):
 
 def generate_data_query(config, dev, network, settings):
     num_reps = config['n_inputs']
-    batch_size = list(config['batch_sizes'])[0]
+    batch_size = sorted(config['batch_sizes'])[0]
 
     fields = (['network', 'device', 'batch_size', *list(settings.keys())])
     field_values = {
@@ -22,6 +26,33 @@ def generate_data_query(config, dev, network, settings):
     return ['relay', 'pass_comparison', num_reps, fields, field_values]
 
 
+def add_pass_tradeoffs(config, data_dir, ret):
+    """
+    If the baseline spec was measured, adds the inference time each
+    pass spec saves relative to it per second spent compiling with
+    that spec, (baseline mean time - mean time) / compile time, under
+    the top-level field 'pass_tradeoff'. The compile time comes from
+    the 'compile' setup stage in 'compile_time' (which also has the time
+    of each pass; see relay_util.build_relay_mod)
+    """
+    if 'compile_time' not in ret:
+        return
+    for dev in config['devices']:
+        if BASELINE_SPEC not in ret[dev]:
+            continue
+        for listing in generate_listing_settings(config):
+            for network in config['networks']:
+                compile_time = ret['compile_time'].get(dev, {}).get(listing, {}) \
+                                                  .get(network, {}).get('compile')
+                if not compile_time:
+                    continue
+                saved = ret[dev][BASELINE_SPEC][network] - ret[dev][listing][network]
+                set_nested_field(ret, saved / compile_time, 'pass_tradeoff',
+                                 dev, listing, network)
+
+
 if __name__ == '__main__':
     analysis_template(validate, generate_listing_settings,
-                      generate_data_query, use_networks=True)
+                      generate_data_query, use_networks=True,
+                      extra_analysis=add_pass_tradeoffs,
+                      sweep_dims=common_sweep_dims([('batch_size', 'batch_sizes')]))
@@ -1,19 +1,23 @@
 from validate_config import validate
-from relay_util import cnn_setup, cnn_trial, cnn_teardown
+from relay_util import cnn_setup, cnn_trial, cnn_teardown, parallel_compile_params
 from exp_templates import run_template
 
-def passes_setup(network, dev, batch_size, pass_spec):
+def pass_spec_args(combo):
+    """Converts a (network, device, batch size, pass spec) combination into cnn_setup args"""
+    network, dev, batch_size, pass_spec = combo
     members = pass_spec.split(';')
     opt_level = int(members[0])
     pass_list = members[1]
 
     # baseline: don't specify any passes
     if opt_level == 0 and pass_list == '':
-        return cnn_setup(network, dev, batch_size, opt_level,
-                         use_passes=False)
+        return [network, dev, batch_size, opt_level, False, '']
+
+    return [network, dev, batch_size, opt_level, True, pass_list]
 
-    return cnn_setup(network, dev, batch_size, opt_level,
-                     use_passes=True, passes=pass_list)
+
+def passes_setup(network, dev, batch_size, pass_spec):
+    return cnn_setup(*pass_spec_args([network, dev, batch_size, pass_spec]))
 
 
 def gen_trial_params(config):
@@ -33,4 +37,5 @@ def gen_trial_params(config):
 
 if __name__ == '__main__':
     run_template(validate_config=validate,
-                 gen_trial_params=gen_trial_params)
+                 gen_trial_params=parallel_compile_params(gen_trial_params,
+                                                          to_setup_args=pass_spec_args))
@@ -1,10 +1,40 @@
+import os
+from collections import OrderedDict
+
 from validate_config import validate
-from exp_templates import visualize_template, common_individual_comparison
+from exp_templates import (visualize_template, common_individual_comparison,
+                           AUXILIARY_METRICS)
+from plot_util import PlotBuilder, PlotType
+
+
+def generate_tradeoff_comparison(config, raw_data, output_dir):
+    """
+    Graphs the inference time each pass spec saves per compile second
+    (see analyze.add_pass_tradeoffs) for every network on each device
+    """
+    if 'pass_tradeoff' not in raw_data:
+        return
+    stat_name, unit_type = AUXILIARY_METRICS['pass_tradeoff']
+    for dev, tradeoffs in raw_data['pass_tradeoff'].items():
+        data = {
+            'raw': OrderedDict(sorted(tradeoffs.items())),
+            'meta': ['Pass Combo', 'Network', stat_name]
+        }
+        PlotBuilder().set_title('Pass Trade-off on {}'.format(dev)) \
+                     .set_x_label(data['meta'][0]) \
+                     .set_y_label(data['meta'][2]) \
+                     .set_unit_type(unit_type) \
+                     .make(PlotType.MULTI_BAR, data) \
+                     .save(os.path.join(output_dir, 'comparison'),
+                           'pass-tradeoff-{}.png'.format(dev))
+
+
+def generate_comparisons(config, raw_data, output_dir):
+    common_individual_comparison(
+        'Pass Combo', 'Individual Relay Passes',
+        'pass-comparison', use_networks=True)(config, raw_data, output_dir)
+    generate_tradeoff_comparison(config, raw_data, output_dir)
 
 
 if __name__ == '__main__':
-    visualize_template(
-        validate,
-        common_individual_comparison(
-            'Pass Combo', 'Individual Relay Passes',
-            'pass-comparison', use_networks=True))
+    visualize_template(validate, generate_comparisons)
@@ -1,5 +1,5 @@
 from validate_config import validate
-from exp_templates import analysis_template
+from exp_templates import analysis_template, common_sweep_dims
 
 def generate_listing_settings(config):
     listing_settings = {
@@ -12,7 +12,7 @@ def generate_listing_settings(config):
 
 def generate_data_query(config, dev, network, settings):
     num_reps = config['n_inputs']
-    batch_size = list(config['batch_sizes'])[0]
+    batch_size = sorted(config['batch_sizes'])[0]
 
     fields = (['network', 'device', 'batch_size', *list(settings.keys())])
     field_values = {
@@ -27,4 +27,5 @@ def generate_data_query(config, dev, network, settings):
 
 if __name__ == '__main__':
     analysis_template(validate, generate_listing_settings,
-                      generate_data_query, use_networks=True)
+                      generate_data_query, use_networks=True,
+                      sweep_dims=common_sweep_dims([('batch_size', 'batch_sizes')]))
@@ -1,11 +1,13 @@
 from validate_config import validate
 from exp_templates import common_trial_params, run_template
-from relay_util import cnn_setup, cnn_trial, cnn_teardown
+from relay_util import (cnn_setup, cnn_trial, cnn_teardown, parallel_compile_params,
+                        profile_cnn_ops)
 
 if __name__ == '__main__':
     run_template(validate_config=validate,
-                 gen_trial_params=common_trial_params(
+                 gen_trial_params=parallel_compile_params(common_trial_params(
                      'relay', 'opt_comparison',
                      cnn_trial, cnn_setup, cnn_teardown,
                      ['network', 'device', 'batch_size', 'opt_level'],
-                     ['networks', 'devices', 'batch_sizes', 'opt_levels']))
+                     ['networks', 'devices', 'batch_sizes', 'opt_levels'])),
+                 op_profiler=profile_cnn_ops)
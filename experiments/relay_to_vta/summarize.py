@@ -1,7 +1,8 @@
 from decimal import Decimal
 
 from validate_config import validate
-from common import invoke_main, write_status, write_summary, sort_data
+from common import invoke_main, write_status, write_summary
+from results_store import sort_data
 
 SIM_TARGETS = {'sim', 'tsim'}
 PHYS_TARGETS = {'pynq'}
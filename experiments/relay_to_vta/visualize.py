@@ -2,7 +2,8 @@ import os
 
 from validate_config import validate
 from common import (invoke_main, write_status, prepare_out_file, parse_timestamp,
-                    sort_data, render_exception)
+                    render_exception)
+from results_store import sort_data
 from plot_util import PlotBuilder, PlotScale, PlotType, generate_longitudinal_comparisons
 
 SIM_TARGETS = {'sim', 'tsim'}
@@ -0,0 +1,51 @@
+"""
+Records the size (number of nodes) and depth of the trees of every
+sample the run measures, so the analysis can relate latency to tree
+size. Both frameworks only run the TreeLSTM over the left tree of each
+pair, but both trees are recorded.
+"""
+import csv
+import os
+
+from validate_config import validate
+from common import invoke_main, write_status, render_exception
+
+from pt_tlstm.preprocess import preprocess
+
+TREE_STATS_FILENAME = 'treelstm-tree_stats.csv'
+TREE_STATS_FIELDS = ['dataset', 'idx', 'left_size', 'left_depth', 'right_size', 'right_depth']
+
+
+def annotate_trees(config, output_dir):
+    tlstm_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'pt_tlstm')
+    _, _, dev_data, test_data, train_data = preprocess(os.path.join(tlstm_dir, 'data/sick/'),
+                                                       os.path.join(tlstm_dir, 'data/glove/'),
+                                                       5)
+    data = {'dev': dev_data, 'test': test_data, 'train': train_data}
+
+    with open(os.path.join(output_dir, TREE_STATS_FILENAME), 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(TREE_STATS_FIELDS)
+        for dataset, max_idx in config['datasets']:
+            for idx in range(max_idx):
+                ltree, _, rtree, _, _ = data[dataset][idx]
+                writer.writerow([dataset, idx, ltree.size(), ltree.depth(),
+                                 rtree.size(), rtree.depth()])
+
+
+def main(config_dir, output_dir):
+    config, msg = validate(config_dir)
+    if config is None:
+        write_status(output_dir, False, msg)
+        return 1
+
+    try:
+        annotate_trees(config, output_dir)
+    except Exception as e:
+        write_status(output_dir, False, 'Exception encountered:\n' + render_exception(e))
+        return 1
+    write_status(output_dir, True, 'success')
+
+
+if __name__ == '__main__':
+    invoke_main(main, 'config_dir', 'output_dir')
@@ -11,7 +11,7 @@ class Tree(object):
         self.children.append(child)
 
     def size(self):
-        if getattr(self, '_size'):
+        if getattr(self, '_size', None) is not None:
             return self._size
         count = 1
         for i in range(self.num_children):
@@ -20,7 +20,7 @@ class Tree(object):
         return self._size
 
     def depth(self):
-        if getattr(self, '_depth'):
+        if getattr(self, '_depth', None) is not None:
             return self._depth
         count = 0
         if self.num_children > 0:
@@ -77,11 +77,15 @@ if ! $data_exists; then
     rm -rf setup
 fi
 
+# sizes and depths of the measured trees, for the analysis
+python_run_trial "annotate_trees.py" $config_dir $data_dir
 python_run_trial "run_pt.py" $config_dir $data_dir
 
 # Because the AoT compiler spawns a lot of subprocesses and potentially
 # leaks memory, we're going to spawn each dataset's run as a separate
 # process to minimize the chance of running out of memory. Very ugly.
+# (Enabling "isolation" in the config additionally runs each combination
+# in a recyclable worker process, so one crash does not end the sweep.)
 declare -a datasets=("dev"
                      "test"
                      "train")
@@ -4,7 +4,7 @@ import torch
 
 from validate_config import validate
 from common import invoke_main, write_status
-from trial_util import run_trials
+from trial_util import run_trials, config_trial_options
 
 from pt_tlstm.preprocess import preprocess
 from pt_tlstm.model import SimilarityTreeLSTM
@@ -69,7 +69,8 @@ def main(config_dir, output_dir):
             ['device', 'dataset', 'idx'],
             [config['devices'], [dataset], [i for i in range(max_idx)]],
             path_prefix=output_dir,
-            append_to_csv=True)
+            append_to_csv=True,
+            **config_trial_options(config))
         if not success:
             write_status(output_dir, success, msg)
             return 1
@@ -6,7 +6,8 @@ import aot
 
 from validate_config import validate
 from common import invoke_main, write_status
-from trial_util import run_trials
+from trial_util import run_trials, config_trial_options
+from setup_stats_util import track
 
 from run_pt import initialize_treelstm
 from relay_tlstm import converter
@@ -35,14 +36,16 @@ def treelstm_setup(device, method, dataset, idx):
 
     if use_aot:
         mod['main'] = tlstm.get()
-        func = aot.compile(tlstm.get(), mod, ctx=context, tgt=target)
+        with track('compile'):
+            func = aot.compile(tlstm.get(), mod, ctx=context, tgt=target)
     else:
         opts = relay.transform.Sequential([relay.transform.SimplifyInference(),
                                            relay.transform.FuseOps()])
         mod['main'] = tlstm.get()
-        opts(mod)
-        executor = relay.create_executor(mod=mod, ctx=context, target=target)
-        func = executor.evaluate()
+        with track('compile'):
+            opts(mod)
+            executor = relay.create_executor(mod=mod, ctx=context, target=target)
+            func = executor.evaluate()
 
     thunk = lambda: func(relay_tree)
     return [thunk]
@@ -90,11 +93,12 @@ def main(config_dir, output_dir, method, dataset):
         [config['devices'], [method],
          [dataset], [i for i in range(max_idx)]],
         path_prefix=output_dir,
-        append_to_csv=True)
+        append_to_csv=True,
+        **config_trial_options(config))
     if not success:
         write_status(output_dir, success, msg)
         return 1
-    write_status(output_dir, True, 'success')
+    write_status(output_dir, True, msg)
 
 
 if __name__ == '__main__':
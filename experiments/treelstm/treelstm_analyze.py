@@ -1,5 +1,14 @@
+import csv
+import os
+
+import numpy as np
+
 from validate_config import validate
 from exp_templates import analysis_template
+from analysis_util import load_trial_table, set_nested_field
+
+# written by annotate_trees.py
+TREE_STATS_FILENAME = 'treelstm-tree_stats.csv'
 
 
 def generate_listing_settings(config):
@@ -39,6 +48,77 @@ def generate_data_query(config, dev, settings):
     return [fw, 'treelstm', num_reps, fields, field_values]
 
 
+def load_tree_sizes(data_dir):
+    """
+    Returns {'dataset/idx': number of nodes in the tree the model runs
+    over} from the tree stats, or None if they were not recorded
+    """
+    filename = os.path.join(data_dir, TREE_STATS_FILENAME)
+    if not os.path.exists(filename):
+        return None
+    with open(filename, newline='') as csvfile:
+        return {'{}/{}'.format(row['dataset'], row['idx']): int(row['left_size'])
+                for row in csv.DictReader(csvfile)}
+
+
+def fit_tree_model(table, field_values, num_reps, sizes):
+    """
+    Least-squares fit of every measured time matching the field values
+    against the size of the sample's tree: time = fixed + per_node * nodes.
+    Returns (fixed, per_node, fit info) or None if there are not two
+    different tree sizes to fit with
+    """
+    idx = table.select(field_values)
+    reps = table.columns['rep'][idx]
+    idx = idx[(reps >= 0) & (reps < num_reps)]
+    keys, inverse = np.unique(np.char.add(np.char.add(table.columns['dataset'][idx], '/'),
+                                          table.columns['idx'][idx]),
+                              return_inverse=True)
+    key_nodes = np.array([sizes.get(key, np.nan) for key in keys.tolist()])
+    nodes = key_nodes[inverse]
+    times = table.columns['time'][idx]
+    known = ~np.isnan(nodes)
+    nodes, times = nodes[known], times[known]
+    if len(np.unique(nodes)) < 2:
+        return None
+
+    design = np.column_stack([np.ones_like(nodes), nodes])
+    (fixed, per_node), _, _, _ = np.linalg.lstsq(design, times, rcond=None)
+    residuals = times - design.dot([fixed, per_node])
+    total = np.sum(np.square(times - np.mean(times)))
+    info = {
+        'r2': float(1 - np.sum(np.square(residuals)) / total) if total > 0 else 1.0,
+        'samples': int(np.count_nonzero(~np.isnan(key_nodes))),
+        'min_nodes': int(np.min(nodes)),
+        'max_nodes': int(np.max(nodes))
+    }
+    return float(fixed), float(per_node), info
+
+
+def add_tree_models(config, data_dir, ret):
+    """
+    Adds the fixed cost and per-node cost of every listing (see
+    fit_tree_model) under the top-level fields 'fixed_time' and
+    'per_node_time', with the quality of each fit under 'tree_model'
+    """
+    sizes = load_tree_sizes(data_dir)
+    if sizes is None:
+        return
+    for dev in config['devices']:
+        for listing, settings in generate_listing_settings(config).items():
+            fw, task_name, num_reps, fields, field_values = generate_data_query(config, dev,
+                                                                                settings)
+            table = load_trial_table(data_dir, fw, task_name, fields)
+            fit = fit_tree_model(table, field_values, num_reps, sizes)
+            if fit is None:
+                continue
+            fixed, per_node, info = fit
+            set_nested_field(ret, fixed, 'fixed_time', dev, listing)
+            set_nested_field(ret, per_node, 'per_node_time', dev, listing)
+            set_nested_field(ret, info, 'tree_model', dev, listing)
+
+
 if __name__ == '__main__':
     analysis_template(validate, generate_listing_settings,
-                      generate_data_query, use_networks=False)
+                      generate_data_query, use_networks=False,
+                      extra_analysis=add_tree_models)
@@ -17,36 +17,250 @@ def lookup_data_file(data_prefix, filename):
     return full_name
 
 
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_SEED = 0
+CONFIDENCE_LEVEL = 0.95
+# bound on the size of a single resampling matrix
+_BOOTSTRAP_CHUNK_ELEMS = 1 << 22
+
+
+def bootstrap_cis(values, resamples=BOOTSTRAP_RESAMPLES, level=CONFIDENCE_LEVEL,
+                  seed=BOOTSTRAP_SEED):
+    """
+    Percentile bootstrap confidence intervals for the mean and median
+    of the values, resampling all at once (in chunks) with NumPy.
+    Uses a fixed seed so reanalyzing the same data gives the same result.
+    Returns ([mean low, mean high], [median low, median high])
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return [np.nan, np.nan], [np.nan, np.nan]
+
+    rng = np.random.RandomState(seed)
+    chunk = max(1, min(resamples, _BOOTSTRAP_CHUNK_ELEMS // n))
+    means, medians = [], []
+    for start in range(0, resamples, chunk):
+        samples = values[rng.randint(0, n, size=(min(chunk, resamples - start), n))]
+        means.append(samples.mean(axis=1))
+        medians.append(np.median(samples, axis=1))
+
+    tails = [100 * (1 - level) / 2, 100 * (1 + level) / 2]
+    return (np.percentile(np.concatenate(means), tails).tolist(),
+            np.percentile(np.concatenate(medians), tails).tolist())
+
+
+def robust_summary(times, reps):
+    """
+    Summarizes the times (with the rep each came from). Besides the
+    mean, median, and standard deviation of all the times, reports:
+    - n and num_reps: numbers of measurements and of reps
+    - rep_means: the mean of each rep (in rep order)
+    - between_rep_var: variance of the rep means
+    - within_rep_var: average variance of the times within a rep
+    - iqr, mad: interquartile range and median absolute deviation
+    - num_outliers: measurements outside the Tukey fences
+      (1.5 IQR past the quartiles) or with a modified z-score
+      (based on the MAD) above 3.5
+    - mean_ci, median_ci: bootstrap confidence intervals
+
+    All values are plain Python numbers so they can go straight into JSON.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    reps = np.asarray(reps, dtype=np.int64)
+    if len(times) == 0:
+        nan = float('nan')
+        return {'mean': nan, 'median': nan, 'std': nan, 'n': 0, 'num_reps': 0}
+
+    rep_ids, rep_idx = np.unique(reps, return_inverse=True)
+    counts = np.bincount(rep_idx)
+    rep_means = np.bincount(rep_idx, weights=times) / counts
+    deviations = times - rep_means[rep_idx]
+    rep_vars = np.bincount(rep_idx, weights=deviations ** 2) / counts
+
+    median = np.median(times)
+    q1, q3 = np.percentile(times, [25, 75])
+    iqr = q3 - q1
+    mad = np.median(np.abs(times - median))
+    tukey = (times < q1 - 1.5 * iqr) | (times > q3 + 1.5 * iqr)
+    if mad > 0:
+        mad_outliers = 0.6745 * np.abs(times - median) / mad > 3.5
+    else:
+        mad_outliers = np.zeros(len(times), dtype=bool)
+
+    mean_ci, median_ci = bootstrap_cis(times)
+    return {
+        'mean': float(np.mean(times)),
+        'median': float(median),
+        'std': float(np.std(times)),
+        'n': int(len(times)),
+        'num_reps': int(len(rep_ids)),
+        'rep_means': rep_means.tolist(),
+        'between_rep_var': float(np.var(rep_means, ddof=1)) if len(rep_ids) > 1 else 0.0,
+        'within_rep_var': float(np.mean(rep_vars)),
+        'iqr': float(iqr),
+        'mad': float(mad),
+        'num_outliers': int(np.count_nonzero(tukey | mad_outliers)),
+        'mean_ci': mean_ci,
+        'median_ci': median_ci
+    }
+
+
 def compute_summary_stats(data, trait_name, trait_values, average_key='time', is_numeric=False):
     """
     Expects the data to be a list of dicts.
     For each entry r in the data and each value v in trait_values,
     this function assembles the values of all fields
     r[trait_key] where r[trait_name] == v.
-    Returns the mean, median, and std dev of all values in a
-    dict with fields "mean", "median", and "std"
+    Returns a summary of all values (see robust_summary), including
+    the mean, median, and std dev in fields "mean", "median", and "std".
+    The trait values are treated as the reps.
 
     is_numeric: Whether the trait is numeric or not (expects string by default)
     """
     vals = []
-    for value in trait_values:
+    groups = []
+    for group, value in enumerate(trait_values):
         def filter_func(r):
             if is_numeric:
                 return int(r[trait_name]) == value
             return r[trait_name] == value
-        vals += list(map(lambda r: float(r[average_key]),
-                         filter(filter_func, data)))
-    return {
-        'mean': np.mean(vals),
-        'median': np.median(vals),
-        'std': np.std(vals)
-    }
+        matches = list(map(lambda r: float(r[average_key]),
+                           filter(filter_func, data)))
+        vals += matches
+        groups += [group] * len(matches)
+    return robust_summary(vals, groups)
 
 
 def summarize_over_reps(data, num_reps):
     return compute_summary_stats(data, 'rep', range(num_reps), is_numeric=True)
 
 
+class TrialTable:
+    """
+    A trial CSV (as produced by trial_util.run_trials) loaded into
+    NumPy columns: the parameter columns are kept as strings (as they
+    appear in the CSV), 'rep' and 'run' as ints, and 'time' as floats.
+    Header rows (including those left by appending runs) are skipped.
+
+    Keeps an index for each parameter column from each value to the
+    rows having it, built the first time the column is queried, so
+    selecting the rows of a parameter combination does not scan the table.
+    """
+    def __init__(self, filename, parameter_names):
+        self.parameter_names = list(parameter_names)
+        n_params = len(self.parameter_names)
+
+        params = [[] for _ in self.parameter_names]
+        reps, runs, times = [], [], []
+        with open(filename, newline='') as csvfile:
+            for line in csv.reader(csvfile):
+                if len(line) < n_params + 3:
+                    continue
+                try:
+                    rep, run, time = int(line[n_params]), int(line[n_params + 1]), float(line[n_params + 2])
+                except ValueError:
+                    continue
+                for i in range(n_params):
+                    params[i].append(line[i])
+                reps.append(rep)
+                runs.append(run)
+                times.append(time)
+
+        self.columns = {name: np.array(values, dtype=str)
+                        for name, values in zip(self.parameter_names, params)}
+        self.columns['rep'] = np.array(reps, dtype=np.int64)
+        self.columns['run'] = np.array(runs, dtype=np.int64)
+        self.columns['time'] = np.array(times, dtype=np.float64)
+        self._indices = {}
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def _index(self, name):
+        if name not in self._indices:
+            values, inverse = np.unique(self.columns[name], return_inverse=True)
+            order = np.argsort(inverse, kind='stable')
+            bounds = np.cumsum(np.bincount(inverse, minlength=len(values)))
+            groups = np.split(order, bounds[:-1])
+            self._indices[name] = dict(zip(values.tolist(), groups))
+        return self._indices[name]
+
+    def select(self, params_to_match):
+        """
+        Returns the (sorted) indices of the rows where the parameters
+        match the given dict {param name => value}
+        """
+        selected = None
+        for name, value in params_to_match.items():
+            rows = self._index(name).get(str(value), np.array([], dtype=np.int64))
+            selected = rows if selected is None else np.intersect1d(selected, rows,
+                                                                    assume_unique=True)
+        if selected is None:
+            return np.arange(len(self))
+        return selected
+
+    def rows(self, params_to_match):
+        """Returns the matching rows as dicts of strings, like csv.DictReader"""
+        idx = self.select(params_to_match)
+        names = self.parameter_names + ['rep', 'run', 'time']
+        columns = [self.columns[name][idx] for name in names]
+        return [dict(zip(names, map(str, values))) for values in zip(*columns)]
+
+    def summarize(self, params_to_match, num_reps):
+        """
+        Summary (see robust_summary) of the time over the matching
+        rows from reps 0 through num_reps - 1
+        """
+        idx = self.select(params_to_match)
+        reps = self.columns['rep'][idx]
+        keep = (reps >= 0) & (reps < num_reps)
+        return robust_summary(self.columns['time'][idx][keep], reps[keep])
+
+    def mean(self, params_to_match, num_reps):
+        """
+        Returns the mean time over the matching rows from reps 0 through
+        num_reps - 1 (as summarize does, without the rest of the summary),
+        or None if there are none
+        """
+        idx = self.select(params_to_match)
+        reps = self.columns['rep'][idx]
+        keep = (reps >= 0) & (reps < num_reps)
+        if not keep.any():
+            return None
+        return float(np.mean(self.columns['time'][idx][keep]))
+
+    def rep_means(self, params_to_match, num_reps):
+        """Returns an array of the mean time in each of the first num_reps reps"""
+        idx = self.select(params_to_match)
+        reps = self.columns['rep'][idx]
+        keep = (reps >= 0) & (reps < num_reps)
+        reps = reps[keep]
+        times = self.columns['time'][idx][keep]
+        counts = np.bincount(reps, minlength=num_reps)
+        sums = np.bincount(reps, weights=times, minlength=num_reps)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / counts
+
+
+# (filename, parameter names) -> (modification time, table)
+_TABLE_CACHE = {}
+
+
+def load_trial_table(data_dir, framework, task_name, parameter_names):
+    """
+    Returns the TrialTable for the framework and task's CSV, loading it
+    only the first time it is requested in this process (or if the file
+    has changed since)
+    """
+    filename = lookup_data_file(data_dir, '{}-{}.csv'.format(framework, task_name))
+    key = (os.path.abspath(filename), tuple(parameter_names))
+    mtime = os.path.getmtime(filename)
+    if key not in _TABLE_CACHE or _TABLE_CACHE[key][0] != mtime:
+        _TABLE_CACHE[key] = (mtime, TrialTable(filename, parameter_names))
+    return _TABLE_CACHE[key][1]
+
+
 def obtain_data_rows(data_dir, framework, task_name, parameter_names, params_to_match):
     """
     Returns all data rows from the given framework from the
@@ -54,23 +268,11 @@ def obtain_data_rows(data_dir, framework, task_name, parameter_names, params_to_
 
     params_to_match as a dictionary {param names => value to match}
     """
-    filename = lookup_data_file(data_dir, '{}-{}.csv'.format(framework, task_name))
-    with open(filename, newline='') as csvfile:
-        # even though it seems redundant, parameter names does
-        # need to be a separate arg because *order matters*
-        # whereas it doesn't in a dict
-        fieldnames = parameter_names + ['rep', 'run', 'time']
-        reader = csv.DictReader(csvfile, fieldnames)
-
-        def filter_func(row):
-            for (name, value) in params_to_match.items():
-                comp = value
-                if not isinstance(value, str):
-                    comp = str(value)
-                if row[name] != comp:
-                    return False
-            return True
-        return list(filter(filter_func, reader))
+    # even though it seems redundant, parameter names does
+    # need to be a separate arg because *order matters*
+    # whereas it doesn't in a dict
+    table = load_trial_table(data_dir, framework, task_name, parameter_names)
+    return table.rows(params_to_match)
 
 
 def trials_stat_summary(data_dir, framework, task_name,
@@ -82,8 +284,8 @@ def trials_stat_summary(data_dir, framework, task_name,
     Returns (summary, success, message)
     """
     try:
-        data = obtain_data_rows(data_dir, framework, task_name, parameter_names, params_to_match)
-        summary = summarize_over_reps(data, num_reps)
+        table = load_trial_table(data_dir, framework, task_name, parameter_names)
+        summary = table.summarize(params_to_match, num_reps)
         return (summary, True, 'success')
     except Exception as e:
         return (-1, False,
@@ -100,10 +302,61 @@ def add_detailed_summary(report, detailed_summary, *fields):
     etc., made assumptions about the layout of records.
     Eventually the old records should be migrated.
     """
+    set_nested_field(report, detailed_summary, 'detailed', *fields)
+
+
+def set_nested_field(report, value, *fields):
+    """
+    Sets report[fields[0]][fields[1]]...[fields[-1]] = value,
+    creating intermediate dictionaries as needed
+    """
     current = report
-    all_fields = ['detailed', *fields]
-    for field in all_fields[:-1]:
+    for field in fields[:-1]:
         if field not in current:
             current[field] = {}
         current = current[field]
-    current[all_fields[-1]] = detailed_summary
+    current[fields[-1]] = value
+
+
+def throughput_summary(data_dir, framework, task_name, parameter_names, params_to_match):
+    """
+    Summarizes the throughput-mode measurements (see
+    trial_util.run_throughput_trials) of the specified framework
+    and task where the specified parameters match.
+
+    Returns a dict mapping each concurrency level (as a string, for JSON)
+    to {'throughput': requests per second, 'latency': mean latency},
+    both averaged over reps, or None if there is no throughput data
+    """
+    try:
+        filename = lookup_data_file(data_dir, '{}-{}-throughput.csv'.format(framework, task_name))
+    except Exception:
+        return None
+
+    with open(filename, newline='') as csvfile:
+        fieldnames = parameter_names + ['concurrency', 'rep', 'client', 'run', 'start', 'time']
+        reader = csv.DictReader(csvfile, fieldnames)
+        by_level = {}
+        for row in reader:
+            # skip the header and rows of other parameter combinations
+            if row['concurrency'] == 'concurrency':
+                continue
+            if any(row[name] != str(value) for (name, value) in params_to_match.items()):
+                continue
+            by_level.setdefault(int(row['concurrency']), {}) \
+                    .setdefault(int(row['rep']), []) \
+                    .append((float(row['start']), float(row['time'])))
+
+    ret = {}
+    for concurrency, reps in sorted(by_level.items()):
+        rates = []
+        latencies = []
+        for timings in reps.values():
+            elapsed = max(start + latency for (start, latency) in timings)
+            rates.append(len(timings) / elapsed)
+            latencies += [latency for (_, latency) in timings]
+        ret[str(concurrency)] = {
+            'throughput': float(np.mean(rates)),
+            'latency': float(np.mean(latencies))
+        }
+    return ret
@@ -0,0 +1,168 @@
+"""
+Framework-independent calibration benchmarks for tracking the speed
+of the machine itself (compute, memory bandwidth, random memory access),
+plus helpers for normalizing experiment results by them so that
+machine-wide drift can be told apart from real regressions.
+
+Run as a script, measures the suite and writes the results to
+output_dir/(stage).json. The dashboard does this before and after
+each experiment if calibration is enabled.
+"""
+import copy
+import time
+
+import numpy as np
+
+from common import invoke_main, write_json, traverse_fields, TIME_IGNORED_FIELDS
+
+CALIBRATION_BENCHMARKS = ['gemm', 'stream', 'random_access']
+
+# fields of the detailed summaries that are times (and so get normalized)
+# and those that are squared times
+DETAILED_TIME_STATS = {'mean', 'median', 'std', 'rep_means',
+                       'iqr', 'mad', 'mean_ci', 'median_ci'}
+DETAILED_SQUARED_STATS = {'between_rep_var', 'within_rep_var'}
+
+
+def _best_time(func, reps):
+    # taking the minimum over reps filters out interference from
+    # anything else running, which is not what we want to measure here
+    best = float('inf')
+    for _ in range(reps):
+        start = time.time()
+        func()
+        best = min(best, time.time() - start)
+    return best
+
+
+def gemm_time(n=1024, reps=5):
+    """Time of an n x n single-precision matrix multiply in NumPy"""
+    a = np.random.rand(n, n).astype(np.float32)
+    b = np.random.rand(n, n).astype(np.float32)
+    np.dot(a, b)
+    return _best_time(lambda: np.dot(a, b), reps)
+
+
+def stream_time(n=1 << 24, reps=5):
+    """Time of a STREAM-style triad (a = b + s * c) over n doubles"""
+    a = np.empty(n)
+    b = np.random.rand(n)
+    c = np.random.rand(n)
+    scalar = 3.0
+
+    def triad():
+        np.multiply(c, scalar, out=a)
+        np.add(a, b, out=a)
+    triad()
+    return _best_time(triad, reps)
+
+
+def random_access_time(n=1 << 24, accesses=1 << 22, reps=5):
+    """
+    Time of gathering the given number of doubles from random positions
+    in an n-element array (much larger than the caches), which is
+    dominated by memory latency. The gather runs in NumPy, as a chase
+    through a chain of indices in Python would mostly measure the
+    interpreter; its loads are independent, so this measures latency
+    as hidden by the memory-level parallelism of the machine.
+    """
+    data = np.random.rand(n)
+    indices = np.random.randint(0, n, size=accesses)
+    out = np.empty(accesses)
+    np.take(data, indices, out=out)
+    return _best_time(lambda: np.take(data, indices, out=out), reps)
+
+
+def run_calibration():
+    """Returns a dict of benchmark name -> time in seconds"""
+    return {
+        'gemm': gemm_time(),
+        'stream': stream_time(),
+        'random_access': random_access_time()
+    }
+
+
+def summarize_calibration(before, after):
+    """
+    Combines the calibration runs from before and after an experiment
+    (either may be None if it failed) into the 'calibration' field
+    of the experiment's data file
+    """
+    runs = [run for run in (before, after) if run is not None]
+    if not runs:
+        return None
+    ret = {'mean': {name: float(np.mean([run[name] for run in runs]))
+                    for name in CALIBRATION_BENCHMARKS}}
+    if before is not None:
+        ret['before'] = before
+    if after is not None:
+        ret['after'] = after
+    return ret
+
+
+def calibration_index(entry):
+    """
+    Returns a single number summarizing the machine's speed when the
+    data entry was produced (the geometric mean of the calibration
+    times; higher is slower), or None if the entry has no calibration
+    or one from a different set of benchmarks
+    """
+    if 'calibration' not in entry:
+        return None
+    means = entry['calibration']['mean']
+    if any(name not in means for name in CALIBRATION_BENCHMARKS):
+        return None
+    times = [means[name] for name in CALIBRATION_BENCHMARKS]
+    return float(np.exp(np.mean(np.log(times))))
+
+
+def _scale_leaves(value, factor, key_factors=None, key=None):
+    if isinstance(value, dict):
+        return {k: _scale_leaves(v, factor, key_factors, k) for k, v in value.items()}
+    if key_factors is not None:
+        if key not in key_factors:
+            return value
+        factor = key_factors[key]
+    if isinstance(value, list):
+        return [_scale_leaves(v, factor) for v in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value * factor
+    return value
+
+
+def normalize_by_calibration(sorted_data):
+    """
+    Given data entries sorted by timestamp (as from sort_data), returns
+    copies of those that have calibration results with every measured
+    time scaled by how much faster or slower the machine was at the time
+    than when the most recent calibrated entry was produced. Hence the
+    most recent values are unchanged and older ones are expressed in
+    terms of today's machine speed.
+    """
+    calibrated = [entry for entry in sorted_data
+                  if calibration_index(entry) is not None]
+    if not calibrated:
+        return []
+
+    reference = calibration_index(calibrated[-1])
+    ret = []
+    for entry in calibrated:
+        factor = reference / calibration_index(entry)
+        normalized = copy.deepcopy(entry)
+        for field in traverse_fields(entry, TIME_IGNORED_FIELDS)[0]:
+            normalized[field] = _scale_leaves(normalized[field], factor)
+        if 'detailed' in normalized:
+            key_factors = {**{key: factor for key in DETAILED_TIME_STATS},
+                           **{key: factor ** 2 for key in DETAILED_SQUARED_STATS}}
+            normalized['detailed'] = _scale_leaves(normalized['detailed'], factor,
+                                                   key_factors=key_factors)
+        ret.append(normalized)
+    return ret
+
+
+def main(output_dir, stage):
+    write_json(output_dir, '{}.json'.format(stage), run_calibration())
+
+
+if __name__ == '__main__':
+    invoke_main(main, 'output_dir', 'stage')
@@ -104,6 +104,27 @@ def sort_data(data_dir):
     return sorted(all_data, key=parse_timestamp)
 
 
+# Top-level fields of data entries that are not measurements to be compared
+# across runs (dashboard bookkeeping and results with their own layouts)
+IGNORED_FIELDS = frozenset({
+    'timestamp', 'tvm_hash', 'detailed',
+    'start_time', 'end_time', 'time_delta', 'success',
+    'run_cpu_telemetry', 'run_gpu_telemetry', 'paired_speedup',
+    'throughput', 'throughput_latency', 'calibration',
+    'cube', 'fixed_time', 'per_node_time', 'tree_model'
+})
+
+# Top-level fields of measurements other than end-to-end times (operator
+# profiles, setup costs, and graph statistics): compared across runs like
+# any metric, but left out of time graphs and calibration normalization
+NON_TIME_FIELDS = frozenset({
+    'op_time', 'op_share', 'compile_time', 'compile_memory', 'pass_tradeoff',
+    'graph_stats'
+})
+
+TIME_IGNORED_FIELDS = IGNORED_FIELDS | NON_TIME_FIELDS
+
+
 def gather_stats(sorted_data, fields):
     '''
     Expects input in the form of a list of data objects with timestamp
@@ -138,9 +159,7 @@ def traverse_fields(entry, ignore_fields=None):
     Also ignores the 'detailed' field by default (as old data files will not have detailed summaries).
     Set ignore_fields to a non-None value to avoid the defaults.
     """
-    ignore_set = {'timestamp', 'tvm_hash', 'detailed', 
-                  'start_time', 'end_time', 'time_delta', 'success',
-                  'run_cpu_telemetry', 'run_gpu_telemetry'}
+    ignore_set = set(IGNORED_FIELDS)
     if ignore_fields is not None:
         ignore_set = set(ignore_fields)
 
@@ -168,6 +187,65 @@ def traverse_fields(entry, ignore_fields=None):
     return [level_fields] + final_tail
 
 
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def flatten_fields(entry, ignore_fields=None, include_lists=False):
+    """
+    Returns a list of (tuple of nested fields, value) for every numeric
+    leaf of a JSON data entry, i.e., only the field combinations that
+    actually exist (unlike the product of traverse_fields's levels).
+    Top-level fields in ignore_fields (IGNORED_FIELDS by default) are
+    skipped. If include_lists is set, list elements are leaves too,
+    with their index as the last field.
+    """
+    ignore_set = IGNORED_FIELDS if ignore_fields is None else set(ignore_fields)
+
+    ret = []
+    def flatten(value, fields):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                flatten(child, fields + (key,))
+        elif isinstance(value, list):
+            if include_lists:
+                for i, child in enumerate(value):
+                    flatten(child, fields + (i,))
+        elif _is_number(value):
+            ret.append((fields, value))
+
+    for key, value in entry.items():
+        if key not in ignore_set:
+            flatten(value, (key,))
+    return ret
+
+
+def metric_series(sorted_data, ignore_fields=None):
+    """
+    Builds the history of every metric in the most recent of the given
+    data entries (sorted by timestamp, as from sort_data) in a single
+    pass. Returns a dict mapping each metric's fields (see flatten_fields)
+    to (list of values, list of corresponding entry timestamps), like
+    gather_stats, in the order the fields appear in the most recent entry.
+    Meant for time graphs, so top-level fields in ignore_fields
+    default to TIME_IGNORED_FIELDS
+    """
+    if not sorted_data:
+        return {}
+    if ignore_fields is None:
+        ignore_fields = TIME_IGNORED_FIELDS
+
+    series = {fields: ([], [])
+              for (fields, _) in flatten_fields(sorted_data[-1], ignore_fields)}
+    for entry in sorted_data:
+        time = parse_timestamp(entry)
+        for (fields, value) in flatten_fields(entry, ignore_fields):
+            if fields in series:
+                series[fields][0].append(value)
+                series[fields][1].append(time)
+    return series
+
+
 def invoke_main(main_func, *arg_names):
     """
     Generates an argument parser for arg_names and calls
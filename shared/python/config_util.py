@@ -34,7 +34,7 @@ def check_config(config, defaults=None, acceptable_values=None, conditions=None,
     2. an error message to report if a condition fails or there is an invalid value
 
     Note that for config fields that are lists, this function will turn them into sets
-    to deduplicate.
+    to deduplicate (unless their items are lists or dicts themselves, like trial_filter's).
 
     defaults, acceptable_values, conditions, permit_empty are all empty by default
     """
@@ -56,7 +56,10 @@ def check_config(config, defaults=None, acceptable_values=None, conditions=None,
                 if v is None:
                     return (None, msg)
                 checked_list.append(v)
-            ret[field] = set(checked_list)
+            if any(isinstance(v, (list, dict)) for v in checked_list):
+                ret[field] = checked_list
+            else:
+                ret[field] = set(checked_list)
             continue
 
         v, msg = check_item(field, value, acceptable_values, conditions)
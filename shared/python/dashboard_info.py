@@ -56,6 +56,7 @@ class DashboardInfo:
     exp_data: (home)/results/experiments/data
     exp_graphs: (home)/results/experiments/graph
     exp_summaries: (home)/results/experiments/summary
+    exp_series: (home)/results/experiments/series
 
     subsys_results: (home)/results/subsystem
     subsys_statuses: (home)/results/subsystem/status
@@ -81,6 +82,7 @@ class DashboardInfo:
             (InfoType.results, SystemType.exp,    'status',    'statuses'),
             (InfoType.results, SystemType.exp,    'graph',     'graphs'),
             (InfoType.results, SystemType.exp,    'summary',   'summaries'),
+            (InfoType.results, SystemType.exp,    'series',    'series'),
             (InfoType.config,  SystemType.subsys, 'config',    'configs'),
             (InfoType.results, SystemType.subsys, 'status',    'statuses'),
             (InfoType.results, SystemType.subsys, 'output',    'output'),
@@ -106,7 +108,7 @@ class DashboardInfo:
         return [
             self.exp_configs,
             self.exp_data, self.exp_graphs, self.exp_summaries,
-            self.exp_statuses
+            self.exp_statuses, self.exp_series
         ]
 
     def all_subsystem_dirs(self):
@@ -9,15 +9,45 @@ import os
 
 from collections import OrderedDict
 from collections.abc import Iterable
+from itertools import product
+
+import numpy as np
 
 from common import (invoke_main, write_status,
-                    sort_data, time_difference,
+                    time_difference,
                     render_exception, write_json)
-from trial_util import run_trials, configure_seed
-from analysis_util import trials_stat_summary, add_detailed_summary
+from results_store import sort_data
+from series_cache import series_dir, update_series_cache
+from trial_util import (run_trials, configure_seed, config_trial_options,
+                        throughput_settings)
+from analysis_util import (trials_stat_summary, add_detailed_summary,
+                           throughput_summary, set_nested_field,
+                           load_trial_table)
 from summary_util import write_generic_summary
-from plot_util import (generate_longitudinal_comparisons,
-                       PlotBuilder, PlotScale, PlotType)
+from calibration_util import normalize_by_calibration
+from op_profile_util import op_profile_settings, run_op_profiles, add_op_profiles
+from setup_stats_util import add_setup_stats
+from plot_util import (longitudinal_specs, render_plots,
+                       PlotBuilder, PlotScale, PlotType, UnitType)
+
+# Top-level fields of analysis output that hold metrics other than
+# the mean time, with the y label and unit type of their graphs
+AUXILIARY_METRICS = {
+    'throughput': ('Throughput (req/s)', UnitType.RATE),
+    'throughput_latency': ('Latency under Load (ms)', UnitType.SECONDS),
+    # fits of time against input size (e.g., TreeLSTM tree nodes)
+    'fixed_time': ('Fixed Time (ms)', UnitType.SECONDS),
+    'per_node_time': ('Time per Node (ms)', UnitType.SECONDS),
+    # per-operator profiles (see op_profile_util)
+    'op_time': ('Operator Time (ms)', UnitType.SECONDS),
+    # cost of setup stages like compilation (see setup_stats_util)
+    'compile_time': ('Compile Time (ms)', UnitType.SECONDS),
+    'compile_memory': ('Peak Compile Memory (MiB)', UnitType.MEBIBYTES),
+    # statistics of the compiled graph, like fused kernels (see relay_util.graph_stats)
+    'graph_stats': ('Graph Statistic', UnitType.COUNT),
+    # inference time saved per second of compilation (see pass_comparison)
+    'pass_tradeoff': ('Inference Time Saved (ms)\nper Compile Second', UnitType.SECONDS)
+}
 
 
 def common_trial_params(fw, exp_name, trial_func, trial_setup, trial_teardown,
@@ -53,6 +83,25 @@ def common_trial_params(fw, exp_name, trial_func, trial_setup, trial_teardown,
     return gen_trial_params
 
 
+def common_sweep_dims(dims_to_conf_keys):
+    """
+    Returns a function that takes an experiment config and returns
+    an OrderedDict mapping each swept parameter (CSV field name) to
+    the sorted values of its config field, for analysis_template's
+    sweep_dims
+
+    Parameters
+    ==========
+    dims_to_conf_keys: [(str, str)], pairs of a parameter name and
+        the config key holding its values, in the order the
+        dimensions should appear in the result cube
+    """
+    def sweep_dims(config):
+        return OrderedDict([(dim, sorted(config[key]))
+                            for (dim, key) in dims_to_conf_keys])
+    return sweep_dims
+
+
 def common_early_exit(field_contains):
     """
     Returns an 'early exit' function that takes a config dictionary
@@ -68,7 +117,8 @@ def common_early_exit(field_contains):
     return early_exit
 
 
-def run_template(validate_config, check_early_exit=None, gen_trial_params=None):
+def run_template(validate_config, check_early_exit=None, gen_trial_params=None,
+                 op_profiler=None):
     """
     Common template for the "run" step of an experiment.
     Reads a config directory and output directory from the command
@@ -96,6 +146,11 @@ def run_template(validate_config, check_early_exit=None, gen_trial_params=None):
     gen_trial_params: Function that takes a config and returns
          an array of arguments to trial_util.run_trial.
          If this is omitted, no experiment will run.
+
+    op_profiler: Optional function that profiles the operators of a
+         parameter combination (see op_profile_util.run_op_profiles).
+         If specified and the config enables op profiling, every
+         combination is profiled after the trials have run.
     """
     def main(config_dir, output_dir):
         try:
@@ -117,7 +172,18 @@ def run_template(validate_config, check_early_exit=None, gen_trial_params=None):
                 return 0
 
             trial_params = gen_trial_params(config)
-            success, msg = run_trials(*trial_params, path_prefix=output_dir)
+            trial_options = config_trial_options(config)
+            success, msg = run_trials(*trial_params, path_prefix=output_dir,
+                                      **trial_options)
+
+            profile_settings = op_profile_settings(config)
+            if success and op_profiler is not None and profile_settings is not None:
+                fw, task_name = trial_params[:2]
+                parameter_names, parameter_ranges = trial_params[-2:]
+                msg = '{}\n{}'.format(msg, run_op_profiles(
+                    op_profiler, fw, task_name, parameter_names, parameter_ranges,
+                    profile_settings, path_prefix=output_dir,
+                    trial_filter=trial_options['trial_filter']))
             write_status(output_dir, success, msg)
             return 0 if success else 1
         except Exception as e:
@@ -206,6 +272,176 @@ def common_individual_comparison(x_name, title_stem, filename_stem,
     return generate_graphs_by_dev(visualize)
 
 
+def auxiliary_longitudinal_specs(sorted_data, output_dir, subdir_name):
+    """
+    Returns the specs (see plot_util.plot_spec) of longitudinal graphs
+    for each auxiliary metric present in the most recent entry, in a
+    subdirectory named after the metric
+    """
+    if not sorted_data:
+        return []
+    specs = []
+    for key, (stat_name, unit_type) in AUXILIARY_METRICS.items():
+        if key not in sorted_data[-1]:
+            continue
+        projected = [{'timestamp': entry['timestamp'], **entry[key]}
+                     for entry in sorted_data if key in entry]
+        specs += longitudinal_specs(projected, output_dir,
+                                    os.path.join(subdir_name, key),
+                                    stat_name=stat_name,
+                                    unit_type=unit_type)
+    return specs
+
+
+def generate_throughput_curves(entry, output_dir):
+    """
+    Graphs throughput and latency versus the number of concurrent
+    clients, one line per listing, for each device (and network)
+    in the entry's throughput results
+    """
+    if 'throughput' not in entry:
+        return
+
+    for key, title in [('throughput', 'Throughput'),
+                       ('throughput_latency', 'Latency under Load')]:
+        stat_name, unit_type = AUXILIARY_METRICS[key]
+        for dev, listings in entry[key].items():
+            by_network = {}
+            for listing, values in listings.items():
+                first = next(iter(values.values()), None)
+                if isinstance(first, dict):
+                    for network, curve in values.items():
+                        by_network.setdefault(network, {})[listing] = curve
+                else:
+                    by_network.setdefault(None, {})[listing] = values
+
+            for network, curves in by_network.items():
+                suffix = dev if network is None else '{}-{}'.format(dev, network)
+                data = {
+                    'raw': OrderedDict(sorted(curves.items())),
+                    'meta': ['Listing', 'Concurrent Clients', stat_name]
+                }
+                PlotBuilder().set_title('{} on {}'.format(title, suffix)) \
+                             .set_x_label(data['meta'][1]) \
+                             .set_y_label(data['meta'][2]) \
+                             .set_unit_type(unit_type) \
+                             .make(PlotType.MULTI_LINE, data) \
+                             .save(os.path.join(output_dir, 'throughput'),
+                                   '{}-{}.png'.format(key, suffix))
+
+
+def generate_setup_stats_graphs(entry, output_dir):
+    """
+    Graphs the time and peak memory of each setup stage (e.g.,
+    compilation) and each graph statistic in the entry for every
+    listing (and network), one graph per device and stage or statistic
+    """
+    for key in ('compile_time', 'compile_memory', 'graph_stats'):
+        if key not in entry:
+            continue
+        stat_name, unit_type = AUXILIARY_METRICS[key]
+        for dev, listings in entry[key].items():
+            by_stage = {}
+            use_networks = False
+            for listing, values in listings.items():
+                first = next(iter(values.values()), None)
+                if isinstance(first, dict):
+                    use_networks = True
+                    for network, stages in values.items():
+                        for stage, value in stages.items():
+                            by_stage.setdefault(stage, {}).setdefault(
+                                listing, {})[network] = value
+                else:
+                    for stage, value in values.items():
+                        by_stage.setdefault(stage, {})[listing] = value
+
+            for stage, raw in by_stage.items():
+                meta = ['Listing', 'Network', stat_name] if use_networks \
+                       else ['Listing', stat_name]
+                data = {'raw': OrderedDict(sorted(raw.items())), 'meta': meta}
+                PlotBuilder().set_title('{} ({}) on {}'.format(stat_name, stage, dev)) \
+                             .set_x_label(meta[0]) \
+                             .set_y_label(meta[-1]) \
+                             .set_unit_type(unit_type) \
+                             .make(PlotType.MULTI_BAR if use_networks else PlotType.BAR,
+                                   data) \
+                             .save(os.path.join(output_dir, 'setup'),
+                                   '{}-{}-{}.png'.format(key, stage.replace(':', '-'), dev))
+
+
+def _is_numeric_dim(values):
+    return all(isinstance(value, (int, float)) and not isinstance(value, bool)
+               for value in values)
+
+
+def generate_scaling_curves(entry, output_dir):
+    """
+    Graphs the mean time versus each numeric sweep dimension of the
+    entry's result cube (see build_result_cube) that takes more than
+    one value, one line per listing, for every combination of the
+    other dimensions. For batch size, also graphs throughput (inputs
+    per second, i.e., batch size over mean time)
+    """
+    if 'cube' not in entry:
+        return
+
+    dims = entry['cube']['dims']
+    coords = entry['cube']['coords']
+    values = np.array(entry['cube']['values'], dtype=np.float64)
+    listing_axis = dims.index('listing')
+
+    for axis, dim in enumerate(dims):
+        if dim in {'device', 'listing', 'network'}:
+            continue
+        if len(coords[dim]) <= 1 or not _is_numeric_dim(coords[dim]):
+            continue
+
+        others = [i for i in range(len(dims)) if i not in {axis, listing_axis}]
+        for other_idx in product(*[range(len(coords[dims[i]])) for i in others]):
+            index = [None] * len(dims)
+            for i, j in zip(others, other_idx):
+                index[i] = j
+
+            times = {}
+            for l, listing in enumerate(coords['listing']):
+                index[listing_axis] = l
+                curve = {}
+                for x, coord in enumerate(coords[dim]):
+                    index[axis] = x
+                    value = values[tuple(index)]
+                    if not np.isnan(value):
+                        curve[coord] = float(value)
+                if curve:
+                    times[listing] = curve
+            if not times:
+                continue
+
+            fixed = [(dims[i], coords[dims[i]][j]) for i, j in zip(others, other_idx)]
+            suffix = '-'.join(str(value) for (_, value) in fixed)
+            description = ', '.join('{}={}'.format(name, value) for (name, value) in fixed)
+
+            graphs = [('time', 'Mean Time (ms)', UnitType.SECONDS, times)]
+            if dim == 'batch_size':
+                throughput = {listing: {batch: batch / time for batch, time in curve.items()}
+                              for listing, curve in times.items()}
+                graphs.append(('throughput', 'Throughput (inputs/s)',
+                               UnitType.RATE, throughput))
+
+            for (name, stat_name, unit_type, curves) in graphs:
+                data = {
+                    'raw': OrderedDict(sorted(curves.items())),
+                    'meta': ['Listing', dim, stat_name]
+                }
+                PlotBuilder().set_title('{} vs. {} ({})'.format(
+                                 stat_name, dim, description)) \
+                             .set_x_label(dim) \
+                             .set_y_label(stat_name) \
+                             .set_unit_type(unit_type) \
+                             .make(PlotType.MULTI_LINE, data) \
+                             .save(os.path.join(output_dir, 'scaling', dim),
+                                   '{}-{}.png'.format(name, suffix))
+
+
 def visualize_template(validate_config, generate_individual_comparisons):
     """
     Common template for the "visualize" step of an experiment.
@@ -217,7 +453,13 @@ def visualize_template(validate_config, generate_individual_comparisons):
     Runs generate_individual_comparisons on the most recent
     data file with the config. Also generates lognitudinal
     comparisons (using the basic function) over all time
-    and over the last two weeks.
+    and over the last two weeks, including for any auxiliary
+    metrics (e.g., throughput) present in the data, and over all
+    time normalized by the machine calibration scores if present.
+    If setup stages like compilation were tracked, also graphs their
+    cost in the most recent data for each listing.
+    If the data has a result cube over the sweep parameters, also
+    graphs scaling curves (e.g., time and throughput versus batch size).
 
     Exits with a ret code of 1 if there is any problem or exception,
     otherwise exits with 0
@@ -242,14 +484,38 @@ def visualize_template(validate_config, generate_individual_comparisons):
                 write_status(output_dir, False, msg)
                 return 1
 
-            all_data = sort_data(data_dir)
+            # the graphs over time only need the metrics of the older entries
+            all_data = sort_data(data_dir, full=False)
             most_recent = all_data[-1]
             last_two_weeks = [entry for entry in all_data
                               if time_difference(most_recent, entry).days < 14]
 
-            generate_longitudinal_comparisons(all_data, output_dir, 'all_time')
-            generate_longitudinal_comparisons(last_two_weeks, output_dir, 'two_weeks')
+            # the metric histories come from the experiment's series cache
+            # when there is one, so they are not rebuilt from every entry
+            all_time_series, two_week_series = None, None
+            cache_dir = series_dir(data_dir)
+            if cache_dir is not None:
+                cache = update_series_cache(cache_dir, data_dir)
+                all_time_series = cache.metric_series()
+                two_week_series = cache.metric_series(
+                    after_epoch=cache.epochs()[-1] - 14*24*60*60)
+
+            # the longitudinal graphs are rendered together on a process pool
+            normalized = normalize_by_calibration(all_data)
+            render_plots(
+                longitudinal_specs(all_data, output_dir, 'all_time',
+                                   series=all_time_series)
+                + longitudinal_specs(last_two_weeks, output_dir, 'two_weeks',
+                                     series=two_week_series)
+                + auxiliary_longitudinal_specs(all_data, output_dir, 'all_time')
+                + auxiliary_longitudinal_specs(last_two_weeks, output_dir, 'two_weeks')
+                # same graphs with times scaled by machine speed (see calibration_util)
+                + longitudinal_specs(normalized, output_dir, 'all_time_normalized',
+                                     stat_name='Normalized Time (ms)'))
             generate_individual_comparisons(config, most_recent, output_dir)
+            generate_throughput_curves(most_recent, output_dir)
+            generate_setup_stats_graphs(most_recent, output_dir)
+            generate_scaling_curves(most_recent, output_dir)
         except Exception as e:
             write_status(output_dir, False,
                          'Exception encountered:\n' + render_exception(e))
@@ -301,8 +567,81 @@ def summarize_template(validate_config, use_networks=True):
     invoke_main(main, 'data_dir', 'config_dir', 'output_dir')
 
 
+def add_throughput_summaries(report, config, data_dir, listing_settings,
+                             generate_data_query, use_networks=True):
+    """
+    Adds the throughput-mode results (see trial_util.run_throughput_trials)
+    for every device, listing, and network (if use_networks) to the
+    report under the top-level fields 'throughput' (requests per second)
+    and 'throughput_latency' (seconds), each keyed in the end by the
+    number of concurrent clients
+    """
+    for dev in config['devices']:
+        for listing, settings in listing_settings.items():
+            queries = {None: generate_data_query(config, dev, settings)} \
+                      if not use_networks else \
+                      {network: generate_data_query(config, dev, network, settings)
+                       for network in config['networks']}
+            for network, query in queries.items():
+                fw, task_name, _, parameter_names, params_to_match = query
+                summary = throughput_summary(data_dir, fw, task_name,
+                                             parameter_names, params_to_match)
+                if summary is None:
+                    continue
+                fields = [dev, listing] if network is None else [dev, listing, network]
+                for (key, stat) in [('throughput', 'throughput'),
+                                    ('throughput_latency', 'latency')]:
+                    set_nested_field(report,
+                                     {level: stats[stat] for level, stats in summary.items()},
+                                     key, *fields)
+
+
+def build_result_cube(config, data_dir, listing_settings, generate_data_query,
+                      sweep_dims, use_networks=True):
+    """
+    Summarizes every point of the experiment's parameter sweep rather
+    than only the one the data queries select: returns
+    {'dims': [dimension names], 'coords': {dimension => values},
+     'values': nested lists (one level per dimension) of mean times}
+    with the dimensions being the device, listing, network (if
+    use_networks), and the swept parameters. The value is None
+    where a point has no measurements.
+
+    The sweep values are substituted into the field values of the data
+    query for the device, listing, and network, so every swept parameter
+    must be one of the query's parameter names.
+    """
+    sweep = sweep_dims(config)
+    coords = OrderedDict([('device', sorted(config['devices'])),
+                          ('listing', sorted(listing_settings.keys()))])
+    if use_networks:
+        coords['network'] = sorted(config['networks'])
+    coords.update(sweep)
+    dims = list(coords.keys())
+
+    def mean_at(point):
+        settings = listing_settings[point['listing']]
+        query = generate_data_query(config, point['device'], settings) \
+                if not use_networks else \
+                generate_data_query(config, point['device'], point['network'], settings)
+        fw, task_name, num_reps, parameter_names, field_values = query
+        field_values = {**field_values, **{dim: point[dim] for dim in sweep}}
+        table = load_trial_table(data_dir, fw, task_name, parameter_names)
+        # only the mean is kept, so skip the rest of the summary (bootstrap included)
+        return table.mean(field_values, num_reps)
+
+    def fill(point, remaining):
+        if not remaining:
+            return mean_at(point)
+        return [fill({**point, remaining[0]: value}, remaining[1:])
+                for value in coords[remaining[0]]]
+
+    return {'dims': dims, 'coords': coords, 'values': fill({}, dims)}
+
+
 def analysis_template(validate_config, generate_listing_settings,
-                      generate_data_query, use_networks=True):
+                      generate_data_query, use_networks=True,
+                      extra_analysis=None, sweep_dims=None):
     """
     Common template for the "visualize" step of an experiment.
 
@@ -337,6 +676,21 @@ def analysis_template(validate_config, generate_listing_settings,
     use_networks: Assumes the config has multiple networks and
         the analysis should analyze each network separately.
         True by default
+
+    extra_analysis: Optional function that takes the config, data dir,
+        and the summary dictionary produced above and adds any further
+        experiment-specific fields to the dictionary in place
+
+    sweep_dims: Optional function that takes the config and returns an
+        OrderedDict mapping each swept parameter to its values (see
+        common_sweep_dims). If specified, the summary also gets a
+        'cube' field with the mean time at every point of the sweep
+        (see build_result_cube)
+
+    The cost of the setup stages tracked during the run (e.g.,
+    compilation; see setup_stats_util) is added as well, and if the
+    config enables op profiling, so are the top operators of every
+    listing with profiles (see op_profile_util)
     """
     def main(data_dir, config_dir, output_dir):
         config, msg = validate_config(config_dir)
@@ -372,6 +726,35 @@ def analysis_template(validate_config, generate_listing_settings,
 
                     ret[dev][listing][network] = summary['mean']
                     add_detailed_summary(ret, summary, dev, listing, network)
+
+        if throughput_settings(config) is not None:
+            add_throughput_summaries(ret, config, data_dir, listing_settings,
+                                     generate_data_query, use_networks)
+
+        add_setup_stats(ret, config, data_dir, listing_settings,
+                        generate_data_query, use_networks)
+
+        if op_profile_settings(config) is not None:
+            add_op_profiles(ret, config, data_dir, listing_settings,
+                            generate_data_query, use_networks)
+
+        if sweep_dims is not None:
+            try:
+                ret['cube'] = build_result_cube(config, data_dir, listing_settings,
+                                                generate_data_query, sweep_dims,
+                                                use_networks)
+            except Exception as e:
+                write_status(output_dir, False,
+                             'Exception encountered:\n' + render_exception(e))
+                return 1
+
+        if extra_analysis is not None:
+            try:
+                extra_analysis(config, data_dir, ret)
+            except Exception as e:
+                write_status(output_dir, False,
+                             'Exception encountered:\n' + render_exception(e))
+                return 1
         write_json(output_dir, 'data.json', ret)
         write_status(output_dir, True, 'success')
 
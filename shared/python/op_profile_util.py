@@ -0,0 +1,131 @@
+"""
+Per-operator profiles for experiments whose trials run a compiled
+graph (e.g., Relay CNNs on TVM's graph runtime): how long each
+operator (fused function) of the graph takes, so that a change in
+the end-to-end time can be traced to the operators responsible.
+
+If enabled in the config, the run step (see exp_templates.run_template)
+profiles every parameter combination with the experiment's profiler
+after the usual trials and writes the times to
+path_prefix/method-task_name-op_profile.csv, laid out like a trial CSV
+with the operator as an extra parameter. The analysis reports the
+operators taking the most time in each listing, with their mean
+times under the top-level field 'op_time' and their shares of the
+total operator time under 'op_share'.
+"""
+import csv
+import os
+from collections import OrderedDict
+from itertools import product
+
+import numpy as np
+
+from analysis_util import load_trial_table, set_nested_field
+from trial_util import filter_combos
+
+
+def op_profile_settings(config):
+    """
+    Reads the optional 'op_profile' field of an experiment config
+    and returns it with defaults filled in, or None if profiling
+    is not enabled. The field has the form
+    {
+        "enable": bool,
+        "number": times each operator runs per measurement (default 10),
+        "reps": measurements of each parameter combination (default 3),
+        "top_n": operators to report per listing (default 10)
+    }
+    """
+    settings = config.get('op_profile', None)
+    if not settings or not settings.get('enable', False):
+        return None
+    return {
+        'number': max(1, int(settings.get('number', 10))),
+        'reps': max(1, int(settings.get('reps', 3))),
+        'top_n': max(1, int(settings.get('top_n', 10)))
+    }
+
+
+def op_profile_task(task_name):
+    """Task name under which the op profiles of a task are written"""
+    return '{}-op_profile'.format(task_name)
+
+
+def run_op_profiles(profiler, method, task_name, parameter_names, parameter_ranges,
+                    settings, path_prefix='', trial_filter=None):
+    """
+    Profiles every combination of the parameter ranges (only those
+    matching trial_filter, if given; see trial_util.filter_combos) and
+    writes the operator times to path_prefix/method-task_name-op_profile.csv.
+
+    profiler takes a combination's parameters and the keyword arguments
+    number and reps (from op_profile_settings) and returns a list with
+    one dict {operator name: time in seconds} per rep.
+
+    Returns a message reporting how many combinations were profiled
+    """
+    combos = list(product(*parameter_ranges))
+    if trial_filter is not None:
+        combos = filter_combos(parameter_ranges, combos, trial_filter)
+
+    filename = os.path.join(path_prefix, '{}-{}.csv'.format(
+        method, op_profile_task(task_name)))
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(list(parameter_names) + ['op', 'rep', 'run', 'time'])
+        for args in combos:
+            profiles = profiler(*args, number=settings['number'], reps=settings['reps'])
+            for rep, times in enumerate(profiles):
+                for op, time in times.items():
+                    writer.writerow(list(args) + [op, rep, 0, time])
+    return 'Profiled the operators of {} combinations'.format(len(combos))
+
+
+def op_profile_summary(data_dir, method, task_name, parameter_names, params_to_match,
+                       top_n):
+    """
+    Returns ({operator: mean time in seconds}, {operator: share of the
+    total operator time}) for the top_n operators by mean time in the
+    profiles matching params_to_match, or None if there are none
+    """
+    if not os.path.exists(os.path.join(data_dir, '{}-{}.csv'.format(
+            method, op_profile_task(task_name)))):
+        return None
+    table = load_trial_table(data_dir, method, op_profile_task(task_name),
+                             list(parameter_names) + ['op'])
+    idx = table.select(params_to_match)
+    if not len(idx):
+        return None
+
+    ops, inverse = np.unique(table.columns['op'][idx], return_inverse=True)
+    means = np.bincount(inverse, weights=table.columns['time'][idx]) / np.bincount(inverse)
+    total = np.sum(means)
+    shares = means / total if total > 0 else np.zeros_like(means)
+    top = np.argsort(-means, kind='stable')[:top_n]
+    return (OrderedDict((ops[i], float(means[i])) for i in top),
+            OrderedDict((ops[i], float(shares[i])) for i in top))
+
+
+def add_op_profiles(report, config, data_dir, listing_settings,
+                    generate_data_query, use_networks=True):
+    """
+    Adds the top operators (see op_profile_summary) of every device,
+    listing, and network (if use_networks) with op profiles to the
+    report under the top-level fields 'op_time' and 'op_share'
+    """
+    top_n = op_profile_settings(config)['top_n']
+    for dev in config['devices']:
+        for listing, settings in listing_settings.items():
+            queries = {None: generate_data_query(config, dev, settings)} \
+                      if not use_networks else \
+                      {network: generate_data_query(config, dev, network, settings)
+                       for network in config['networks']}
+            for network, query in queries.items():
+                fw, task_name, _, parameter_names, params_to_match = query
+                summary = op_profile_summary(data_dir, fw, task_name,
+                                             parameter_names, params_to_match, top_n)
+                if summary is None:
+                    continue
+                fields = [dev, listing] if network is None else [dev, listing, network]
+                set_nested_field(report, summary[0], 'op_time', *fields)
+                set_nested_field(report, summary[1], 'op_share', *fields)
@@ -0,0 +1,241 @@
+"""
+Diffs two dashboard runs: lines up every metric of every experiment
+between a "before" and an "after" run (each given as a dashboard
+timestamp or a TVM hash prefix) and reports the relative change of
+each along with how significant it is, largest regressions first.
+
+Significance comes from the detailed summaries (see
+analysis_util.robust_summary) where present: the standard error of each
+mean is estimated from the variance between rep means when there are
+several reps (otherwise from the overall std and number of measurements),
+and the two means are compared with a two-sided Welch z-test.
+
+Also usable from the command line (dashboard/relaybench-diff wraps it):
+    relaybench-diff --home-dir ~/dashboard-home \\
+        --before 03-13-2020-0200 --after 03-14-2020-0200 --format html --output diff.html
+"""
+import argparse
+import datetime
+import html
+import json
+import math
+import os
+import sys
+
+from common import flatten_fields
+from dashboard_info import DashboardInfo
+from results_store import ResultsStore, STORE_FILENAME
+from results_query import sync_store, format_table
+
+DIFF_COLUMNS = ['experiment', 'metric', 'before', 'after', 'change', 'p_value']
+# p-values under this are highlighted
+SIGNIFICANCE_LEVEL = 0.05
+
+
+def is_timestamp(run_spec):
+    try:
+        datetime.datetime.strptime(run_spec, '%m-%d-%Y-%H%M')
+        return True
+    except ValueError:
+        return False
+
+
+def _lookup(entry, fields):
+    for field in fields:
+        if not isinstance(entry, dict) or field not in entry:
+            return None
+        entry = entry[field]
+    return entry
+
+
+def standard_error(detailed):
+    """
+    Standard error of the mean from a detailed summary,
+    or None if it does not have the needed fields
+    """
+    if not isinstance(detailed, dict):
+        return None
+    num_reps = detailed.get('num_reps', 0)
+    if num_reps > 1 and 'between_rep_var' in detailed:
+        return math.sqrt(detailed['between_rep_var'] / num_reps)
+    n = detailed.get('n', 0)
+    if n > 1 and 'std' in detailed:
+        return detailed['std'] / math.sqrt(n)
+    return None
+
+
+def welch_p_value(mean_a, se_a, mean_b, se_b):
+    """Two-sided p-value of the difference of two means with the given standard errors"""
+    spread = math.sqrt(se_a ** 2 + se_b ** 2)
+    if spread == 0:
+        return 0.0 if mean_a != mean_b else 1.0
+    z = (mean_b - mean_a) / spread
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def diff_entries(experiment, before, after):
+    """
+    Returns a diff row (dict with the fields of DIFF_COLUMNS) for every
+    metric present in both data entries
+    """
+    before_metrics = dict(flatten_fields(before))
+    rows = []
+    for (fields, after_value) in flatten_fields(after):
+        if fields not in before_metrics:
+            continue
+        before_value = before_metrics[fields]
+        change = None
+        if before_value != 0:
+            change = (after_value - before_value) / before_value
+
+        p_value = None
+        se_before = standard_error(_lookup(before.get('detailed', {}), fields))
+        se_after = standard_error(_lookup(after.get('detailed', {}), fields))
+        if se_before is not None and se_after is not None:
+            p_value = welch_p_value(before_value, se_before, after_value, se_after)
+
+        rows.append({
+            'experiment': experiment,
+            'metric': '/'.join(map(str, fields)),
+            'before': before_value,
+            'after': after_value,
+            'change': change,
+            'p_value': p_value
+        })
+    return rows
+
+
+def _find(store, experiment, run_spec):
+    if is_timestamp(run_spec):
+        return store.find_run(experiment, timestamp=run_spec)
+    return store.find_run(experiment, tvm_hash=run_spec)
+
+
+def diff_runs(data_dir, before, after, experiments=None, sync=True):
+    """
+    Diffs the runs specified by before and after (dashboard timestamps
+    or TVM hash prefixes, in which case the latest run with the hash is
+    used) in every experiment that has both. Returns the diff rows
+    sorted by relative change, largest increase (regression, for times)
+    first; metrics whose change is undefined come last.
+    """
+    rows = []
+    with ResultsStore(os.path.join(data_dir, STORE_FILENAME)) as store:
+        if sync:
+            sync_store(store, data_dir, experiments)
+        for experiment in store.experiments():
+            if experiments is not None and experiment not in experiments:
+                continue
+            before_entry = _find(store, experiment, before)
+            after_entry = _find(store, experiment, after)
+            if before_entry is None or after_entry is None:
+                continue
+            rows += diff_entries(experiment, before_entry, after_entry)
+    return sorted(rows, key=lambda row: (row['change'] is None,
+                                         -(row['change'] or 0)))
+
+
+def latest_runs(data_dir, sync=True):
+    """
+    Returns the timestamps of the two most recent dashboard runs
+    (before, after), or None if there have not been two
+    """
+    with ResultsStore(os.path.join(data_dir, STORE_FILENAME)) as store:
+        if sync:
+            sync_store(store, data_dir)
+        timestamps = store.timestamps()
+    if len(timestamps) < 2:
+        return None
+    return (timestamps[-2], timestamps[-1])
+
+
+def _format_row(row):
+    change = 'n/a' if row['change'] is None else '{:+.2%}'.format(row['change'])
+    p_value = 'n/a' if row['p_value'] is None else '{:.3g}'.format(row['p_value'])
+    return [row['experiment'], row['metric'], '{:.4g}'.format(row['before']),
+            '{:.4g}'.format(row['after']), change, p_value]
+
+
+def format_text(rows, before, after):
+    return 'Changes from {} to {}:\n{}'.format(
+        before, after, format_table(DIFF_COLUMNS, [_format_row(row) for row in rows]))
+
+
+def format_html(rows, before, after):
+    lines = [
+        '<html>',
+        '<head><title>Changes from {} to {}</title></head>'.format(
+            html.escape(before), html.escape(after)),
+        '<body bgcolor="ffffff">',
+        '<div align="center">',
+        '<h1>Changes from {} to {}</h1>'.format(html.escape(before), html.escape(after)),
+        '<p>Sorted by relative change, largest increase first. '
+        'Rows with p &lt; {} are highlighted '
+        '(red for increases, green for decreases).</p>'.format(SIGNIFICANCE_LEVEL),
+        '<table border="1" cellpadding="4" style="border-collapse: collapse;">',
+        '<tr>{}</tr>'.format(''.join('<th>{}</th>'.format(column) for column in DIFF_COLUMNS))
+    ]
+    for row in rows:
+        style = ''
+        if row['p_value'] is not None and row['p_value'] < SIGNIFICANCE_LEVEL \
+           and row['change'] is not None:
+            color = 'ffcccc' if row['change'] > 0 else 'ccffcc'
+            style = ' style="background-color: #{};"'.format(color)
+        lines.append('<tr{}>{}</tr>'.format(
+            style, ''.join('<td>{}</td>'.format(html.escape(value))
+                           for value in _format_row(row))))
+    lines += ['</table>', '</div>', '</body>', '</html>']
+    return '\n'.join(lines) + '\n'
+
+
+def write_diff(rows, before, after, output_format, output):
+    if output_format == 'json':
+        text = json.dumps({'before': before, 'after': after, 'diff': rows}, indent=1) + '\n'
+    elif output_format == 'html':
+        text = format_html(rows, before, after)
+    else:
+        text = format_text(rows, before, after)
+
+    if output is None:
+        sys.stdout.write(text)
+        return
+    with open(output, 'w') as f:
+        f.write(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff the metrics of two dashboard runs')
+    location = parser.add_mutually_exclusive_group(required=True)
+    location.add_argument('--home-dir', type=str, help='dashboard home directory')
+    location.add_argument('--data-dir', type=str, help='experiment data directory')
+    parser.add_argument('--before', type=str,
+                        help='dashboard timestamp or TVM hash prefix of the earlier run '
+                        '(default: the second most recent run)')
+    parser.add_argument('--after', type=str,
+                        help='dashboard timestamp or TVM hash prefix of the later run '
+                        '(default: the most recent run)')
+    parser.add_argument('--experiment', action='append', dest='experiments',
+                        help='experiment to include (repeatable)')
+    parser.add_argument('--format', choices=['text', 'json', 'html'], default='text')
+    parser.add_argument('--output', type=str, help='output file (default: stdout)')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if args.home_dir is not None:
+        data_dir = DashboardInfo(os.path.expanduser(args.home_dir)).exp_data
+    data_dir = os.path.expanduser(data_dir)
+
+    before, after = args.before, args.after
+    if before is None or after is None:
+        latest = latest_runs(data_dir)
+        if latest is None:
+            parser.error('fewer than two runs recorded; specify --before and --after')
+        before = latest[0] if before is None else before
+        after = latest[1] if after is None else after
+
+    rows = diff_runs(data_dir, before, after, experiments=args.experiments)
+    write_diff(rows, before, after, args.format, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,8 @@ import copy
 import datetime
 import enum
 import functools
-import itertools
 import logging
+import multiprocessing
 import os
 
 import numpy as np
@@ -18,7 +18,7 @@ from matplotlib.font_manager import FontProperties
 import seaborn as sns
 import pandas as pd
 
-from common import prepare_out_file, gather_stats, traverse_fields
+from common import prepare_out_file, metric_series
 
 NUM_SIG_FIGS = 3
 
@@ -27,6 +27,12 @@ class UnitType(enum.Enum):
     MILLISECONDS = 1
     # speedup or slowdown
     COMPARATIVE = 2
+    # events per second, e.g., throughput
+    RATE = 3
+    # memory in MiB
+    MEBIBYTES = 4
+    # counts or other unitless quantities
+    COUNT = 5
 
 
 UNIT_TYPE = UnitType.SECONDS
@@ -38,6 +44,8 @@ class PlotType(enum.Enum):
     MULTI_BAR = 1
     # longitudinal graph
     LONGITUDINAL = 2
+    # line plot with one line per series (e.g., scaling curves)
+    MULTI_LINE = 3
 
     def is_bar_variant(self):
         return self in {PlotType.BAR, PlotType.MULTI_BAR}
@@ -84,6 +92,8 @@ class PlotBuilder:
             y_data = CatPlotter(self).make(data)
         elif plot_type == PlotType.LONGITUDINAL:
             y_data = LongitudinalPlotter(self).make(data)
+        elif plot_type == PlotType.MULTI_LINE:
+            y_data = MultiLinePlotter(self).make(data)
         else:
             raise RuntimeError(f'unknown plot type "{plot_type}"')
 
@@ -117,7 +127,8 @@ class PlotBuilder:
 
         if self.unit_type == UnitType.SECONDS:
             return val * 1e3
-        elif self.unit_type in (UnitType.MILLISECONDS, UnitType.COMPARATIVE):
+        elif self.unit_type in (UnitType.MILLISECONDS, UnitType.COMPARATIVE, UnitType.RATE,
+                                UnitType.MEBIBYTES, UnitType.COUNT):
             return val
         else:
             raise RuntimeError(f'unhandled unit type "{self.unit_type}"')
@@ -472,39 +483,187 @@ class LongitudinalPlotter:
         })
 
 
-def generate_longitudinal_comparisons(sorted_data, output_dir,
-                                      subdir_name='longitudinal',
-                                      stat_name='Time (ms)',
-                                      unit_type=UnitType.SECONDS):
+class MultiLinePlotter:
+    def __init__(self, builder):
+        self.builder = builder
+
+    def make(self, data):
+        """
+        Creates and configures a line plot with one line per series,
+        using `data` for the values to plot.
+
+        The schema for `data` is
+            {
+                'meta': [series label, x label, y label],
+                'raw': {
+                    series #1: {
+                        x val #1: (series #1, x val #1) y val,
+                        x val #2: (series #1, x val #2) y val,
+                        ...
+                    },
+                    ...
+                },
+            }
+        with an example instance being
+            {
+                'meta': ['Framework', 'Concurrent Clients', 'Throughput (req/s)'],
+                'raw': {
+                    'Relay': {1: 310.2, 2: 580.9, 4: 1012.5},
+                    'Pytorch': {1: 150.3, 2: 281.0, 4: 498.7},
+                },
+            }
+        .  The x values must be numeric.
+        """
+        self.process_data(data)
+        df = self.to_dataframe(data)
+        if df.empty:
+            raise RuntimeError('no data to plot')
+
+        metadata = data['meta']
+        kwargs = {
+            'x': metadata[1],
+            'y': metadata[2],
+            'hue': metadata[0],
+            'data': df,
+            'marker': 'o'
+        }
+        if hasattr(self.builder, 'bar_colors'):
+            kwargs['palette'] = self.builder.bar_colors
+        sns.lineplot(**kwargs)
+        return list(df[metadata[2]])
+
+    def process_data(self, data):
+        raw_data = data['raw']
+        for path, val in list(_traverse_dict(raw_data)):
+            new_val = self.builder.filter_y_val(val)
+            if new_val is None:
+                del raw_data[path[0]][path[1]]
+            else:
+                raw_data[path[0]][path[1]] = new_val
+
+    def to_dataframe(self, data):
+        metadata = data['meta']
+        rows = [(series, float(x), y)
+                for series, points in data['raw'].items()
+                for x, y in points.items()]
+        rows.sort(key=lambda row: (row[0], row[1]))
+        return pd.DataFrame({
+            metadata[0]: [row[0] for row in rows],
+            metadata[1]: [row[1] for row in rows],
+            metadata[2]: [row[2] for row in rows]
+        })
+
+
+def plot_spec(plot_type, data, dirname, filename, **settings):
     """
-    Generic longitudinal graph generator. Given a list of JSON
-    objects sorted by timestamp, generates a
-    longitudinal graph for every combination of the
-    entries' fields (based on traversing the most recent entry) and
-    writes it to output_dir/longitudinal.
+    Describes a plot to render later (see render_plots): the arguments
+    of PlotBuilder.make and save, and the builder settings, named after
+    the PlotBuilder setters (e.g., title=... for set_title)
+    """
+    return {
+        'plot_type': plot_type,
+        'data': data,
+        'dirname': dirname,
+        'filename': filename,
+        'settings': settings
+    }
+
+
+def render_plot(spec):
+    builder = PlotBuilder()
+    for name, value in spec['settings'].items():
+        getattr(builder, 'set_{}'.format(name))(value)
+    builder.make(spec['plot_type'], spec['data']) \
+           .save(spec['dirname'], spec['filename'])
+
+
+# specs being rendered by render_plots, inherited by its forked workers
+_PENDING_SPECS = []
+
+
+def _render_pending(idx):
+    render_plot(_PENDING_SPECS[idx])
+
+
+def render_plots(specs, workers=None):
+    """
+    Renders the plots described by the given specs (see plot_spec) on a
+    pool of forked processes (workers of them, default one per core),
+    which inherit the already imported Matplotlib and Seaborn rather than
+    importing them again. Every plot is made in a fresh figure with the
+    style reset (see PlotBuilder.make), so the files are the same as if
+    the plots were rendered one after another in this process, which is
+    what happens if there is only one plot or one worker
     """
-    if not sorted_data:
+    specs = list(specs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(specs))
+    if workers <= 1:
+        for spec in specs:
+            render_plot(spec)
         return
 
-    field_values = traverse_fields(sorted_data[-1])
+    # the workers look the specs up by index, so they are not pickled
+    _PENDING_SPECS[:] = specs
+    try:
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(processes=workers) as pool:
+            pool.map(_render_pending, range(len(specs)), chunksize=1)
+    finally:
+        _PENDING_SPECS.clear()
+
+
+def longitudinal_specs(sorted_data, output_dir,
+                       subdir_name='longitudinal',
+                       stat_name='Time (ms)',
+                       unit_type=UnitType.SECONDS,
+                       series=None):
+    """
+    Returns the specs (see plot_spec) of the graphs
+    generate_longitudinal_comparisons makes, so that those of several
+    calls can be rendered together by render_plots.
+    If series (as from common.metric_series, e.g., read from a
+    series_cache.SeriesCache) is given, it is graphed instead of
+    sorted_data's metrics
+    """
+    if series is None:
+        series = metric_series(sorted_data) if sorted_data else {}
+    if not series:
+        return []
+
     longitudinal_dir = os.path.join(output_dir, subdir_name)
 
-    for fields in itertools.product(*field_values):
-        stats, times = gather_stats(sorted_data, fields)
-        if not stats:
-            continue
+    specs = []
+    for fields, (stats, times) in series.items():
 
         data = {
             'raw': {'x': times, 'y': stats},
             'meta': ['Date of Run', stat_name]
         }
-        PlotBuilder() \
-            .set_title('({}) over Time'.format(','.join(fields))) \
-            .set_x_label(data['meta'][0]) \
-            .set_y_label(data['meta'][1]) \
-            .set_unit_type(unit_type) \
-            .make(PlotType.LONGITUDINAL, data) \
-            .save(longitudinal_dir, 'longitudinal-{}.png'.format('-'.join(fields)))
+        specs.append(plot_spec(PlotType.LONGITUDINAL, data, longitudinal_dir,
+                               'longitudinal-{}.png'.format('-'.join(fields)),
+                               title='({}) over Time'.format(','.join(fields)),
+                               x_label=data['meta'][0],
+                               y_label=data['meta'][1],
+                               unit_type=unit_type))
+    return specs
+
+
+def generate_longitudinal_comparisons(sorted_data, output_dir,
+                                      subdir_name='longitudinal',
+                                      stat_name='Time (ms)',
+                                      unit_type=UnitType.SECONDS):
+    """
+    Generic longitudinal graph generator. Given a list of JSON
+    objects sorted by timestamp, generates a
+    longitudinal graph for every combination of the
+    entries' fields (based on traversing the most recent entry) and
+    writes it to output_dir/longitudinal. The graphs are rendered in
+    parallel (see render_plots).
+    """
+    render_plots(longitudinal_specs(sorted_data, output_dir, subdir_name,
+                                    stat_name, unit_type))
 
 
 def _is_valid_num(val):
@@ -0,0 +1,136 @@
+"""
+Utilities for running benchmark work in separate processes:
+pipe-connected worker processes that can be recycled, plus helpers
+for CPU affinity and memory accounting.
+"""
+import multiprocessing
+import multiprocessing.connection
+import os
+
+import psutil
+
+
+def rss_mb(pid=None):
+    """Returns the resident set size of the process (default: this one) in MiB"""
+    return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+
+
+def parse_cpu_list(cores):
+    """
+    Parses a taskset-style CPU list (e.g., "0-3,8,10-11") into
+    a sorted list of CPU ids. Integers and lists of integers
+    are also accepted for convenience.
+    """
+    if isinstance(cores, int):
+        return [cores]
+    if isinstance(cores, (list, tuple, set)):
+        return sorted({int(core) for core in cores})
+
+    ret = set()
+    for part in str(cores).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            low, high = part.split('-')
+            ret.update(range(int(low), int(high) + 1))
+        else:
+            ret.add(int(part))
+    return sorted(ret)
+
+
+# the CPU affinity the process started with (e.g., from taskset)
+_INITIAL_AFFINITY = None
+
+
+def pin_to_cpus(n):
+    """
+    Restricts this process to the first n CPUs of the affinity it
+    started with (so thread sweeps stay within the cores given by
+    process pinning), or restores that affinity if n is 0.
+    Returns the list of CPUs used.
+    """
+    global _INITIAL_AFFINITY
+    if _INITIAL_AFFINITY is None:
+        _INITIAL_AFFINITY = sorted(os.sched_getaffinity(0))
+    cpus = _INITIAL_AFFINITY
+    if n > 0:
+        cpus = _INITIAL_AFFINITY[:n]
+    os.sched_setaffinity(0, cpus)
+    return cpus
+
+
+def _worker_loop(conn, handler):
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        handler(msg, conn.send)
+    conn.close()
+
+
+class Worker:
+    """
+    A child process connected to the parent by a duplex pipe.
+
+    The child calls handler(message, send) for every message the parent
+    sends it and exits when it receives None (or when the parent's end of
+    the pipe closes). The handler reports back by calling send(obj).
+
+    With the 'fork' context, the handler may be any callable (including
+    closures); with 'spawn', it must be picklable, i.e., a module-level
+    function.
+    """
+    def __init__(self, handler, context='fork'):
+        ctx = multiprocessing.get_context(context)
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_loop,
+                                   args=(child_conn, handler),
+                                   daemon=True)
+        self.process.start()
+        # only the child should hold its end, so that we see EOF if it dies
+        child_conn.close()
+
+    def send(self, msg):
+        self.conn.send(msg)
+
+    def recv(self):
+        return self.conn.recv()
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def exitcode(self):
+        return self.process.exitcode
+
+    def rss_mb(self):
+        try:
+            return rss_mb(self.process.pid)
+        except psutil.NoSuchProcess:
+            return 0.0
+
+    def stop(self, timeout=10):
+        """Asks the child to exit, killing it if it does not do so in time"""
+        try:
+            if self.alive():
+                self.conn.send(None)
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+def wait_for_workers(workers, timeout=None):
+    """
+    Blocks until at least one of the given workers has sent a message
+    or exited. Returns the list of ready workers.
+    """
+    by_conn = {worker.conn: worker for worker in workers}
+    ready = multiprocessing.connection.wait(list(by_conn.keys()), timeout)
+    return [by_conn[conn] for conn in ready]
@@ -1,9 +1,27 @@
+import atexit
+import inspect
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from itertools import product
+
 import tvm
 from tvm import relay
 from tvm.relay import transform
+from tvm.contrib.debugger import debug_runtime
 import numpy as np
 import aot
 
+from common import render_exception
+from process_util import parse_cpu_list, pin_to_cpus
+from setup_stats_util import (track, collect_records, record, replay, record_graph_stats,
+                              PeakMemory)
+
 ALL_PASSES = {
     'FoldScaleAxis',
     'BackwardFoldScaleAxis',
@@ -136,14 +154,213 @@ def get_network(name, batch_size, dtype='float32', ir='relay'):
     return net, params, input_shape
 
 
-def setup_relay_mod(net, image_shape, input_name, params, dev, opt,
-                    required_pass=None, disabled_pass=None):
-    device = tvm.cpu(0) if dev == 'cpu' else tvm.gpu(0)
+def _supports_pass_trace():
+    try:
+        return 'trace' in inspect.signature(relay.build_config).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+# pass contexts only take a trace callback in TVM versions newer than
+# the one the dashboard is pinned to; passing one to older versions fails
+PASS_TRACE_SUPPORTED = _supports_pass_trace()
+
+
+class PassTracer:
+    """
+    Trace callback for a Relay PassContext: totals the time and takes
+    the largest peak memory increase (see setup_stats_util.PeakMemory)
+    of every pass applied, including passes nested in others, to be
+    recorded as 'pass:(name)' setup stages. Only used if the installed
+    TVM supports it (PASS_TRACE_SUPPORTED); otherwise, see time_build_passes
+    """
+    def __init__(self, memory):
+        self.memory = memory
+        # (name, start time, memory interval) of the passes in progress
+        self.running = []
+        # name -> (total seconds, peak memory increase)
+        self.stages = OrderedDict()
+
+    def __call__(self, module, info, is_before):
+        if is_before:
+            self.running.append((info.name, time.time(), self.memory.begin()))
+            return
+        name, start, interval = self.running.pop()
+        seconds = time.time() - start
+        increase = self.memory.end(interval)
+        total, peak = self.stages.get(name, (0.0, 0.0))
+        self.stages[name] = (total + seconds, max(peak, increase))
+
+    def record(self):
+        for name, (seconds, memory) in self.stages.items():
+            record('pass:{}'.format(name), seconds, memory)
+
+
+# the optimization passes relay.build applies in the pinned TVM, in order
+# (see src/relay/backend/build_module.cc); timed one at a time when pass
+# contexts do not take a trace callback
+BUILD_PASSES = [
+    'SimplifyInference', 'EliminateCommonSubexpr', 'CombineParallelConv2D',
+    'CombineParallelDense', 'FoldConstant', 'FoldScaleAxis', 'CanonicalizeCast',
+    'CanonicalizeOps', 'AlterOpLayout', 'FuseOps'
+]
+
+
+def time_build_passes(net, params, target, opt, required_pass=None, disabled_pass=None):
+    """
+    Applies the passes of BUILD_PASSES that are enabled at the given opt
+    level and pass sets (as relay.build would) to net with its params
+    bound, one transform.Sequential stage per pass, recording each as a
+    'pass:(name)' setup stage. The optimized module is discarded: this
+    only gives a per-pass breakdown where PassTracer cannot be used
+    """
+    if isinstance(net, relay.Function):
+        func = net
+        module_type = getattr(tvm, 'IRModule', None) or relay.Module
+    else:
+        func = net['main']
+        module_type = type(net)
+    if params:
+        func = relay.build_module.bind_params_by_name(func, params)
+    mod = module_type.from_expr(func)
+
+    required = set(required_pass or [])
+    disabled = set(disabled_pass or [])
     with relay.build_config(opt_level=opt,
                             required_pass=required_pass,
                             disabled_pass=disabled_pass):
-        graph, lib, params = relay.build(net, 'llvm' if dev == 'cpu' else 'cuda', params=params)
+        with tvm.target.create(target):
+            mod = transform.InferType()(mod)
+            for name in BUILD_PASSES:
+                if not hasattr(transform, name):
+                    continue
+                build_pass = getattr(transform, name)()
+                if name not in required and \
+                   (name in disabled or build_pass.info.opt_level > opt):
+                    continue
+                with track('pass:{}'.format(name)):
+                    mod = transform.Sequential([build_pass, transform.InferType()])(mod)
+
+
+def build_relay_mod(net, params, dev, opt, required_pass=None, disabled_pass=None):
+    target = 'llvm' if dev == 'cpu' else 'cuda'
+    if not PASS_TRACE_SUPPORTED:
+        time_build_passes(net, params, target, opt,
+                          required_pass=required_pass, disabled_pass=disabled_pass)
+    with PeakMemory() as memory:
+        tracer, trace_args = None, {}
+        if PASS_TRACE_SUPPORTED:
+            tracer = PassTracer(memory)
+            trace_args['trace'] = tracer
+        with relay.build_config(opt_level=opt,
+                                required_pass=required_pass,
+                                disabled_pass=disabled_pass,
+                                **trace_args):
+            with track('compile'):
+                built = relay.build(net, target, params=params)
+    if tracer is not None:
+        tracer.record()
+    record_graph_stats(graph_stats(built[0]))
+    return built
+
+
+# function the graph runtime uses for nodes that do nothing (e.g., reshapes)
+NOP_FUNC = '__nop'
+_OP_NAMES = None
 
+
+def relay_op_names():
+    """
+    Returns the names of the registered Relay ops as they appear in
+    fused function names ('.' replaced by '_'), longest first
+    """
+    global _OP_NAMES
+    if _OP_NAMES is None:
+        _OP_NAMES = []
+        for func_name in ('ir.ListOpNames', 'relay.op._ListOpNames'):
+            list_op_names = tvm.get_global_func(func_name, allow_missing=True)
+            if list_op_names is not None:
+                _OP_NAMES = sorted({str(name).replace('.', '_') for name in list_op_names()},
+                                   key=len, reverse=True)
+                break
+    return _OP_NAMES
+
+
+def fused_ops(func_name, op_names):
+    """
+    Splits the name of a fused function (fused_(op)_(op)..._(n)) into
+    the names of the ops it is made of, or returns None if it cannot
+    """
+    name = re.sub(r'_\d+$', '', func_name)
+    if name.startswith('fused_'):
+        name = name[len('fused_'):]
+    ops = []
+    while name:
+        op = next((op for op in op_names if name == op or name.startswith(op + '_')), None)
+        if op is None:
+            return None
+        ops.append(op)
+        name = name[len(op) + 1:]
+    return ops
+
+
+def _dtype_bytes(dtype):
+    base, _, lanes = dtype.partition('x')
+    bits = re.search(r'(\d+)$', base)
+    bits = int(bits.group(1)) if bits else 8
+    return max(1, (bits * (int(lanes) if lanes else 1) + 7) // 8)
+
+
+def graph_stats(graph, op_names=None):
+    """
+    Statistics of the graph runtime graph (JSON) relay.build produces:
+    - kernels: operator nodes that run a (fused) function
+    - nop_kernels: operator nodes that do nothing
+    - kernel_types: distinct functions among the kernels
+    - ops_per_kernel: mean number of Relay ops fused into a kernel (going
+      by the function names; only the kernels whose names could be split
+      into op names count, and it is left out if none could)
+    - allocations: buffers in the storage plan holding operator outputs,
+      i.e., other than inputs and parameters
+    - storage_mb: total size of those buffers in MiB
+    """
+    if op_names is None:
+        op_names = relay_op_names()
+    graph = json.loads(graph)
+    nodes = graph['nodes']
+    funcs = [node['attrs']['func_name'] for node in nodes if node['op'] == 'tvm_op']
+    kernels = [func for func in funcs if func != NOP_FUNC]
+    stats = OrderedDict([
+        ('kernels', len(kernels)),
+        ('nop_kernels', len(funcs) - len(kernels)),
+        ('kernel_types', len(set(kernels)))
+    ])
+    op_counts = [len(ops) for ops in (fused_ops(func, op_names) for func in kernels)
+                 if ops is not None]
+    if op_counts:
+        stats['ops_per_kernel'] = float(np.mean(op_counts))
+
+    storage_ids = graph['attrs']['storage_id'][1]
+    shapes = graph['attrs']['shape'][1]
+    dltypes = graph['attrs']['dltype'][1]
+    row_ptr = graph['node_row_ptr']
+    # buffers holding an input or parameter somewhere are not planned
+    fixed = {storage_ids[entry]
+             for i, node in enumerate(nodes) if node['op'] == 'null'
+             for entry in range(row_ptr[i], row_ptr[i + 1])}
+    sizes = {}
+    for storage_id, shape, dltype in zip(storage_ids, shapes, dltypes):
+        if storage_id in fixed:
+            continue
+        size = int(np.prod(shape)) * _dtype_bytes(dltype)
+        sizes[storage_id] = max(sizes.get(storage_id, 0), size)
+    stats['allocations'] = len(sizes)
+    stats['storage_mb'] = sum(sizes.values()) / (1024 * 1024)
+    return stats
+
+
+def create_relay_mod(graph, lib, params, image_shape, input_name, dev):
+    device = tvm.cpu(0) if dev == 'cpu' else tvm.gpu(0)
     mod = tvm.contrib.graph_runtime.create(graph, lib, ctx=device)
     mod.set_input(**params)
     mod.set_input(input_name,
@@ -151,19 +368,30 @@ def setup_relay_mod(net, image_shape, input_name, params, dev, opt,
     return mod
 
 
+def setup_relay_mod(net, image_shape, input_name, params, dev, opt,
+                    required_pass=None, disabled_pass=None):
+    graph, lib, params = build_relay_mod(net, params, dev, opt,
+                                         required_pass=required_pass,
+                                         disabled_pass=disabled_pass)
+    return create_relay_mod(graph, lib, params, image_shape, input_name, dev)
+
+
 # note: passes should be a |-separated list of passes to apply before setting up the mod
 # (i.e., before any passes from opt levels are added). The reason for the | separarator is
 # that you can't write a comma-separated list to a CSV
+def pass_settings(use_passes, passes):
+    """Returns the required and disabled passes for cnn_setup's arguments"""
+    if not use_passes:
+        return None, None
+    required_pass = set(passes.split('|'))
+    # we always need simplify inference
+    required_pass.add('SimplifyInference')
+    return required_pass, ALL_PASSES - required_pass
+
+
 def cnn_setup(network, dev, batch_size, opt, use_passes=False, passes=''):
     net, params, image_shape = get_network(network, batch_size)
-    required_pass = None
-    disabled_pass = None
-
-    if use_passes:
-        required_pass = set(passes.split('|'))
-        # we always need simplify inference
-        required_pass.add('SimplifyInference')
-        disabled_pass = ALL_PASSES - required_pass
+    required_pass, disabled_pass = pass_settings(use_passes, passes)
 
     mod = setup_relay_mod(net, image_shape, 'data', params, dev, opt,
                           required_pass=required_pass,
@@ -171,6 +399,203 @@ def cnn_setup(network, dev, batch_size, opt, use_passes=False, passes=''):
     return [mod]
 
 
+def export_cnn(path_prefix, network, dev, batch_size, opt, use_passes=False, passes=''):
+    """
+    Compiles the network as cnn_setup would and saves the library,
+    graph, params, and input shape under path_prefix so that
+    load_cnn can later create the module without recompiling
+    """
+    net, params, image_shape = get_network(network, batch_size)
+    required_pass, disabled_pass = pass_settings(use_passes, passes)
+    graph, lib, params = build_relay_mod(net, params, dev, opt,
+                                         required_pass=required_pass,
+                                         disabled_pass=disabled_pass)
+
+    lib.export_library(path_prefix + '.so')
+    with open(path_prefix + '.params', 'wb') as f:
+        f.write(relay.save_param_dict(params))
+    with open(path_prefix + '.json', 'w') as f:
+        json.dump({'graph': graph, 'image_shape': list(image_shape), 'dev': dev}, f)
+
+
+def profile_graph_ops(graph, lib, params, image_shape, input_name, dev, number, reps):
+    """
+    Times every operator of a compiled graph with TVM's debug graph
+    runtime. Returns a list with one OrderedDict {operator node name:
+    mean time in seconds over number runs} per rep
+    """
+    device = tvm.cpu(0) if dev == 'cpu' else tvm.gpu(0)
+    # the debug runtime insists on a directory to dump tensors into
+    dump_root = tempfile.mkdtemp(prefix='relay_debug_')
+    try:
+        mod = debug_runtime.create(graph, lib, device, dump_root=dump_root)
+        mod.set_input(**params)
+        mod.set_input(input_name,
+                      tvm.nd.array((np.random.uniform(size=image_shape)).astype('float32')))
+        # one entry per graph node (in microseconds), including inputs,
+        # which take no time
+        node_times = [mod.run_individual(number, 1, 0) for _ in range(reps)]
+    finally:
+        shutil.rmtree(dump_root, ignore_errors=True)
+
+    nodes = json.loads(graph)['nodes']
+    return [OrderedDict((node['name'], float(time) * 1e-6)
+                        for node, time in zip(nodes, times)
+                        if node['op'] == 'tvm_op')
+            for times in node_times]
+
+
+def profile_cnn_ops(network, dev, batch_size, opt, use_passes=False, passes='',
+                    number=10, reps=3):
+    """
+    Compiles the network as cnn_setup would and profiles its operators
+    (see profile_graph_ops); usable as an op_profiler for run_template
+    """
+    net, params, image_shape = get_network(network, batch_size)
+    required_pass, disabled_pass = pass_settings(use_passes, passes)
+    graph, lib, params = build_relay_mod(net, params, dev, opt,
+                                         required_pass=required_pass,
+                                         disabled_pass=disabled_pass)
+    return profile_graph_ops(graph, lib, params, image_shape, 'data', dev, number, reps)
+
+
+def load_cnn(path_prefix):
+    with open(path_prefix + '.json') as f:
+        meta = json.load(f)
+    lib = tvm.module.load(path_prefix + '.so')
+    with open(path_prefix + '.params', 'rb') as f:
+        params = relay.load_param_dict(bytearray(f.read()))
+    return create_relay_mod(meta['graph'], lib, params,
+                            tuple(meta['image_shape']), 'data', meta['dev'])
+
+
+def _pin_compile_worker(cores):
+    if cores:
+        os.sched_setaffinity(0, cores)
+
+
+def _compile_job(job):
+    path_prefix, setup_args = job
+    with collect_records() as records:
+        try:
+            export_cnn(path_prefix, *setup_args)
+            return (None, records)
+        except Exception as e:
+            return ('Failed to compile {}:\n{}'.format(setup_args, render_exception(e)),
+                    records)
+
+
+def precompile_cnns(all_setup_args, output_dir, workers=None, cores=None):
+    """
+    Compiles the networks for every list of cnn_setup arguments in
+    all_setup_args in a pool of forked processes (optionally pinned
+    to the given cores, so that compilation stays off the cores used
+    for measurement) and exports them into output_dir.
+
+    Returns a list of (path prefix, error message or None, setup
+    records made while compiling; see setup_stats_util.collect_records),
+    one per entry in all_setup_args
+    """
+    jobs = [(os.path.join(output_dir, 'mod_{}'.format(i)), list(setup_args))
+            for i, setup_args in enumerate(all_setup_args)]
+    if cores is not None:
+        cores = parse_cpu_list(cores)
+        if workers is None:
+            workers = len(cores)
+
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(processes=workers,
+                  initializer=_pin_compile_worker, initargs=(cores,)) as pool:
+        results = pool.map(_compile_job, jobs, chunksize=1)
+    return [(job[0], error, records) for job, (error, records) in zip(jobs, results)]
+
+
+def parallel_compile_settings(config):
+    """
+    Reads the optional 'parallel_compile' field of an experiment config
+    and returns it with defaults filled in, or None if it is not
+    enabled. The field has the form
+    {
+        "enable": bool,
+        "workers": number of compilation processes (default: one per core),
+        "cores": cores to compile on, as a taskset-style list (default: any)
+    }
+    """
+    settings = config.get('parallel_compile', None)
+    if not settings or not settings.get('enable', False):
+        return None
+    return {
+        'workers': settings.get('workers', None),
+        'cores': settings.get('cores', None)
+    }
+
+
+def parallel_compile_params(gen_trial_params, to_setup_args=None, apply_settings=None):
+    """
+    Wraps a function producing run_trials parameters for a Relay
+    experiment whose trial setup is (equivalent to) cnn_setup.
+
+    If parallel compilation is enabled in the config, every parameter
+    combination is compiled up front in a process pool and the
+    trial setup is replaced with one that only loads the exported
+    module, so measurements run serially without waiting on the compiler.
+
+    to_setup_args: Optional function mapping a parameter combination
+        to the corresponding cnn_setup arguments (identity by default).
+        Combinations with the same cnn_setup arguments are compiled once.
+
+    apply_settings: Optional function called with a combination's
+        parameters before its module is loaded, for parameters that
+        affect the runtime rather than compilation (e.g., threads)
+    """
+    def gen_params(config):
+        trial_params = gen_trial_params(config)
+        settings = parallel_compile_settings(config)
+        if settings is None:
+            return trial_params
+
+        combos = list(product(*trial_params[-1]))
+        convert = to_setup_args if to_setup_args is not None else list
+        build_dir = tempfile.mkdtemp(prefix='relay_build_')
+        atexit.register(shutil.rmtree, build_dir, True)
+
+        unique_setups = list(OrderedDict.fromkeys(tuple(convert(combo)) for combo in combos))
+        compiled = precompile_cnns(unique_setups, build_dir,
+                                   workers=settings['workers'],
+                                   cores=settings['cores'])
+        exported = dict(zip(unique_setups, compiled))
+
+        def load_setup(*args):
+            path_prefix, error, records = exported[tuple(convert(args))]
+            if error is not None:
+                raise Exception(error)
+            # the compilation happened up front, so report what it cost
+            # (and built) for every setup that uses its result
+            replay(records)
+            if apply_settings is not None:
+                apply_settings(*args)
+            return [load_cnn(path_prefix)]
+
+        trial_params[6] = load_setup
+        return trial_params
+    return gen_params
+
+
+def set_relay_threads(threads):
+    """
+    Has the TVM runtime use the given number of threads (0 for its
+    default), pinned to the first that many of our CPUs
+    """
+    pin_to_cpus(threads)
+    if threads > 0:
+        os.environ['TVM_NUM_THREADS'] = str(threads)
+    elif 'TVM_NUM_THREADS' in os.environ:
+        del os.environ['TVM_NUM_THREADS']
+    # the env var is only read when the thread pool starts, so also
+    # reconfigure the pool in case it already has (1: use big cores)
+    tvm.get_global_func('runtime.config_threadpool')(1, threads)
+
+
 def cnn_trial(mod):
     return mod.run()
 
@@ -0,0 +1,96 @@
+"""
+Utilities for rerunning a reduced version of an experiment outside of
+the dashboard's usual flow (e.g., to bisect a regression or to confirm
+an alert): only the configuration behind a given metric, with a chosen
+number of reps, in a scratch directory rather than the dashboard home.
+"""
+import copy
+import os
+import subprocess
+
+from common import (idemp_mkdir, read_json, write_json, check_file_exists,
+                    validate_json)
+
+
+def lookup_metric(entry, fields):
+    """
+    Returns the value at the given nested fields of a data entry,
+    or None if it is absent
+    """
+    for field in fields:
+        if not isinstance(entry, dict) or str(field) not in entry:
+            return None
+        entry = entry[str(field)]
+    return entry
+
+
+def reduce_config(config, paths, overrides=None, reps=None):
+    """
+    Returns a copy of an experiment config cut down to the configurations
+    behind the metrics at the given paths (lists of fields, e.g.,
+    ['cpu', 'Relay', 'resnet-18']): every list field of the config
+    holding exactly one of the fields of a path is reduced to the
+    elements named that way by any path, and the paths are set as the
+    config's trial_filter so that the sweeps only run the matching
+    combinations (see trial_util.filter_combos). Fields are compared
+    case-insensitively, as listings are often capitalized versions of
+    config values; anything the heuristic misses can be given in
+    overrides (config key -> value), which are applied afterwards.
+    If reps is given, it replaces n_inputs.
+    """
+    ret = copy.deepcopy(config)
+    for key, value in config.items():
+        if not isinstance(value, list):
+            continue
+        reduced = set()
+        for fields in paths:
+            wanted = {str(field).lower() for field in fields}
+            matches = [elt for elt in value if str(elt).lower() in wanted]
+            if len(matches) != 1:
+                break
+            reduced.add(matches[0])
+        else:
+            ret[key] = [elt for elt in value if elt in reduced]
+    ret['trial_filter'] = [list(fields) for fields in paths]
+    if overrides:
+        ret.update(overrides)
+    if reps is not None:
+        ret['n_inputs'] = reps
+    ret['active'] = True
+    # a reduced run should start from scratch rather than resume an earlier one
+    ret.pop('resume_trials', None)
+    return ret
+
+
+def run_reduced_experiment(experiments_dir, exp_name, config, work_dir, env=None):
+    """
+    Runs the experiment's run and analysis stages (as the dashboard
+    does) with the given config, using work_dir/config, work_dir/data,
+    and work_dir/analysis (cleared first) in place of the dashboard
+    home's directories.
+
+    Returns (success, message, analyzed data entry or None)
+    """
+    exp_dir = os.path.join(experiments_dir, exp_name)
+    config_dir = os.path.join(work_dir, 'config')
+    data_dir = os.path.join(work_dir, 'data')
+    analysis_dir = os.path.join(work_dir, 'analysis')
+    subprocess.call(['rm', '-rf', config_dir, data_dir, analysis_dir])
+    for dirname in (config_dir, data_dir, analysis_dir):
+        idemp_mkdir(dirname)
+    write_json(config_dir, 'config.json', config)
+
+    subprocess.call([os.path.join(exp_dir, 'run.sh'), config_dir, data_dir],
+                    cwd=exp_dir, env=env)
+    status = validate_json(data_dir, 'success', 'message')
+    if not status['success']:
+        return (False, 'Run failed: {}'.format(status['message']), None)
+
+    subprocess.call([os.path.join(exp_dir, 'analyze.sh'), config_dir, data_dir, analysis_dir],
+                    cwd=exp_dir, env=env)
+    status = validate_json(analysis_dir, 'success', 'message')
+    if not status['success']:
+        return (False, 'Analysis failed: {}'.format(status['message']), None)
+    if not check_file_exists(analysis_dir, 'data.json'):
+        return (False, 'No data.json file produced by {}'.format(exp_name), None)
+    return (True, 'success', read_json(analysis_dir, 'data.json'))
@@ -0,0 +1,225 @@
+"""
+Queries over the benchmark history kept in the results store
+(see results_store.py), e.g., the times of one listing on one device
+over the last 60 TVM commits, without walking the data files.
+
+Metric paths are reported as the '/'-joined fields of the data files,
+which for most experiments are (device)/(listing, e.g., framework)/(network),
+so the device and framework filters match the first and second fields.
+
+Also usable from the command line (dashboard/relaybench-query wraps it):
+    relaybench-query --home-dir ~/dashboard-home --experiment char_rnn \\
+        --device cpu --framework Aot --last-hashes 60
+"""
+import argparse
+import csv
+import datetime
+import fnmatch
+import json
+import os
+import sys
+
+import numpy as np
+
+from common import IGNORED_FIELDS
+from dashboard_info import DashboardInfo
+from results_store import ResultsStore, STORE_FILENAME, encode_path, decode_path
+
+COLUMNS = ['experiment', 'timestamp', 'epoch', 'tvm_hash', 'path', 'value']
+TIME_FORMATS = ['%m-%d-%Y-%H%M', '%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M']
+
+
+def parse_time(time_str):
+    """
+    Parses a time given either as a dashboard timestamp
+    (e.g., 03-14-2020-0200) or as an ISO date (e.g., 2020-03-14)
+    and returns the corresponding epoch
+    """
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(time_str, time_format).timestamp()
+        except ValueError:
+            continue
+    raise ValueError('Unrecognized time {} (expected one of {})'.format(
+        time_str, ', '.join(TIME_FORMATS)))
+
+
+def sync_store(store, data_dir, experiments=None):
+    """Imports any data files the store is missing"""
+    for experiment in sorted(os.listdir(data_dir)):
+        exp_dir = os.path.join(data_dir, experiment)
+        if not os.path.isdir(exp_dir):
+            continue
+        if experiments is not None and experiment not in experiments:
+            continue
+        store.import_dir(experiment, exp_dir)
+
+
+def _recent_hashes(store, experiment, num_hashes):
+    cursor = store.conn.execute(
+        'SELECT tvm_hash FROM runs WHERE experiment = ? AND tvm_hash IS NOT NULL '
+        'GROUP BY tvm_hash ORDER BY MAX(epoch) DESC LIMIT ?',
+        (experiment, num_hashes))
+    return [row[0] for row in cursor]
+
+
+def query_results(data_dir, experiments=None, path_glob=None, device=None,
+                  framework=None, since=None, until=None, tvm_hashes=None,
+                  last_hashes=None, sync=True):
+    """
+    Returns a list of rows (tuples in the order of COLUMNS) of the
+    metrics matching every given filter, sorted by experiment,
+    path, and time.
+
+    Parameters
+    ==========
+    data_dir: str, the dashboard's experiment data directory
+        ((home)/results/experiments/data), which holds the store
+    experiments: [str], experiments to include (all by default)
+    path_glob: str, glob over metric paths (e.g., 'cpu/Relay*/resnet-*').
+        If omitted, the dashboard's bookkeeping fields and other
+        non-comparison fields (common.IGNORED_FIELDS) are left out
+        (setup costs, operator profiles, and graph statistics are kept)
+    device, framework: str, required first and second path fields
+    since, until: str, time range (see parse_time), inclusive
+    tvm_hashes: [str], TVM commits (or prefixes of their hashes) to include
+    last_hashes: int, only include runs from each experiment's
+        most recent (by run time) this many TVM commits
+    sync: bool, whether to first import any data files the store is missing
+    """
+    with ResultsStore(os.path.join(data_dir, STORE_FILENAME)) as store:
+        if sync:
+            sync_store(store, data_dir, experiments)
+
+        conditions = []
+        args = []
+        if experiments:
+            conditions.append('runs.experiment IN ({})'.format(
+                ', '.join('?' * len(experiments))))
+            args += list(experiments)
+        if since is not None:
+            conditions.append('runs.epoch >= ?')
+            args.append(parse_time(since))
+        if until is not None:
+            conditions.append('runs.epoch <= ?')
+            args.append(parse_time(until))
+        if tvm_hashes:
+            conditions.append('({})'.format(
+                ' OR '.join(['runs.tvm_hash GLOB ?'] * len(tvm_hashes))))
+            args += ['{}*'.format(tvm_hash) for tvm_hash in tvm_hashes]
+        if last_hashes is not None:
+            if experiments:
+                exps = experiments
+            else:
+                exps = store.experiments()
+            clauses = []
+            for experiment in exps:
+                hashes = _recent_hashes(store, experiment, last_hashes)
+                clauses.append('(runs.experiment = ? AND runs.tvm_hash IN ({}))'.format(
+                    ', '.join('?' * len(hashes))))
+                args += [experiment] + hashes
+            conditions.append('({})'.format(' OR '.join(clauses) or '0'))
+        if device is not None:
+            # a range over the encoded paths starting with the device,
+            # so the path index applies
+            prefix = encode_path([device])[:-1] + ','
+            conditions.append('metrics.path >= ? AND metrics.path < ?')
+            args += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+
+        cursor = store.conn.execute(
+            'SELECT runs.experiment, runs.timestamp, runs.epoch, runs.tvm_hash, '
+            'metrics.path, metrics.value '
+            'FROM runs JOIN metrics ON metrics.run_id = runs.id '
+            '{} ORDER BY runs.experiment, metrics.path, runs.epoch'.format(
+                'WHERE ' + ' AND '.join(conditions) if conditions else ''),
+            args)
+
+        rows = []
+        for row in cursor:
+            fields = decode_path(row[4])
+            path = '/'.join(fields)
+            if path_glob is None and fields[0] in IGNORED_FIELDS:
+                continue
+            if path_glob is not None and not fnmatch.fnmatchcase(path, path_glob):
+                continue
+            if framework is not None and (len(fields) < 2 or fields[1] != framework):
+                continue
+            rows.append(row[:4] + (path,) + row[5:])
+        return rows
+
+
+def results_to_arrays(rows):
+    """Converts query rows into a dict of column name -> NumPy array"""
+    dtypes = {'epoch': np.float64, 'value': np.float64}
+    return {column: np.array([row[i] for row in rows], dtype=dtypes.get(column, str))
+            for i, column in enumerate(COLUMNS)}
+
+
+def format_table(header, rows):
+    """Renders the rows as text in left-aligned columns under the header"""
+    table = [list(header)] + [[str(value) for value in row] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(header))]
+    return ''.join('  '.join(value.ljust(width)
+                             for value, width in zip(line, widths)).rstrip() + '\n'
+                   for line in table)
+
+
+def write_results(rows, output_format, output):
+    if output_format == 'npz':
+        np.savez(output, **results_to_arrays(rows))
+        return
+
+    out = sys.stdout if output is None else open(output, 'w', newline='')
+    try:
+        if output_format == 'csv':
+            writer = csv.writer(out)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+        elif output_format == 'json':
+            json.dump([dict(zip(COLUMNS, row)) for row in rows], out, indent=1)
+            out.write('\n')
+        else:
+            out.write(format_table(COLUMNS, rows))
+    finally:
+        if output is not None:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the dashboard\'s benchmark history')
+    location = parser.add_mutually_exclusive_group(required=True)
+    location.add_argument('--home-dir', type=str, help='dashboard home directory')
+    location.add_argument('--data-dir', type=str, help='experiment data directory')
+    parser.add_argument('--experiment', action='append', dest='experiments',
+                        help='experiment to include (repeatable)')
+    parser.add_argument('--path', type=str, help='glob over metric paths')
+    parser.add_argument('--device', type=str)
+    parser.add_argument('--framework', type=str)
+    parser.add_argument('--since', type=str)
+    parser.add_argument('--until', type=str)
+    parser.add_argument('--tvm-hash', action='append', dest='tvm_hashes',
+                        help='TVM commit hash or prefix (repeatable)')
+    parser.add_argument('--last-hashes', type=int,
+                        help='only the runs of the most recent N TVM commits')
+    parser.add_argument('--format', choices=['table', 'csv', 'json', 'npz'], default='table')
+    parser.add_argument('--output', type=str, help='output file (required for npz)')
+    parser.add_argument('--no-sync', action='store_true',
+                        help='do not import new data files before querying')
+    args = parser.parse_args()
+
+    if args.format == 'npz' and args.output is None:
+        parser.error('--output is required for npz output')
+
+    data_dir = args.data_dir
+    if args.home_dir is not None:
+        data_dir = DashboardInfo(os.path.expanduser(args.home_dir)).exp_data
+    rows = query_results(os.path.expanduser(data_dir), experiments=args.experiments,
+                         path_glob=args.path, device=args.device,
+                         framework=args.framework, since=args.since,
+                         until=args.until, tvm_hashes=args.tvm_hashes,
+                         last_hashes=args.last_hashes, sync=not args.no_sync)
+    write_results(rows, args.format, args.output)
+
+
+if __name__ == '__main__':
+    main()
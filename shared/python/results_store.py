@@ -0,0 +1,318 @@
+"""
+Append-only SQLite store of analyzed experiment results.
+
+Every data_(timestamp).json file produced by the dashboard becomes
+a row of the runs table (holding the raw JSON as well as its experiment,
+timestamp, and TVM hash) and its numeric leaves (outside of lists)
+become rows of the metrics table, keyed by their field path encoded as
+a JSON list (e.g., '["cpu", "Relay", "resnet-18"]', as field names like
+networks or pass specs can hold any character), so that history can be
+queried without opening and parsing every data file.
+
+The store only holds experiment results: the store for the
+per-experiment data directories ((home)/results/experiments/data)
+lives in that directory as results.db, and other directories (e.g.,
+telemetry) are read from their files. Run as a script, imports every
+experiment's files into it.
+"""
+import json
+import os
+import sqlite3
+
+from common import invoke_main, parse_timestamp, read_json, flatten_fields
+
+STORE_FILENAME = 'results.db'
+# bumped when what goes into the metrics table changes, so that stores
+# made by earlier versions are reindexed from the raw JSON when opened
+STORE_VERSION = 2
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS runs (
+           id INTEGER PRIMARY KEY,
+           experiment TEXT NOT NULL,
+           filename TEXT NOT NULL,
+           timestamp TEXT NOT NULL,
+           epoch REAL NOT NULL,
+           tvm_hash TEXT,
+           raw TEXT NOT NULL,
+           UNIQUE (experiment, filename))''',
+    '''CREATE TABLE IF NOT EXISTS metrics (
+           run_id INTEGER NOT NULL REFERENCES runs(id),
+           path TEXT NOT NULL,
+           value REAL NOT NULL)''',
+    # the timestamp strings (month first) do not sort chronologically,
+    # so runs are indexed and ordered by the epoch instead
+    'CREATE INDEX IF NOT EXISTS runs_by_time ON runs (experiment, epoch, tvm_hash)',
+    'CREATE INDEX IF NOT EXISTS metrics_by_path ON metrics (path, run_id)',
+    'CREATE INDEX IF NOT EXISTS metrics_by_run ON metrics (run_id)'
+]
+
+
+def is_experiment_data_dir(data_dir):
+    """
+    Returns whether data_dir is an experiment's data directory,
+    (home)/results/experiments/data/(experiment), which the store covers
+    """
+    parent = os.path.dirname(os.path.normpath(os.path.expanduser(data_dir)))
+    return (os.path.basename(parent) == 'data'
+            and os.path.basename(os.path.dirname(parent)) == 'experiments')
+
+
+def store_path(data_dir):
+    """
+    Returns the path of the store holding the data files
+    in data_dir (which is in the parent directory)
+    """
+    data_dir = os.path.normpath(os.path.expanduser(data_dir))
+    return os.path.join(os.path.dirname(data_dir), STORE_FILENAME)
+
+
+def encode_path(fields):
+    """Returns the key of the metric at the given fields in the metrics table"""
+    return json.dumps([str(field) for field in fields])
+
+
+def decode_path(path):
+    """Returns the fields of a metrics table key as a tuple"""
+    return tuple(json.loads(path))
+
+
+def flatten_metrics(entry):
+    """
+    Returns a list of (encoded field path (see encode_path), value) for
+    every numeric leaf of a data entry that is not inside a list
+    """
+    return [(encode_path(fields), float(value))
+            for (fields, value) in flatten_fields(entry, ignore_fields={'timestamp', 'tvm_hash'})]
+
+
+def _set_path(entry, path, value):
+    fields = decode_path(path)
+    for field in fields[:-1]:
+        entry = entry.setdefault(field, {})
+    entry[fields[-1]] = value
+
+
+class ResultsStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=60)
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            if self.conn.execute('PRAGMA user_version').fetchone()[0] < STORE_VERSION:
+                self._reindex()
+
+    def _reindex(self):
+        """Rebuilds the metrics table from the raw JSON of every run"""
+        self.conn.execute('DELETE FROM metrics')
+        for (run_id, raw) in self.conn.execute('SELECT id, raw FROM runs').fetchall():
+            self.conn.executemany(
+                'INSERT INTO metrics (run_id, path, value) VALUES (?, ?, ?)',
+                [(run_id, path, value) for (path, value) in flatten_metrics(json.loads(raw))])
+        self.conn.execute('PRAGMA user_version = {}'.format(STORE_VERSION))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def filenames(self, experiment):
+        """Returns the set of data filenames imported for the experiment"""
+        cursor = self.conn.execute('SELECT filename FROM runs WHERE experiment = ?',
+                                   (experiment,))
+        return {row[0] for row in cursor}
+
+    def add_entry(self, experiment, filename, entry):
+        """
+        Appends a data entry (parsed data file) to the store. Returns
+        False without changing anything if the file was already added
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO runs '
+                '(experiment, filename, timestamp, epoch, tvm_hash, raw) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (experiment, filename, entry['timestamp'],
+                 parse_timestamp(entry).timestamp(), entry.get('tvm_hash'),
+                 json.dumps(entry)))
+            if cursor.rowcount == 0:
+                return False
+            run_id = cursor.lastrowid
+            self.conn.executemany(
+                'INSERT INTO metrics (run_id, path, value) VALUES (?, ?, ?)',
+                [(run_id, path, value) for (path, value) in flatten_metrics(entry)])
+        return True
+
+    def import_dir(self, experiment, data_dir):
+        """
+        Adds every data file in data_dir not yet in the store.
+        Returns the number of files added
+        """
+        imported = self.filenames(experiment)
+        added = 0
+        for name in sorted(os.listdir(data_dir)):
+            if name in imported or not name.endswith('.json'):
+                continue
+            if self.add_entry(experiment, name, read_json(data_dir, name)):
+                added += 1
+        return added
+
+    def entries(self, experiment, filenames=None):
+        """
+        Returns (filename, data entry) for each of the experiment's runs
+        sorted by timestamp, optionally only those from the given files.
+        The entries are put together from the metrics table rather than
+        parsed from the raw JSON, so they only hold the timestamp, the
+        TVM hash (if any), and the numeric fields outside of lists (see
+        flatten_metrics); see raw_entry for the rest
+        """
+        cursor = self.conn.execute(
+            'SELECT runs.id, runs.filename, runs.timestamp, runs.tvm_hash, '
+            'metrics.path, metrics.value '
+            'FROM runs LEFT JOIN metrics ON metrics.run_id = runs.id '
+            'WHERE runs.experiment = ? ORDER BY runs.epoch, runs.id, metrics.rowid',
+            (experiment,))
+        ret = []
+        last_id = None
+        for (run_id, filename, timestamp, tvm_hash, path, value) in cursor:
+            if filenames is not None and filename not in filenames:
+                continue
+            if run_id != last_id:
+                last_id = run_id
+                entry = {'timestamp': timestamp}
+                if tvm_hash is not None:
+                    entry['tvm_hash'] = tvm_hash
+                ret.append((filename, entry))
+            if path is not None:
+                _set_path(entry, path, value)
+        return ret
+
+    def raw_entry(self, experiment, filename):
+        """Returns the full data entry of one of the experiment's files, or None"""
+        row = self.conn.execute(
+            'SELECT raw FROM runs WHERE experiment = ? AND filename = ?',
+            (experiment, filename)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def experiments(self):
+        """Returns the names of all experiments in the store"""
+        cursor = self.conn.execute('SELECT DISTINCT experiment FROM runs ORDER BY experiment')
+        return [row[0] for row in cursor]
+
+    def timestamps(self):
+        """Returns every distinct run timestamp in the store, oldest first"""
+        cursor = self.conn.execute(
+            'SELECT timestamp FROM runs GROUP BY timestamp ORDER BY MIN(epoch)')
+        return [row[0] for row in cursor]
+
+    def find_run(self, experiment, timestamp=None, tvm_hash=None):
+        """
+        Returns the experiment's most recent data entry with the given
+        timestamp and/or TVM hash (or hash prefix), or None if there is none
+        """
+        conditions = ['experiment = ?']
+        args = [experiment]
+        if timestamp is not None:
+            conditions.append('timestamp = ?')
+            args.append(timestamp)
+        if tvm_hash is not None:
+            conditions.append('tvm_hash GLOB ?')
+            args.append('{}*'.format(tvm_hash))
+        row = self.conn.execute(
+            'SELECT raw FROM runs WHERE {} ORDER BY epoch DESC, id DESC LIMIT 1'.format(
+                ' AND '.join(conditions)),
+            args).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def metric_history(self, experiment, fields):
+        """
+        Returns ([values], [timestamps]) of the metric at the given
+        fields over the experiment's runs, sorted by timestamp
+        """
+        cursor = self.conn.execute(
+            'SELECT metrics.value, runs.timestamp FROM metrics '
+            'JOIN runs ON runs.id = metrics.run_id '
+            'WHERE runs.experiment = ? AND metrics.path = ? '
+            'ORDER BY runs.epoch, runs.id',
+            (experiment, encode_path(fields)))
+        rows = cursor.fetchall()
+        return ([row[0] for row in rows], [row[1] for row in rows])
+
+
+def _read_files(data_dir, names):
+    entries = [(name, read_json(data_dir, name)) for name in names]
+    return sorted(entries, key=lambda named: parse_timestamp(named[1]))
+
+
+def sort_data_files(data_dir, full=True):
+    """
+    Returns (filename, data entry) for every data file in data_dir, sorted
+    by timestamp. For an experiment's data directory, brings the store up
+    to date with the directory's files and reads the entries from it.
+    Unless full is set, only the most recent entry is read in full and
+    the rest are put together from their numeric fields outside of lists
+    without parsing their JSON (see ResultsStore.entries), for callers
+    that only need the metric histories. Other directories, or experiment
+    data directories whose store is unusable, are read from the files
+    directly
+    """
+    data_dir = os.path.expanduser(data_dir)
+    if not os.path.isdir(data_dir):
+        return []
+    present = {name for name in os.listdir(data_dir) if name.endswith('.json')}
+    if not is_experiment_data_dir(data_dir):
+        return _read_files(data_dir, present)
+    try:
+        with ResultsStore(store_path(data_dir)) as store:
+            experiment = os.path.basename(os.path.normpath(data_dir))
+            store.import_dir(experiment, data_dir)
+            entries = store.entries(experiment, present)
+            to_read = entries if full else entries[-1:]
+            for i, (filename, _) in enumerate(to_read, len(entries) - len(to_read)):
+                entries[i] = (filename, store.raw_entry(experiment, filename))
+            return entries
+    except sqlite3.Error:
+        return _read_files(data_dir, present)
+
+
+def sort_data(data_dir, full=True):
+    """
+    Stands in for common.sort_data, reading from the store (see
+    sort_data_files). With full unset, only the most recent entry has
+    every field, which suffices for longitudinal graphs and statistics
+    """
+    return [entry for (_, entry) in sort_data_files(data_dir, full)]
+
+
+def append_data_file(data_dir, filename):
+    """
+    Adds a newly written data file in data_dir to the store, returning
+    False if it could not be added (it is still read from the directory)
+    """
+    if not is_experiment_data_dir(data_dir):
+        return False
+    try:
+        with ResultsStore(store_path(data_dir)) as store:
+            experiment = os.path.basename(os.path.normpath(data_dir))
+            return store.add_entry(experiment, filename, read_json(data_dir, filename))
+    except sqlite3.Error:
+        return False
+
+
+def main(data_dir):
+    data_dir = os.path.expanduser(data_dir)
+    with ResultsStore(os.path.join(data_dir, STORE_FILENAME)) as store:
+        for experiment in sorted(os.listdir(data_dir)):
+            exp_dir = os.path.join(data_dir, experiment)
+            if not os.path.isdir(exp_dir):
+                continue
+            added = store.import_dir(experiment, exp_dir)
+            print('{}: imported {} data files'.format(experiment, added))
+
+
+if __name__ == '__main__':
+    invoke_main(main, 'data_dir')
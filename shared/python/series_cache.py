@@ -0,0 +1,248 @@
+"""
+Columnar cache of an experiment's metric histories.
+
+For each experiment, keeps the epoch timestamp of every data file
+(epochs.f64) and one column of float64 values per metric path
+(as in common.flatten_fields, with NaN where a run lacks the metric)
+as raw arrays in the experiment's series directory, along with an
+index.json mapping paths to column files. The arrays are read as
+memory maps, so getting one metric's history does not touch the
+data files or any other metric.
+
+The dashboard appends each new data file when it is analyzed;
+update_series_cache also brings a cache up to date with its data
+directory (rebuilding it if a file older than the newest cached
+one shows up). The longitudinal graphs of visualize_template and
+stat_alert's running statistics read the histories from the cache.
+"""
+import datetime
+import os
+import uuid
+
+import numpy as np
+
+from common import (read_json, write_json, parse_timestamp,
+                    flatten_fields, idemp_mkdir, TIME_IGNORED_FIELDS)
+from calibration_util import calibration_index
+from results_store import sort_data_files, is_experiment_data_dir
+
+INDEX_FILENAME = 'index.json'
+EPOCHS_FILENAME = 'epochs.f64'
+# caches in an older layout (or with calibration indices over
+# different benchmarks) are rebuilt
+CACHE_VERSION = 4
+
+
+def path_key(fields):
+    return '/'.join(map(str, fields))
+
+
+def _empty_index():
+    # the generation changes whenever the cache is (re)built, so readers
+    # that keep up with it incrementally know to start over
+    return {'version': CACHE_VERSION, 'generation': uuid.uuid4().hex, 'length': 0, 'files': [],
+            'timestamps': [], 'tvm_hashes': [], 'calibration': [], 'columns': {}}
+
+
+def _truncate(cache_dir, filename, length):
+    """Drops anything past the first length values, left by an interrupted append"""
+    path = os.path.join(cache_dir, filename)
+    if not os.path.exists(path):
+        open(path, 'wb').close()
+    elif os.path.getsize(path) > length * 8:
+        os.truncate(path, length * 8)
+
+
+def _append_values(cache_dir, filename, values):
+    with open(os.path.join(cache_dir, filename), 'ab') as f:
+        f.write(np.asarray(values, dtype=np.float64).tobytes())
+
+
+class SeriesCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index = _empty_index()
+        if os.path.exists(os.path.join(cache_dir, INDEX_FILENAME)):
+            try:
+                self.index = read_json(cache_dir, INDEX_FILENAME)
+            except ValueError:
+                # a corrupt index is treated as an empty cache, which is rebuilt
+                self.index = {}
+
+    def __len__(self):
+        return self.index['length']
+
+    def _memmap(self, filename):
+        if not len(self):
+            return np.empty(0, dtype=np.float64)
+        # the files may run past the indexed length while an append is
+        # in progress (or if one was interrupted), hence the explicit shape
+        return np.memmap(os.path.join(self.cache_dir, filename),
+                         dtype=np.float64, mode='r', shape=(len(self),))
+
+    def paths(self):
+        """Returns the fields of every metric in the cache"""
+        return [tuple(column['fields']) for column in self.index['columns'].values()]
+
+    def epochs(self):
+        return self._memmap(EPOCHS_FILENAME)
+
+    def column(self, fields):
+        """
+        Returns the values of the metric at the given fields in every
+        cached run (NaN where absent), or None if no run has it
+        """
+        key = path_key(fields)
+        if key not in self.index['columns']:
+            return None
+        return self._memmap(self.index['columns'][key]['file'])
+
+    def gather_stats(self, fields):
+        """Same as common.gather_stats over the cached runs"""
+        values = self.column(fields)
+        if values is None:
+            return ([], [])
+        present = ~np.isnan(values)
+        return (values[present].tolist(),
+                [datetime.datetime.fromtimestamp(epoch)
+                 for epoch in self.epochs()[present]])
+
+    def metric_series(self, after_epoch=None, ignore_fields=None):
+        """
+        Same as common.metric_series over the cached runs (only those
+        after after_epoch, if given): the history of every metric present
+        in the most recent run, except those under the top-level fields in
+        ignore_fields (common.TIME_IGNORED_FIELDS by default)
+        """
+        if not len(self):
+            return {}
+        if ignore_fields is None:
+            ignore_fields = TIME_IGNORED_FIELDS
+        start = 0
+        if after_epoch is not None:
+            start = int(np.searchsorted(self.epochs(), after_epoch, side='right'))
+        times = [datetime.datetime.fromtimestamp(epoch) for epoch in self.epochs()[start:]]
+        ret = {}
+        for column in self.index['columns'].values():
+            if column['fields'][0] in ignore_fields:
+                continue
+            values = self._memmap(column['file'])[start:]
+            if not len(values) or np.isnan(values[-1]):
+                continue
+            present = np.flatnonzero(~np.isnan(values))
+            ret[tuple(column['fields'])] = (values[present].tolist(),
+                                            [times[i] for i in present])
+        return ret
+
+    def runs(self, start=0):
+        """
+        Returns the cached runs from the given position on as (list of
+        the fields of each metric, array of values with one row per
+        metric and one column per run, epochs, filenames, TVM hashes,
+        calibration indices (see calibration_util.calibration_index))
+        """
+        paths = self.paths()
+        if start >= len(self) or not paths:
+            values = np.empty((len(paths), max(0, len(self) - start)))
+        else:
+            values = np.vstack([self._memmap(column['file'])[start:]
+                                for column in self.index['columns'].values()])
+        return (paths, values, np.array(self.epochs()[start:]),
+                self.index['files'][start:], self.index['tvm_hashes'][start:],
+                self.index['calibration'][start:])
+
+    def extend(self, named_entries):
+        """
+        Adds the given (filename, data entry) pairs, sorted by timestamp
+        and at least as recent as every cached run, to the end of the cache
+        """
+        if not named_entries:
+            return
+        idemp_mkdir(self.cache_dir)
+        index = self.index
+        n = index['length']
+        flattened = [flatten_fields(entry) for (_, entry) in named_entries]
+        _truncate(self.cache_dir, EPOCHS_FILENAME, n)
+        for column in index['columns'].values():
+            _truncate(self.cache_dir, column['file'], n)
+
+        new_values = {}
+        for i, metrics in enumerate(flattened):
+            for (fields, value) in metrics:
+                key = path_key(fields)
+                if key not in new_values:
+                    new_values[key] = np.full(len(named_entries), np.nan)
+                    if key not in index['columns']:
+                        index['columns'][key] = {
+                            'file': 'c{}.f64'.format(len(index['columns'])),
+                            'fields': list(fields)
+                        }
+                        _truncate(self.cache_dir, index['columns'][key]['file'], 0)
+                        _append_values(self.cache_dir, index['columns'][key]['file'],
+                                       np.full(n, np.nan))
+                new_values[key][i] = value
+
+        missing = np.full(len(named_entries), np.nan)
+        for key, column in index['columns'].items():
+            _append_values(self.cache_dir, column['file'], new_values.get(key, missing))
+        _append_values(self.cache_dir, EPOCHS_FILENAME,
+                       [parse_timestamp(entry).timestamp() for (_, entry) in named_entries])
+
+        index['length'] = n + len(named_entries)
+        index['files'] += [name for (name, _) in named_entries]
+        index['timestamps'] += [entry['timestamp'] for (_, entry) in named_entries]
+        index['tvm_hashes'] += [entry.get('tvm_hash') for (_, entry) in named_entries]
+        index['calibration'] += [calibration_index(entry) for (_, entry) in named_entries]
+        # the index is written last, so readers never see a partial run
+        write_json(self.cache_dir, INDEX_FILENAME, index)
+
+    def append(self, filename, entry):
+        self.extend([(filename, entry)])
+
+    def clear(self):
+        for filename in os.listdir(self.cache_dir) if os.path.exists(self.cache_dir) else []:
+            os.remove(os.path.join(self.cache_dir, filename))
+        self.index = _empty_index()
+
+
+def series_dir(data_dir):
+    """
+    Returns the series cache directory of an experiment data directory,
+    (home)/results/experiments/series/(experiment), or None if data_dir
+    is not one (see results_store.is_experiment_data_dir)
+    """
+    if not is_experiment_data_dir(data_dir):
+        return None
+    data_dir = os.path.normpath(os.path.expanduser(data_dir))
+    return os.path.join(os.path.dirname(os.path.dirname(data_dir)), 'series',
+                        os.path.basename(data_dir))
+
+
+def update_series_cache(cache_dir, data_dir):
+    """
+    Appends the data files in data_dir that are not yet in the cache,
+    reading only those files. The cache is only rebuilt from the whole
+    history (from the results store; see results_store.sort_data_files)
+    if any new file is older than the newest cached run or any cached
+    file has been removed. Returns the SeriesCache
+    """
+    cache = SeriesCache(cache_dir)
+    if cache.index.get('version') != CACHE_VERSION:
+        cache.clear()
+    present = {name for name in os.listdir(data_dir) if name.endswith('.json')} \
+              if os.path.isdir(data_dir) else set()
+    cached = set(cache.index['files'])
+    if cached == present:
+        return cache
+
+    new_entries = sorted([(name, read_json(data_dir, name)) for name in present - cached],
+                         key=lambda named: parse_timestamp(named[1]))
+    last_epoch = cache.epochs()[-1] if len(cache) else -np.inf
+    if not cached.issubset(present) or \
+       any(parse_timestamp(entry).timestamp() < last_epoch for (_, entry) in new_entries):
+        cache.clear()
+        new_entries = sort_data_files(data_dir, full=False)
+
+    cache.extend(new_entries)
+    return cache
+
@@ -0,0 +1,305 @@
+"""
+Records of trial setups: the cost of their stages (e.g., importing
+a model from another framework or compiling it), as wall-clock time
+and the peak increase in resident memory, and statistics of what they
+built (e.g., the graph relay.build produced; see relay_util.graph_stats).
+
+Setup code wraps a stage in `with track('compile'):` and reports
+statistics with record_graph_stats. While trial_util.run_trials is
+running, these are written to path_prefix/method-task_name-setup.csv
+and -graph.csv, with the parameters and rep of the setup in progress,
+so they are recorded for every setup alongside its measurements. Rows
+are appended one write at a time, so records from forked workers (e.g.,
+with isolation) end up in the same files. Outside of run_trials,
+nothing is written.
+
+The analysis (see add_setup_stats) reports the mean time of each stage
+under the top-level field 'compile_time', its largest peak memory
+increase under 'compile_memory', and the graph statistics under
+'graph_stats'.
+"""
+import contextlib
+import csv
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+
+from analysis_util import set_nested_field
+from process_util import rss_mb
+
+SETUP_STATS_FIELDS = ['stage', 'time', 'memory']
+GRAPH_STATS_FIELDS = ['stat', 'value']
+# seconds between samples of the resident memory while a stage runs
+SAMPLE_INTERVAL = 0.01
+
+# prefix of the files records are written to and the setup in progress
+_RECORDING = {'prefix': None, 'parameter_names': None, 'args': None, 'rep': None}
+# lists collecting the records made in this process (see collect_records)
+_COLLECTORS = []
+
+
+def records_filename(path_prefix, method, task_name, suffix):
+    return os.path.join(path_prefix, '{}-{}-{}.csv'.format(method, task_name, suffix))
+
+
+def start_recording(path_prefix, method, task_name, parameter_names, append=False):
+    """
+    Has the records made from now on, in this process and those forked
+    from it, written to path_prefix/method-task_name-(setup|graph).csv
+    (see setting_up). Unless append is set, any earlier files are replaced
+    """
+    if not append:
+        for suffix in ('setup', 'graph'):
+            filename = records_filename(path_prefix, method, task_name, suffix)
+            if os.path.exists(filename):
+                os.remove(filename)
+    _RECORDING['prefix'] = os.path.join(path_prefix, '{}-{}'.format(method, task_name))
+    _RECORDING['parameter_names'] = list(parameter_names)
+
+
+def stop_recording():
+    _RECORDING.update(prefix=None, parameter_names=None, args=None, rep=None)
+
+
+@contextlib.contextmanager
+def setting_up(args, rep):
+    """Attributes the records made inside to the given parameter combination and rep"""
+    _RECORDING['args'] = list(args)
+    _RECORDING['rep'] = rep
+    try:
+        yield
+    finally:
+        _RECORDING['args'] = None
+        _RECORDING['rep'] = None
+
+
+@contextlib.contextmanager
+def collect_records():
+    """
+    Returns a list that collects every record made inside, e.g., to
+    pass the records made in a compilation process back to be replayed
+    for the setups that use its results
+    """
+    records = []
+    _COLLECTORS.append(records)
+    try:
+        yield records
+    finally:
+        _COLLECTORS.remove(records)
+
+
+def _write_records(suffix, header, rows):
+    if _RECORDING['prefix'] is None or _RECORDING['args'] is None:
+        return
+    filename = '{}-{}.csv'.format(_RECORDING['prefix'], suffix)
+    write_header = not os.path.exists(filename)
+    # the rows go out in a single write, so rows from several processes
+    # do not interleave (a header written twice by racing workers is
+    # skipped when reading)
+    with open(filename, 'a', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        if write_header:
+            writer.writerow(_RECORDING['parameter_names'] + ['rep'] + header)
+        for row in rows:
+            writer.writerow(_RECORDING['args'] + [_RECORDING['rep']] + row)
+
+
+def record(stage, seconds, memory):
+    """
+    Records a stage (time in seconds, peak memory increase in MiB)
+    for the setup in progress, as track does
+    """
+    for records in _COLLECTORS:
+        records.append(('stage', (stage, seconds, memory)))
+    _write_records('setup', SETUP_STATS_FIELDS, [[stage, seconds, memory]])
+
+
+def record_graph_stats(stats):
+    """Records statistics {name: number} of what the setup in progress built"""
+    for records in _COLLECTORS:
+        records.append(('graph', stats))
+    _write_records('graph', GRAPH_STATS_FIELDS,
+                   [[name, value] for name, value in stats.items()])
+
+
+def replay(records):
+    """Makes the given records (see collect_records) again for the setup in progress"""
+    for kind, payload in records:
+        if kind == 'stage':
+            record(*payload)
+        else:
+            record_graph_stats(payload)
+
+
+def _max_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakMemory:
+    """
+    Measures the peak increase in this process's resident memory over
+    any number of (possibly nested) intervals, sampled by a background
+    thread (which keeps running while TVM is in native code) for as
+    long as this is used as a context manager. The kernel's high-water
+    mark also catches a peak between samples if it was the highest the
+    process has reached.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        # interval id -> [starting RSS, starting high-water mark, peak RSS]
+        self.intervals = {}
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.sampler = None
+
+    def __enter__(self):
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+        self.sampler.join()
+
+    def _sample(self):
+        while not self.done.wait(self.interval):
+            self._update(rss_mb())
+
+    def _update(self, rss):
+        with self.lock:
+            for interval in self.intervals.values():
+                interval[2] = max(interval[2], rss)
+
+    def begin(self):
+        """Starts an interval and returns its id"""
+        rss = rss_mb()
+        with self.lock:
+            interval_id = self.next_id
+            self.next_id += 1
+            self.intervals[interval_id] = [rss, _max_rss_mb(), rss]
+        return interval_id
+
+    def end(self, interval_id):
+        """Ends the interval and returns its peak memory increase in MiB"""
+        self._update(rss_mb())
+        with self.lock:
+            start_rss, start_max, peak = self.intervals.pop(interval_id)
+        end_max = _max_rss_mb()
+        if end_max > start_max:
+            peak = max(peak, end_max)
+        return peak - start_rss
+
+
+@contextlib.contextmanager
+def track(stage):
+    """
+    Measures the wall-clock time of the enclosed block and the peak
+    increase in resident memory while it runs (see PeakMemory), and
+    records them (see record) if the block succeeds
+    """
+    with PeakMemory() as memory:
+        interval = memory.begin()
+        start = time.time()
+        yield
+        end = time.time()
+        increase = memory.end(interval)
+    record(stage, end - start, increase)
+
+
+def _load_records(filename, parameter_names, key_name, value_names):
+    """
+    Reads a CSV of setup records (parameters, rep, key, values) into a
+    dict of NumPy arrays (parameters and key as strings, values as
+    floats), skipping header rows
+    """
+    n_params = len(parameter_names)
+    rows = []
+    with open(filename, newline='') as csvfile:
+        for line in csv.reader(csvfile):
+            if len(line) < n_params + 2 + len(value_names):
+                continue
+            try:
+                values = [float(value) for value in line[n_params + 2:]]
+            except ValueError:
+                continue
+            rows.append((line[:n_params] + [line[n_params + 1]], values))
+
+    columns = {name: np.array([row[0][i] for row in rows], dtype=str)
+               for i, name in enumerate(list(parameter_names) + [key_name])}
+    for i, name in enumerate(value_names):
+        columns[name] = np.array([row[1][i] for row in rows], dtype=np.float64)
+    return columns
+
+
+def _summarize_records(columns, params_to_match, key_name, value_reducers):
+    """
+    Returns a dict {value name: {key: reduced value}} over the rows
+    matching params_to_match, with each value reduced by 'mean' or
+    'max', or None if no rows match
+    """
+    keep = np.ones(len(columns[key_name]), dtype=bool)
+    for name, value in params_to_match.items():
+        keep &= columns[name] == str(value)
+    if not keep.any():
+        return None
+
+    keys, inverse = np.unique(columns[key_name][keep], return_inverse=True)
+    ret = {}
+    for name, reducer in value_reducers.items():
+        values = columns[name][keep]
+        if reducer == 'max':
+            reduced = np.full(len(keys), -np.inf)
+            np.maximum.at(reduced, inverse, values)
+        else:
+            reduced = np.bincount(inverse, weights=values) / np.bincount(inverse)
+        ret[name] = {key: float(value) for key, value in zip(keys.tolist(), reduced)}
+    return ret
+
+
+# (filename suffix, key column, {value column: reducer}, {value column: report field})
+SETUP_RECORDS = [
+    ('setup', 'stage', {'time': 'mean', 'memory': 'max'},
+     {'time': 'compile_time', 'memory': 'compile_memory'}),
+    ('graph', 'stat', {'value': 'mean'}, {'value': 'graph_stats'})
+]
+
+
+def add_setup_stats(report, config, data_dir, listing_settings,
+                    generate_data_query, use_networks=True):
+    """
+    Adds the setup records of every device, listing, and network (if
+    use_networks) whose framework and task recorded any to the report:
+    the mean time of each stage under the top-level field 'compile_time'
+    (seconds), its largest peak memory increase under 'compile_memory'
+    (MiB), and the mean of each graph statistic under 'graph_stats'
+    """
+    tables = {}
+    for dev in config['devices']:
+        for listing, settings in listing_settings.items():
+            queries = {None: generate_data_query(config, dev, settings)} \
+                      if not use_networks else \
+                      {network: generate_data_query(config, dev, network, settings)
+                       for network in config['networks']}
+            for network, query in queries.items():
+                fw, task_name, _, parameter_names, params_to_match = query
+                fields = [dev, listing] if network is None else [dev, listing, network]
+                for (suffix, key_name, value_reducers, report_fields) in SETUP_RECORDS:
+                    filename = records_filename(data_dir, fw, task_name, suffix)
+                    key = (filename, tuple(parameter_names))
+                    if key not in tables:
+                        tables[key] = _load_records(filename, parameter_names, key_name,
+                                                    list(value_reducers.keys())) \
+                                      if os.path.exists(filename) else None
+                    if tables[key] is None:
+                        continue
+                    summary = _summarize_records(tables[key], params_to_match,
+                                                 key_name, value_reducers)
+                    if summary is None:
+                        continue
+                    for name, field in report_fields.items():
+                        set_nested_field(report, summary[name], field, *fields)
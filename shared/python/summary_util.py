@@ -1,7 +1,8 @@
 """
 Code for writing simple summaries of analyzed data.
 """
-from common import (write_status, write_summary, sort_data, render_exception)
+from common import (write_status, write_summary, render_exception)
+from results_store import sort_data
 
 def summary_by_dev_and_network(data, devs, networks):
     if not devs:
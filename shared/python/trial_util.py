@@ -1,38 +1,60 @@
 import csv
+from collections import deque
 from itertools import product
 import os
 import random
+import threading
 import time
 
 import numpy as np
-import mxnet as mx
-import tensorflow as tf
-import torch as pt
 
 from common import render_exception
+from process_util import Worker, wait_for_workers, rss_mb
+from setup_stats_util import start_recording, stop_recording, setting_up
 
 
-def set_seed(seed):
+# frameworks whose seeds set_seed sets by default
+SEEDED_FRAMEWORKS = ('mxnet', 'tensorflow', 'torch')
+
+# methods whose set-up models cannot be run from several threads at
+# once, so every throughput client thread needs a setup of its own:
+# TVM's graph runtime (like the Relay VM and interpreter) keeps the
+# inputs and outputs of a run in the module, and MXNet's executors
+# are not thread-safe. TF sessions and PyTorch modules in eval mode
+# can be shared by the clients
+PER_CLIENT_SETUP_METHODS = ('relay', 'mxnet')
+
+
+def set_seed(seed, frameworks=SEEDED_FRAMEWORKS):
     # cover our bases: different frameworks and libraries
-    # need to have their seeds set
+    # need to have their seeds set. The frameworks are only
+    # imported here, so that a process can use this module
+    # without loading every framework
     np.random.seed(seed)
-    mx.random.seed(seed)
-    tf.set_random_seed(seed)
-    pt.manual_seed(seed)
     random.seed(seed)
+    if 'mxnet' in frameworks:
+        import mxnet as mx
+        mx.random.seed(seed)
+    if 'tensorflow' in frameworks:
+        import tensorflow as tf
+        tf.set_random_seed(seed)
+    if 'torch' in frameworks:
+        import torch as pt
+        pt.manual_seed(seed)
 
 
-def configure_seed(config):
+def configure_seed(config, frameworks=SEEDED_FRAMEWORKS):
     """
     Convenience for experiment scripts: Takes an experiment config
-    and sets the seed if specified.
+    and sets the seed if specified (for the given frameworks, see
+    set_seed).
 
     Assumes that the config has a boolean field called 'set_seed'
     and an integer field called 'seed' for determining whether to
     set the seed and the value to use.
     """
     if config['set_seed']:
-        set_seed(config['seed'])
+        set_seed(config['seed'], frameworks)
 
 
 def _write_row(writer, fieldnames, fields):
@@ -57,48 +79,650 @@ def _score_loop(num, trial, trial_args, setup_args, n_times, dry_run, writer, fi
     return (final - tic) / n_times
 
 
+def run_rep(rep, trial, trial_args, setup_args, n_times, dry_run, writer, fieldnames):
+    """
+    Times a single rep of an already set-up trial (dry_run untimed
+    calls followed by n_times timed ones), writing each measurement
+    to the writer. For callers that schedule reps themselves rather
+    than going through run_trials. Returns the average cost.
+    """
+    return _score_loop(rep, trial, trial_args, list(setup_args),
+                       n_times, dry_run, writer, fieldnames)
+
+
+def _run_combination(args, trial, trial_setup, trial_teardown,
+                     dry_run, times_per_input, n_input, writer, fieldnames):
+    """
+    Runs every rep of a single parameter combination, writing each
+    measurement to the writer. Returns the average cost of each rep.
+    Exceptions are left to the caller.
+    """
+    costs = []
+    for t in range(n_input):
+        with setting_up(args, t):
+            trial_args = trial_setup(*args)
+        score = _score_loop(t, trial, trial_args, list(args),
+                            times_per_input, dry_run,
+                            writer, fieldnames)
+        trial_teardown(*trial_args)
+
+        if t != n_input - 1:
+            time.sleep(4)
+        costs.append(score)
+    return costs
+
+
+class _PipeWriter:
+    """Stands in for a csv.DictWriter inside a worker: sends rows to the parent"""
+    def __init__(self, send):
+        self.send = send
+
+    def writerow(self, record):
+        self.send(('row', record))
+
+
+def isolation_settings(config):
+    """
+    Reads the optional 'isolation' field of an experiment config
+    and returns it with defaults filled in, or None if isolation
+    is not enabled. The field has the form
+    {
+        "enable": bool,
+        "workers": number of worker processes (default 1),
+        "chunk_size": combinations sent to a worker at a time (default 1),
+        "max_rss_mb": recycle a worker once its RSS exceeds this (default none),
+        "chunks_per_worker": recycle a worker after this many chunks
+                             (default none; 1 means a fresh process per chunk)
+    }
+    """
+    isolation = config.get('isolation', None)
+    if not isolation or not isolation.get('enable', False):
+        return None
+    return {
+        'workers': max(1, int(isolation.get('workers', 1))),
+        'chunk_size': max(1, int(isolation.get('chunk_size', 1))),
+        'max_rss_mb': isolation.get('max_rss_mb', None),
+        'chunks_per_worker': isolation.get('chunks_per_worker', None)
+    }
+
+
+def throughput_settings(config):
+    """
+    Reads the optional 'throughput' field of an experiment config
+    and returns it with defaults filled in, or None if throughput
+    mode is not enabled. The field has the form
+    {
+        "enable": bool,
+        "concurrency": list of numbers of concurrent clients (default [1, 2, 4]),
+        "duration": seconds to keep each concurrency level running (default 10),
+        "reps": times to repeat each concurrency level (default 1),
+        "use_processes": run clients as processes forked before any trial
+                         setup instead of threads, for frameworks that hold
+                         the GIL (default false)
+    }
+    """
+    throughput = config.get('throughput', None)
+    if not throughput or not throughput.get('enable', False):
+        return None
+    return {
+        'concurrency': sorted({max(1, int(n))
+                               for n in throughput.get('concurrency', [1, 2, 4])}),
+        'duration': float(throughput.get('duration', 10)),
+        'reps': max(1, int(throughput.get('reps', 1))),
+        'use_processes': bool(throughput.get('use_processes', False))
+    }
+
+
+def config_trial_options(config):
+    """
+    Returns the keyword arguments to run_trials that are
+    controlled by dashboard-wide experiment config fields.
+    """
+    return {
+        'isolation': isolation_settings(config),
+        'throughput': throughput_settings(config),
+        'resume': config.get('resume_trials', False),
+        'trial_filter': config.get('trial_filter', None)
+    }
+
+
+def filter_combos(parameter_ranges, combos, trial_filter):
+    """
+    Returns the combinations that match at least one entry of
+    trial_filter, a list of lists of values (e.g., the fields of the
+    metrics to rerun, like ['cpu', 'Relay', 'resnet-18']). A combination
+    matches an entry if, for every parameter whose range includes any of
+    the entry's values, the combination's value is one of them; values
+    are compared as lowercase strings, and ones no range includes (like
+    the listing name) are ignored.
+    """
+    ranges = [{str(value).lower() for value in param_range}
+              for param_range in parameter_ranges]
+    requirements = []
+    for entry in trial_filter:
+        named = {str(value).lower() for value in entry}
+        requirements.append([param_range & named for param_range in ranges])
+
+    def matches(args, required):
+        return all(not allowed or str(arg).lower() in allowed
+                   for (arg, allowed) in zip(args, required))
+    return [args for args in combos
+            if any(matches(args, required) for required in requirements)]
+
+
+def _run_isolated(method, task_name, combos, run_combination, writer, isolation):
+    """
+    Runs each combination in a pool of forked worker processes, streaming
+    the measurements back over pipes. The measurements of a combination
+    are held back until it finishes and written by the writer only if it
+    succeeded, so a failed combination leaves no partial reps behind.
+
+    A combination that raises an exception or takes down its worker is
+    recorded as failed and the sweep continues. Workers are replaced when
+    they die, exceed isolation['max_rss_mb'], or have handled
+    isolation['chunks_per_worker'] chunks.
+
+    Returns a list of (args, error message) for the failed combinations.
+    """
+    def handle_chunk(chunk, send):
+        pipe_writer = _PipeWriter(send)
+        for (idx, args) in chunk:
+            try:
+                costs = run_combination(args, pipe_writer)
+                send(('done', idx, costs))
+            except Exception as e:
+                send(('failed', idx,
+                      'Encountered exception in trial on inputs {}:\n'.format(args)
+                      + render_exception(e)))
+        send(('chunk_done', rss_mb()))
+
+    chunk_size = isolation['chunk_size']
+    pending = deque([combos[i:i + chunk_size]
+                     for i in range(0, len(combos), chunk_size)])
+    max_rss = isolation['max_rss_mb']
+    max_chunks = isolation['chunks_per_worker']
+
+    idle = []
+    # worker -> combinations of its current chunk that it has not reported on yet
+    busy = {}
+    # worker -> rows of the combination it is running
+    rows = {}
+    chunks_handled = {}
+    failures = []
+
+    while pending or busy:
+        while pending and len(idle) + len(busy) < isolation['workers']:
+            worker = Worker(handle_chunk)
+            chunks_handled[worker] = 0
+            idle.append(worker)
+        while pending and idle:
+            worker = idle.pop()
+            chunk = pending.popleft()
+            busy[worker] = deque(chunk)
+            rows[worker] = []
+            chunks_handled[worker] += 1
+            worker.send(chunk)
+
+        for worker in wait_for_workers(list(busy.keys())):
+            remaining = busy[worker]
+            try:
+                msg = worker.recv()
+            except EOFError:
+                # the worker died: blame the combination it was running
+                # (if it had not already finished its whole chunk) and
+                # hand the rest of its chunk to a new worker
+                worker.stop()
+                del busy[worker]
+                del rows[worker]
+                if not remaining:
+                    continue
+                idx, args = remaining.popleft()
+                failures.append((args, 'Worker process exited with code {} on inputs {}'.format(
+                    worker.exitcode(), args)))
+                print(method, task_name, args, 'FAILED (worker died)')
+                if remaining:
+                    pending.appendleft(list(remaining))
+                continue
+
+            kind = msg[0]
+            if kind == 'row':
+                rows[worker].append(msg[1])
+            elif kind == 'done':
+                idx, args = remaining.popleft()
+                for row in rows[worker]:
+                    writer.writerow(row)
+                rows[worker] = []
+                print(method, task_name, args, ["%.6f" % x for x in msg[2]])
+            elif kind == 'failed':
+                idx, args = remaining.popleft()
+                rows[worker] = []
+                failures.append((args, msg[2]))
+                print(method, task_name, args, 'FAILED')
+            elif kind == 'chunk_done':
+                del busy[worker]
+                del rows[worker]
+                over_rss = max_rss is not None and msg[1] > max_rss
+                over_chunks = max_chunks is not None and chunks_handled[worker] >= max_chunks
+                if over_rss or over_chunks:
+                    worker.stop()
+                else:
+                    idle.append(worker)
+
+    for worker in idle:
+        worker.stop()
+    return failures
+
+
+def _write_failures(filename, parameter_names, failures, append):
+    write_header = not (append and os.path.exists(filename))
+    with open(filename, 'a' if append else 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        if write_header:
+            writer.writerow(parameter_names + ['error'])
+        for (args, msg) in failures:
+            writer.writerow(list(args) + [msg])
+
+
 def run_trials(method, task_name,
                dry_run, times_per_input, n_input,
                trial, trial_setup, trial_teardown,
                parameter_names, parameter_ranges,
                path_prefix = '',
-               append_to_csv = False):
+               append_to_csv = False,
+               isolation = None,
+               throughput = None,
+               resume = False,
+               trial_filter = None):
+    """
+    Runs every combination of the parameter ranges, writing all
+    measurements to path_prefix/method-task_name.csv.
+
+    If isolation (see isolation_settings) is given, the combinations
+    run in worker processes and a combination that fails is written to
+    path_prefix/method-task_name-failed.csv instead of aborting the
+    sweep, but the sweep still fails if any combination failed (with
+    resume, rerunning it measures just those). Otherwise, the first
+    failure stops the sweep.
+
+    If resume is set and the CSV already exists (e.g., when rerunning
+    a sweep that died partway through), combinations that already have
+    all their measurements in the CSV are skipped and the rest are
+    appended to it; rows of partially measured combinations are dropped.
+
+    If throughput (see throughput_settings) is given, every combination
+    is afterwards also measured under concurrent load (see
+    run_throughput_trials, which resumes the same way), and the message
+    reports on both.
+
+    If trial_filter is given, only the combinations matching it (see
+    filter_combos) are run, e.g., to rerun just the configurations
+    behind some metrics.
+
+    What the trial setup records (e.g., the cost of compilation; see
+    setup_stats_util) is written to path_prefix/method-task_name-setup.csv
+    and path_prefix/method-task_name-graph.csv.
+
+    Returns (success, message)
+    """
+    # the throughput clients are forked before the latency trials set
+    # anything up in this process (see fork_throughput_clients)
+    clients = fork_throughput_clients(trial, trial_setup, trial_teardown, throughput)
+    try:
+        success, msg = _run_latency_trials(method, task_name,
+                                           dry_run, times_per_input, n_input,
+                                           trial, trial_setup, trial_teardown,
+                                           parameter_names, parameter_ranges,
+                                           path_prefix, append_to_csv, isolation, resume,
+                                           trial_filter)
+        if not success or throughput is None:
+            return (success, msg)
+        throughput_success, throughput_msg = run_throughput_trials(
+            method, task_name, dry_run,
+            trial, trial_setup, trial_teardown,
+            parameter_names, parameter_ranges,
+            throughput, path_prefix=path_prefix,
+            append_to_csv=append_to_csv,
+            resume=resume, trial_filter=trial_filter,
+            clients=clients)
+        return (throughput_success,
+                '{}\nThroughput trials: {}'.format(msg, throughput_msg))
+    finally:
+        stop_clients(clients)
+
+
+def _load_checkpoint(filename, n_params, rows_per_combination):
+    """
+    Reads an existing trial CSV and returns the set of parameter
+    combinations (as tuples of strings) that have all their rows.
+    Rewrites the file without the rows of incomplete combinations,
+    so that they can be measured again from scratch.
+    """
+    with open(filename, newline='') as csvfile:
+        lines = list(csv.reader(csvfile))
+
+    def is_measurement(line):
+        try:
+            float(line[-1])
+            return len(line) == n_params + 3
+        except (ValueError, IndexError):
+            return False
+
+    counts = {}
+    for line in lines:
+        if is_measurement(line):
+            key = tuple(line[:n_params])
+            counts[key] = counts.get(key, 0) + 1
+    completed = {key for key, count in counts.items()
+                 if count >= rows_per_combination}
+
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        for line in lines:
+            if not is_measurement(line) or tuple(line[:n_params]) in completed:
+                writer.writerow(line)
+    return completed
+
+
+def _run_latency_trials(method, task_name,
+                        dry_run, times_per_input, n_input,
+                        trial, trial_setup, trial_teardown,
+                        parameter_names, parameter_ranges,
+                        path_prefix, append_to_csv, isolation, resume, trial_filter):
     try:
         filename = os.path.join(path_prefix, '{}-{}.csv'.format(method, task_name))
         if not os.path.exists(os.path.dirname(filename)):
             os.makedirs(os.path.dirname(filename))
-        mode = 'a' if append_to_csv else 'w'
+        all_combos = list(product(*parameter_ranges))
+        if trial_filter is not None:
+            all_combos = filter_combos(parameter_ranges, all_combos, trial_filter)
+        to_run = all_combos
+        success_msg = 'success'
+        resuming = resume and os.path.exists(filename)
+        if resuming:
+            completed = _load_checkpoint(filename, len(parameter_names),
+                                         n_input * times_per_input)
+            to_run = [args for args in all_combos
+                      if tuple(map(str, args)) not in completed]
+            success_msg = 'success: resumed {} and measured {} of {} combinations'.format(
+                len(all_combos) - len(to_run), len(to_run), len(all_combos))
+
+        mode = 'a' if append_to_csv or resuming else 'w'
+        # what the setups record (see setup_stats_util) goes to CSVs of its own
+        start_recording(path_prefix, method, task_name, parameter_names,
+                        append=(mode == 'a'))
         with open(filename, mode, newline='') as csvfile:
             fieldnames = parameter_names + ['rep', 'run', 'time']
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if not append_to_csv:
+            if mode == 'w':
                 writer.writeheader()
 
-            for args in product(*parameter_ranges):
-                costs = []
-                for t in range(n_input):
-                    score = 0.0
-                    try:
-                        trial_args = trial_setup(*args)
-                        score = _score_loop(t, trial, trial_args, list(args),
-                                            times_per_input, dry_run,
-                                            writer, fieldnames)
-                        trial_teardown(*trial_args)
-                    except Exception as e:
-                        # can provide more detailed summary if
-                        # it happened inside a trial
-                        return (False,
-                                'Encountered exception in trial on inputs {}:\n'.format(args)
-                                + render_exception(e))
-
-                    if t != n_input - 1:
-                        time.sleep(4)
-                    costs.append(score)
+            def run_combination(args, combo_writer):
+                return _run_combination(args, trial, trial_setup, trial_teardown,
+                                        dry_run, times_per_input, n_input,
+                                        combo_writer, fieldnames)
+
+            if isolation is not None:
+                combos = list(enumerate(to_run))
+                # flush before forking so buffered rows are not duplicated
+                csvfile.flush()
+                failures = _run_isolated(method, task_name, combos,
+                                         run_combination, writer, isolation)
+                if not failures:
+                    return (True, success_msg)
+
+                _write_failures(
+                    os.path.join(path_prefix, '{}-{}-failed.csv'.format(method, task_name)),
+                    parameter_names, failures, mode == 'a')
+                resumed_note = ''
+                if resuming:
+                    resumed_note = ' (resumed {} others)'.format(len(all_combos) - len(to_run))
+                msg = '{} of {} combinations failed{}:\n{}'.format(
+                    len(failures), len(combos), resumed_note,
+                    '\n'.join([failure_msg for (_, failure_msg) in failures]))
+                return (False, msg)
+
+            for args in to_run:
+                try:
+                    costs = run_combination(args, writer)
+                except Exception as e:
+                    # can provide more detailed summary if
+                    # it happened inside a trial
+                    return (False,
+                            'Encountered exception in trial on inputs {}:\n'.format(args)
+                            + render_exception(e))
 
                 print(method, task_name, args, ["%.6f" % x for x in costs])
-        return (True, 'success')
+        return (True, success_msg)
+    except Exception as e:
+        return (False, 'Encountered exception:\n' + render_exception(e))
+    finally:
+        stop_recording()
+
+
+def _closed_loop(trial, trial_args, dry_run, start, deadline):
+    """
+    Invokes the trial back to back (after dry_run untimed calls) from
+    the start time until the deadline, returning (start, latency) of
+    every call relative to the start time
+    """
+    for i in range(dry_run):
+        trial(*trial_args)
+    time.sleep(max(0.0, start - time.time()))
+
+    timings = []
+    while True:
+        call_start = time.time()
+        if call_start >= deadline:
+            break
+        trial(*trial_args)
+        timings.append((call_start - start, time.time() - call_start))
+    return timings
+
+
+def _run_client_threads(trial, client_args, dry_run, concurrency, start, deadline):
+    results = [None] * concurrency
+
+    def client(idx):
+        # either every thread has a setup of its own or they all share one
+        # (see PER_CLIENT_SETUP_METHODS)
+        trial_args = client_args[idx % len(client_args)]
+        results[idx] = _closed_loop(trial, trial_args, dry_run, start, deadline)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def fork_throughput_clients(trial, trial_setup, trial_teardown, throughput):
+    """
+    Forks the client processes run_throughput_trials uses when
+    use_processes is set (returns None otherwise). Each client sets up
+    every combination itself, so this must happen before the parent
+    sets anything up: framework runtimes (e.g., the thread pools of
+    TensorFlow, MXNet, and TVM) are not in a usable state in a child
+    forked after they started. Stop the clients with stop_clients.
+    """
+    if throughput is None or not throughput['use_processes']:
+        return None
+    state = {}
+
+    def handler(msg, send):
+        try:
+            if msg[0] == 'setup':
+                state['args'] = trial_setup(*msg[1])
+                send(('ok', None))
+            elif msg[0] == 'run':
+                _, dry_run, start, deadline = msg
+                send(('ok', _closed_loop(trial, state['args'], dry_run, start, deadline)))
+            elif msg[0] == 'teardown':
+                trial_teardown(*state.pop('args'))
+                send(('ok', None))
+        except Exception as e:
+            send(('error', render_exception(e)))
+
+    return [Worker(handler) for i in range(max(throughput['concurrency']))]
+
+
+def stop_clients(clients):
+    for client in clients or []:
+        client.stop()
+
+
+def _request(clients, msg):
+    """
+    Sends the message to all the clients and returns their results,
+    raising an exception if any of them failed
+    """
+    for client in clients:
+        client.send(msg)
+    results = []
+    for client in clients:
+        try:
+            status, result = client.recv()
+        except EOFError:
+            raise Exception('Client process exited with code {}'.format(client.exitcode()))
+        if status == 'error':
+            raise Exception(result)
+        results.append(result)
+    return results
+
+
+def _load_throughput_checkpoint(filename, n_params, levels):
+    """
+    Reads an existing throughput CSV and returns the set of parameter
+    combinations (as tuples of strings) that have calls at every
+    (concurrency, rep) level. Rewrites the file without the rows of
+    the other combinations, so that they can be measured again.
+    """
+    with open(filename, newline='') as csvfile:
+        lines = list(csv.reader(csvfile))
+
+    def is_measurement(line):
+        try:
+            float(line[-1])
+            return len(line) == n_params + 6
+        except (ValueError, IndexError):
+            return False
+
+    measured = {}
+    for line in lines:
+        if is_measurement(line):
+            measured.setdefault(tuple(line[:n_params]), set()).add(
+                tuple(line[n_params:n_params + 2]))
+    completed = {key for key, found in measured.items() if found >= levels}
+
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        for line in lines:
+            if not is_measurement(line) or tuple(line[:n_params]) in completed:
+                writer.writerow(line)
+    return completed
+
+
+def run_throughput_trials(method, task_name, dry_run,
+                          trial, trial_setup, trial_teardown,
+                          parameter_names, parameter_ranges,
+                          throughput, path_prefix='', append_to_csv=False,
+                          resume=False, trial_filter=None, clients=None):
+    """
+    Measures every combination of the parameter ranges under closed-loop
+    load: for each concurrency level, that many clients invoke the
+    set-up trial back to back for the configured duration. Every call
+    is written to path_prefix/method-task_name-throughput.csv with its
+    client, start time (relative to the start of the level), and latency.
+
+    Clients are threads by default (fine for frameworks that release
+    the GIL while running), which share one trial setup unless the
+    method is in PER_CLIENT_SETUP_METHODS, in which case every thread
+    has a setup of its own. With use_processes, they are the processes
+    given by clients (see fork_throughput_clients; forked here if not
+    given), each of which sets up every combination itself.
+
+    If resume is set and the CSV already exists, combinations measured
+    at every level are skipped and the rest are appended to it (see
+    run_trials).
+
+    If trial_filter is given, only the matching combinations are
+    measured (see filter_combos).
+
+    Returns (success, message)
+    """
+    forked = False
+    try:
+        if throughput['use_processes'] and clients is None:
+            clients = fork_throughput_clients(trial, trial_setup, trial_teardown, throughput)
+            forked = True
+        filename = os.path.join(path_prefix, '{}-{}-throughput.csv'.format(method, task_name))
+        n_setups = max(throughput['concurrency']) if method in PER_CLIENT_SETUP_METHODS else 1
+
+        combos = list(product(*parameter_ranges))
+        if trial_filter is not None:
+            combos = filter_combos(parameter_ranges, combos, trial_filter)
+        to_run = combos
+        success_msg = 'success'
+        resuming = resume and os.path.exists(filename)
+        if resuming:
+            levels = {(str(concurrency), str(rep))
+                      for concurrency in throughput['concurrency']
+                      for rep in range(throughput['reps'])}
+            completed = _load_throughput_checkpoint(filename, len(parameter_names), levels)
+            to_run = [args for args in combos
+                      if tuple(map(str, args)) not in completed]
+            success_msg = 'success: resumed {} and measured {} of {} combinations'.format(
+                len(combos) - len(to_run), len(to_run), len(combos))
+
+        mode = 'a' if append_to_csv or resuming else 'w'
+        with open(filename, mode, newline='') as csvfile:
+            fieldnames = parameter_names + ['concurrency', 'rep', 'client', 'run', 'start', 'time']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            if mode == 'w':
+                writer.writeheader()
+
+            for args in to_run:
+                client_args = []
+                try:
+                    if clients is not None:
+                        _request(clients, ('setup', args))
+                    else:
+                        for i in range(n_setups):
+                            client_args.append(trial_setup(*args))
+                    rates = []
+                    for concurrency in throughput['concurrency']:
+                        for rep in range(throughput['reps']):
+                            # leave time for the dry runs before the clock starts
+                            start = time.time() + 1
+                            deadline = start + throughput['duration']
+                            if clients is not None:
+                                results = _request(clients[:concurrency],
+                                                   ('run', dry_run, start, deadline))
+                            else:
+                                results = _run_client_threads(trial, client_args, dry_run,
+                                                              concurrency, start, deadline)
+                            for client, timings in enumerate(results):
+                                for run, (call_start, latency) in enumerate(timings):
+                                    _write_row(writer, fieldnames,
+                                               list(args) + [concurrency, rep, client,
+                                                             run, call_start, latency])
+                            rates.append(sum(map(len, results)) / throughput['duration'])
+                    if clients is not None:
+                        _request(clients, ('teardown',))
+                    while client_args:
+                        trial_teardown(*client_args.pop())
+                except Exception as e:
+                    return (False,
+                            'Encountered exception in throughput trial on inputs {}:\n'.format(args)
+                            + render_exception(e))
+
+                print(method, task_name, 'throughput', args, ["%.2f" % x for x in rates])
+        return (True, success_msg)
     except Exception as e:
         return (False, 'Encountered exception:\n' + render_exception(e))
+    finally:
+        if forked:
+            stop_clients(clients)
 
 def _array2str_round(x, decimal=6):
     """ print an array of float number to pretty string with round
@@ -0,0 +1,313 @@
+"""
+Bisects the TVM commits between a good and a bad one to find the first
+that regresses a metric of an experiment.
+
+The candidates are the commits on the ancestry path from the good
+commit to the bad one (git rev-list --ancestry-path). Each commit is
+built with the same script the dashboard uses for TVM branches
+(shared/bash/build_tvm_branch.sh, given 'origin' and the commit) and
+its shared libraries are cached per commit, so a commit is only ever
+built once and the original TVM build is restored at the end. A commit
+that fails to build is skipped, as with git bisect skip.
+
+At each step, a reduced version of the experiment (only the
+configuration behind the metric; see rerun_util.reduce_config) is
+rerun in rounds of the given number of reps. The good and bad commits
+are measured first, until their difference is significant; every other
+commit is then measured until its mean is significantly on one side of
+the midpoint between them (or the round limit is reached, in which case
+the side its mean is on is taken) and the search narrows accordingly.
+
+Also usable from the command line (dashboard/relaybench-bisect wraps it):
+    relaybench-bisect --home-dir ~/dashboard-home --experiment cnn_comp \\
+        --metric cpu/Relay/resnet-18 --good 1a2b3c4 --bad 5d6e7f8
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from common import idemp_mkdir, read_config
+from dashboard_info import DashboardInfo
+from perf_diff import standard_error
+from rerun_util import lookup_metric, reduce_config, run_reduced_experiment
+
+# files under the TVM build directory that are cached for each commit
+BUILD_ARTIFACTS = ['*.so', '*.so.*', '*.dylib']
+
+
+def _git(repo, *args):
+    return subprocess.check_output(['git'] + list(args), cwd=repo).decode('UTF-8').strip()
+
+
+def resolve_commit(repo, rev):
+    return _git(repo, 'rev-parse', '--verify', '{}^{{commit}}'.format(rev))
+
+
+def ancestry_path(repo, good, bad):
+    """
+    Returns the full hashes of the commits that are descendants of good
+    and ancestors of bad (ending with bad itself), oldest first
+    """
+    commits = _git(repo, 'rev-list', '--ancestry-path', '--reverse',
+                   '{}..{}'.format(good, bad))
+    return commits.split() if commits else []
+
+
+def _save_build(tvm_home, cache_dir):
+    build_dir = os.path.join(tvm_home, 'build')
+    tmp_dir = cache_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    idemp_mkdir(tmp_dir)
+    for pattern in BUILD_ARTIFACTS:
+        for path in glob.glob(os.path.join(build_dir, pattern)):
+            shutil.copy2(path, tmp_dir, follow_symlinks=False)
+    # only complete builds end up in the cache
+    os.replace(tmp_dir, cache_dir)
+
+
+def _restore_build(tvm_home, cache_dir):
+    build_dir = os.path.join(tvm_home, 'build')
+    idemp_mkdir(build_dir)
+    for filename in os.listdir(cache_dir):
+        target = os.path.join(build_dir, filename)
+        if os.path.lexists(target):
+            os.remove(target)
+        shutil.copy2(os.path.join(cache_dir, filename), target, follow_symlinks=False)
+
+
+def checkout_build(tvm_home, commit, build_script, cache_dir):
+    """
+    Sets the TVM install at tvm_home to the given commit, reusing the
+    commit's build from cache_dir if it is there and otherwise building
+    it with build_script (and caching the result).
+    Returns (success, message)
+    """
+    commit_cache = os.path.join(cache_dir, commit)
+    if os.path.isdir(commit_cache):
+        _git(tvm_home, 'checkout', '--quiet', commit)
+        _restore_build(tvm_home, commit_cache)
+        return (True, 'restored cached build of {}'.format(commit))
+
+    env = dict(os.environ, TVM_HOME=tvm_home)
+    ret = subprocess.call([build_script, 'origin', commit],
+                          cwd=os.path.dirname(os.path.abspath(build_script)), env=env)
+    if ret != 0:
+        return (False, 'build of {} failed with exit code {}'.format(commit, ret))
+    _save_build(tvm_home, commit_cache)
+    return (True, 'built {}'.format(commit))
+
+
+class Measurer:
+    """
+    Reruns the reduced experiment in rounds and keeps every measurement
+    of the metric, by commit
+    """
+    def __init__(self, experiments_dir, exp_name, config, fields, work_dir, env=None):
+        self.experiments_dir = experiments_dir
+        self.exp_name = exp_name
+        self.config = config
+        self.fields = fields
+        self.work_dir = work_dir
+        self.env = env
+        self.values = {}
+        # standard error reported by the analysis, for when there is only one round
+        self.round_errors = {}
+
+    def run_round(self, commit):
+        success, msg, entry = run_reduced_experiment(
+            self.experiments_dir, self.exp_name, self.config, self.work_dir, env=self.env)
+        if not success:
+            raise Exception('Rerun of {} at {} failed: {}'.format(self.exp_name, commit, msg))
+        value = lookup_metric(entry, self.fields)
+        if not isinstance(value, (int, float)):
+            raise Exception('Metric {} is missing from the rerun of {}'.format(
+                '/'.join(self.fields), self.exp_name))
+        self.values.setdefault(commit, []).append(float(value))
+        self.round_errors[commit] = standard_error(
+            lookup_metric(entry.get('detailed', {}), self.fields))
+        print(commit, 'round', len(self.values[commit]), value)
+
+    def summary(self, commit):
+        """Returns (mean, standard error) of the measurements of the commit so far"""
+        values = self.values[commit]
+        if len(values) > 1:
+            return (float(np.mean(values)), float(np.std(values, ddof=1) / math.sqrt(len(values))))
+        se = self.round_errors[commit]
+        return (values[0], se if se is not None else float('inf'))
+
+
+def bisect(tvm_home, commits, good, build_script, cache_dir, measurer,
+           min_rounds=2, max_rounds=5, z=2.0):
+    """
+    Finds the first regressing commit of commits (the ancestry path from
+    good, ending with the bad commit). Returns a dict with the fields
+    'first_bad' (None if the regression did not reproduce), 'last_good',
+    'skipped' (commits that failed to build), 'untested' (commits
+    between last_good and first_bad that could not be tested),
+    'good_mean', 'bad_mean', 'measurements' (commit -> values), and
+    'message'.
+    """
+    bad = commits[-1]
+
+    def prepare(commit):
+        success, msg = checkout_build(tvm_home, commit, build_script, cache_dir)
+        print(msg)
+        if not success:
+            return False
+        for _ in range(min_rounds):
+            measurer.run_round(commit)
+        return True
+
+    ret = {'first_bad': None, 'last_good': good, 'skipped': [], 'untested': [],
+           'measurements': measurer.values}
+    for endpoint in (good, bad):
+        if not prepare(endpoint):
+            ret['message'] = 'Could not build {}'.format(endpoint)
+            return ret
+
+    # keep measuring the endpoints until they are told apart
+    for _ in range(max_rounds - min_rounds + 1):
+        good_mean, good_se = measurer.summary(good)
+        bad_mean, bad_se = measurer.summary(bad)
+        if abs(bad_mean - good_mean) > z * math.sqrt(good_se ** 2 + bad_se ** 2):
+            break
+        if len(measurer.values[good]) >= max_rounds:
+            ret['good_mean'], ret['bad_mean'] = good_mean, bad_mean
+            ret['message'] = 'No significant difference between {} ({:.4g}) and {} ({:.4g})'.format(
+                good, good_mean, bad, bad_mean)
+            return ret
+        for endpoint in (good, bad):
+            checkout_build(tvm_home, endpoint, build_script, cache_dir)
+            measurer.run_round(endpoint)
+    ret['good_mean'], ret['bad_mean'] = good_mean, bad_mean
+    threshold = (good_mean + bad_mean) / 2
+    increased = bad_mean > good_mean
+
+    def is_bad(commit):
+        while True:
+            mean, se = measurer.summary(commit)
+            if abs(mean - threshold) > z * se or len(measurer.values[commit]) >= max_rounds:
+                return (mean > threshold) == increased
+            measurer.run_round(commit)
+
+    # indices into commits; -1 stands for good
+    lo, hi = -1, len(commits) - 1
+    skipped = set()
+    while True:
+        candidates = [i for i in range(lo + 1, hi) if i not in skipped]
+        if not candidates:
+            break
+        middle = (lo + hi) / 2
+        idx = min(candidates, key=lambda i: abs(i - middle))
+        if not prepare(commits[idx]):
+            skipped.add(idx)
+            ret['skipped'].append(commits[idx])
+            continue
+        if is_bad(commits[idx]):
+            hi = idx
+        else:
+            lo = idx
+
+    ret['first_bad'] = commits[hi]
+    ret['last_good'] = commits[lo] if lo >= 0 else good
+    ret['untested'] = [commits[i] for i in range(lo + 1, hi)]
+    if ret['untested']:
+        ret['message'] = 'First bad commit is one of {} (the rest failed to build)'.format(
+            ', '.join(ret['untested'] + [ret['first_bad']]))
+    else:
+        ret['message'] = 'First bad commit is {}'.format(ret['first_bad'])
+    return ret
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(
+        description='Find the TVM commit that introduced a regression in a metric')
+    parser.add_argument('--experiment', type=str, required=True)
+    parser.add_argument('--metric', type=str, required=True,
+                        help='/-separated fields of the metric, e.g., cpu/Relay/resnet-18')
+    parser.add_argument('--good', type=str, required=True, help='last known good TVM commit')
+    parser.add_argument('--bad', type=str, required=True, help='first known bad TVM commit')
+    location = parser.add_mutually_exclusive_group(required=True)
+    location.add_argument('--home-dir', type=str,
+                          help='dashboard home directory (for the experiment config)')
+    location.add_argument('--config-dir', type=str, help='experiment config directory')
+    parser.add_argument('--experiments-dir', type=str,
+                        default=os.path.join(script_dir, '..', '..', 'experiments'))
+    parser.add_argument('--tvm-home', type=str, default=os.environ.get('TVM_HOME'))
+    parser.add_argument('--build-script', type=str,
+                        default=os.path.join(script_dir, '..', 'bash', 'build_tvm_branch.sh'))
+    parser.add_argument('--cache-dir', type=str, default='~/.cache/relaybench-bisect',
+                        help='where builds are cached by commit')
+    parser.add_argument('--work-dir', type=str, help='scratch directory (default: a new temp dir)')
+    parser.add_argument('--reps', type=int, default=3, help='reps (n_inputs) per round')
+    parser.add_argument('--min-rounds', type=int, default=2)
+    parser.add_argument('--max-rounds', type=int, default=5)
+    parser.add_argument('--set', action='append', default=[], dest='overrides',
+                        help='config override key=JSON value, e.g., networks=\'["resnet-18"]\' '
+                        '(repeatable)')
+    parser.add_argument('--output', type=str, help='write the result as JSON to this file')
+    args = parser.parse_args()
+
+    if args.tvm_home is None:
+        parser.error('--tvm-home is required if TVM_HOME is not set')
+    tvm_home = os.path.expanduser(args.tvm_home)
+    config_dir = args.config_dir
+    if args.home_dir is not None:
+        config_dir = DashboardInfo(os.path.expanduser(args.home_dir)).exp_config_dir(args.experiment)
+    overrides = {}
+    for override in args.overrides:
+        key, _, value = override.partition('=')
+        overrides[key] = json.loads(value)
+
+    fields = args.metric.split('/')
+    config = reduce_config(read_config(os.path.expanduser(config_dir)), [fields],
+                           overrides=overrides, reps=args.reps)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='relaybench-bisect-')
+    cache_dir = os.path.expanduser(args.cache_dir)
+    build_script = os.path.abspath(args.build_script)
+
+    # the experiments need the same environment as in run_dashboard.sh
+    env = dict(os.environ, TVM_HOME=tvm_home,
+               BENCHMARK_DEPS=os.environ.get('BENCHMARK_DEPS',
+                                             os.path.abspath(os.path.join(script_dir, '..'))))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.join(tvm_home, 'python'), os.path.join(tvm_home, 'topi', 'python'),
+         env.get('PYTHONPATH', '')])
+
+    good = resolve_commit(tvm_home, args.good)
+    bad = resolve_commit(tvm_home, args.bad)
+    commits = ancestry_path(tvm_home, good, bad)
+    if not commits:
+        parser.error('{} is not an ancestor of {}'.format(args.good, args.bad))
+
+    # the current build is cached first so it can be put back at the end
+    original = resolve_commit(tvm_home, 'HEAD')
+    if not os.path.isdir(os.path.join(cache_dir, original)):
+        idemp_mkdir(cache_dir)
+        _save_build(tvm_home, os.path.join(cache_dir, original))
+    try:
+        measurer = Measurer(args.experiments_dir, args.experiment, config,
+                            fields, work_dir, env=env)
+        result = bisect(tvm_home, commits, good, build_script, cache_dir, measurer,
+                        min_rounds=args.min_rounds, max_rounds=args.max_rounds)
+    finally:
+        checkout_build(tvm_home, original, build_script, cache_dir)
+
+    print(result['message'])
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=1)
+    return 0 if result['first_bad'] is not None else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,7 +2,8 @@ import os
 from collections import OrderedDict
 
 from common import (invoke_main, write_status, prepare_out_file, time_difference,
-                    read_config, sort_data, render_exception)
+                    read_config, render_exception)
+from results_store import sort_data
 from dashboard_info import DashboardInfo
 from plot_util import PlotBuilder, PlotScale, PlotType, UnitType
 from check_prerequisites import check_prerequisites
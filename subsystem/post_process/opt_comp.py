@@ -2,7 +2,8 @@ import os
 from collections import OrderedDict
 
 from common import (write_status, prepare_out_file, time_difference,
-                    invoke_main, sort_data, render_exception)
+                    invoke_main, render_exception)
+from results_store import sort_data
 from dashboard_info import DashboardInfo
 from plot_util import PlotBuilder, PlotScale, PlotType, UnitType
 from check_prerequisites import check_prerequisites
@@ -2,7 +2,8 @@ import os
 from collections import OrderedDict
 
 from common import (write_status, prepare_out_file, time_difference,
-                    invoke_main, sort_data, render_exception)
+                    invoke_main, render_exception, TIME_IGNORED_FIELDS)
+from results_store import sort_data
 from dashboard_info import DashboardInfo
 from plot_util import PlotBuilder, PlotScale, PlotType, UnitType
 from check_prerequisites import check_prerequisites
@@ -51,7 +52,7 @@ def main(config_dir, home_dir, output_dir):
         'pass_comparison': {
             'networks': networks,
             'passes': [
-                parse_combo(combo) for combo in pass_spec_name_map.keys()
+                parse_pass_combo(combo) for combo in pass_spec_name_map.keys()
             ]
         }
     })
@@ -73,6 +74,9 @@ def main(config_dir, home_dir, output_dir):
 
     try:
         for (dev, raw_dev_data) in raw_data.items():
+            # results other than the mean times per device
+            if dev in TIME_IGNORED_FIELDS:
+                continue
             plot_data = OrderedDict([
                 (pass_spec_name_map[pass_spec], {
                     network_name_map[network]:
@@ -2,7 +2,8 @@ import os
 from collections import OrderedDict
 
 from common import (write_status, prepare_out_file, time_difference,
-                    invoke_main, read_config, sort_data, render_exception)
+                    invoke_main, read_config, render_exception)
+from results_store import sort_data
 from dashboard_info import DashboardInfo
 from plot_util import PlotBuilder, PlotScale, PlotType, UnitType
 from check_prerequisites import check_prerequisites
@@ -53,6 +54,9 @@ def main(config_dir, home_dir, output_dir):
 
     all_data = sort_data(info.exp_data_dir('cnn_comp'))
     raw_data = all_data[-1]['gpu']
+    # if the frameworks were measured in interleaved rounds,
+    # the analysis gives round-by-round (paired) speedups
+    paired = all_data[-1].get('paired_speedup', {}).get('gpu', None)
 
     our_fw = 'Relay'
     other_fws = ['TensorFlow', 'Pytorch', 'MxNet', 'TF XLA']
@@ -67,9 +71,14 @@ def main(config_dir, home_dir, output_dir):
         'vgg-16': 'VGG-16'
     }
 
+    def speedup(fw, network):
+        if paired is not None:
+            return paired[fw][network]
+        return raw_data[fw][network] / raw_data[our_fw][network]
+
     plot_data = OrderedDict([
         (fw_name_map[fw], {
-            network_name_map[network]: raw_data[fw][network] / raw_data[our_fw][network]
+            network_name_map[network]: speedup(fw, network)
             for network in networks})
         for fw in other_fws
     ])
@@ -4,7 +4,8 @@ from collections import OrderedDict
 from common import (write_status, write_json, prepare_out_file,
                     get_timestamp, idemp_mkdir,
                     time_difference, invoke_main, read_config,
-                    sort_data, render_exception)
+                    render_exception)
+from results_store import sort_data
 from dashboard_info import DashboardInfo
 from check_prerequisites import check_prerequisites
 
@@ -4,8 +4,10 @@ dashboard score metrics.
 """
 import os
 
-from common import sort_data, time_difference
-from plot_util import PlotBuilder, PlotScale, PlotType, generate_longitudinal_comparisons, UnitType
+from common import time_difference
+from results_store import sort_data
+from plot_util import (PlotBuilder, PlotScale, PlotType, UnitType,
+                       longitudinal_specs, render_plots)
 from dashboard_info import DashboardInfo
 
 def latest_data(info, exp, dev):
@@ -63,12 +65,12 @@ class ScoreMetric:
         last_two_weeks = [entry for entry in scores
                           if time_difference(most_recent, entry).days < 14]
 
-        generate_longitudinal_comparisons(scores, graph_dir,
-                                          'all_time', stat_name='Score',
-                                          unit_type=UnitType.COMPARATIVE)
-        generate_longitudinal_comparisons(last_two_weeks, graph_dir,
+        render_plots(longitudinal_specs(scores, graph_dir,
+                                        'all_time', stat_name='Score',
+                                        unit_type=UnitType.COMPARATIVE)
+                     + longitudinal_specs(last_two_weeks, graph_dir,
                                           'two_weeks', stat_name='Score',
-                                          unit_type=UnitType.COMPARATIVE)
+                                          unit_type=UnitType.COMPARATIVE))
 
 
 class RNNScore(ScoreMetric):
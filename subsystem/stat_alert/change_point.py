@@ -0,0 +1,186 @@
+"""
+Change-point detection over many metric series at once.
+
+Each series (a row of a metrics x runs matrix, NaN where a run lacks the
+metric) is standardized by its median and MAD, so a handful of noisy
+runs do not inflate the scale the way they inflate the standard
+deviation. A detector then looks for a shift in level that is still
+in effect at the most recent run:
+- 'cusum': two-sided CUSUM over all series at once; a series alarms
+  if either cumulative sum exceeds the threshold at the latest run,
+  and the change is taken to start right after that sum was last zero
+- 'pelt': optimal segmentation of each series into constant-mean
+  segments (PELT) with the given penalty per change; the change is
+  the start of the last segment
+
+Standardized values are clipped (to +/- OUTLIER_CLIP) so that one
+wild run cannot look like a shift by itself. Every candidate change
+gets a p-value from comparing the standardized values before and
+after it, Bonferroni-corrected for the number of places the change
+could have been placed (as the detector picked the most
+favorable one), and the Benjamini-Hochberg procedure controls the
+false discovery rate across all the series tested.
+"""
+import math
+
+import numpy as np
+
+# scales the MAD into a consistent estimate of the std for normal data
+MAD_SCALE = 1.4826
+# standardized values are clipped to this many (robust) stds
+OUTLIER_CLIP = 3.0
+
+
+def robust_standardize(values):
+    """
+    Returns (z-scores, medians, scales) for the rows of values,
+    using each row's median and scaled MAD (falling back on the std
+    for rows whose MAD is 0; constant rows get z-scores of 0)
+    """
+    medians = np.nanmedian(values, axis=1)
+    deviations = values - medians[:, None]
+    scales = MAD_SCALE * np.nanmedian(np.abs(deviations), axis=1)
+    scales = np.where(scales > 0, scales, np.nanstd(values, axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(scales[:, None] > 0, deviations / scales[:, None], 0.0)
+    return np.where(np.isnan(values), np.nan, z), medians, scales
+
+
+def cusum(z, drift=0.5, threshold=5.0):
+    """
+    Two-sided CUSUM over the rows of z (missing values contribute
+    nothing). Returns (array of whether each row has a shift in effect
+    at the last run, array of the index of the run where it started)
+    """
+    num_rows, num_runs = z.shape
+    filled = np.nan_to_num(z)
+    upper = np.zeros(num_rows)
+    lower = np.zeros(num_rows)
+    upper_start = np.zeros(num_rows, dtype=np.int64)
+    lower_start = np.zeros(num_rows, dtype=np.int64)
+    for t in range(num_runs):
+        upper = np.maximum(0.0, upper + filled[:, t] - drift)
+        lower = np.maximum(0.0, lower - filled[:, t] - drift)
+        upper_start[upper == 0] = t + 1
+        lower_start[lower == 0] = t + 1
+
+    alarms = (upper > threshold) | (lower > threshold)
+    starts = np.where(upper >= lower, upper_start, lower_start)
+    return alarms, starts
+
+
+def pelt(series, penalty):
+    """
+    Returns the change points (indices where a new segment starts)
+    of the optimal segmentation of series (with no missing values)
+    into constant-mean segments under squared error, with the given
+    penalty per segment, found with PELT
+    """
+    n = len(series)
+    sums = np.concatenate([[0.0], np.cumsum(series)])
+    squares = np.concatenate([[0.0], np.cumsum(np.square(series))])
+
+    def cost(starts, end):
+        lengths = end - starts
+        segment_sums = sums[end] - sums[starts]
+        return (squares[end] - squares[starts]) - segment_sums ** 2 / lengths
+
+    best = np.zeros(n + 1)
+    best[0] = -penalty
+    last_change = np.zeros(n + 1, dtype=np.int64)
+    candidates = np.array([0], dtype=np.int64)
+    for end in range(1, n + 1):
+        totals = best[candidates] + cost(candidates, end) + penalty
+        i = np.argmin(totals)
+        best[end] = totals[i]
+        last_change[end] = candidates[i]
+        # prune the starts that can never be optimal again
+        keep = best[candidates] + cost(candidates, end) <= best[end]
+        candidates = np.append(candidates[keep], end)
+
+    changes = []
+    end = n
+    while end > 0:
+        end = last_change[end]
+        if end > 0:
+            changes.append(int(end))
+    return sorted(changes)
+
+
+def pelt_starts(z, penalty=None):
+    """
+    Runs PELT on each row of z (skipping missing values). Returns
+    (array of whether each row has any change, array of the index of
+    the run where the last segment starts). The penalty defaults to
+    2 log(number of runs)
+    """
+    num_rows, num_runs = z.shape
+    alarms = np.zeros(num_rows, dtype=bool)
+    starts = np.zeros(num_rows, dtype=np.int64)
+    for row in range(num_rows):
+        present = np.flatnonzero(~np.isnan(z[row]))
+        if len(present) < 2:
+            continue
+        row_penalty = penalty if penalty is not None else 2 * math.log(len(present))
+        changes = pelt(z[row, present], row_penalty)
+        if changes:
+            alarms[row] = True
+            starts[row] = present[changes[-1]]
+    return alarms, starts
+
+
+def shift_p_values(z, starts):
+    """
+    Two-sided p-values for the difference in mean of each row's
+    standardized values before and after its start index (1 where
+    either side is empty), multiplied by the number of possible
+    start indices to account for the start having been chosen
+    """
+    p_values = np.ones(z.shape[0])
+    for row, start in enumerate(starts):
+        before = z[row, :start]
+        after = z[row, start:]
+        before = before[~np.isnan(before)]
+        after = after[~np.isnan(after)]
+        if not len(before) or not len(after):
+            continue
+        diff = np.mean(after) - np.mean(before)
+        se = math.sqrt(1.0 / len(before) + 1.0 / len(after))
+        num_starts = len(before) + len(after) - 1
+        p_values[row] = min(1.0, num_starts * math.erfc(abs(diff / se) / math.sqrt(2)))
+    return p_values
+
+
+def benjamini_hochberg(p_values, fdr=0.05):
+    """
+    Returns a boolean array of which hypotheses are rejected when
+    controlling the false discovery rate at the given level
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    m = len(p_values)
+    if not m:
+        return np.zeros(0, dtype=bool)
+    order = np.argsort(p_values)
+    below = p_values[order] <= fdr * np.arange(1, m + 1) / m
+    rejected = np.zeros(m, dtype=bool)
+    if below.any():
+        cutoff = np.max(np.flatnonzero(below))
+        rejected[order[:cutoff + 1]] = True
+    return rejected
+
+
+def detect_changes(values, detector='cusum', drift=0.5, threshold=5.0, penalty=None):
+    """
+    Looks for level shifts in effect at the last run of each row of
+    values (metrics x runs, NaN where missing). Returns (array of
+    the run index where each row's change starts, array of p-values;
+    1 for rows with no candidate change)
+    """
+    z, _, _ = robust_standardize(values)
+    z = np.clip(z, -OUTLIER_CLIP, OUTLIER_CLIP)
+    if detector == 'pelt':
+        alarms, starts = pelt_starts(z, penalty)
+    else:
+        alarms, starts = cusum(z, drift, threshold)
+    p_values = shift_p_values(z, starts)
+    return starts, np.where(alarms, p_values, 1.0)
@@ -1,20 +1,42 @@
 """
-Subsystem for detecting whether a particular measurement in an
-experiment is more than a standard deviation off from
-its historic mean and producing a report.
+Subsystem for detecting changes in the measurements of experiments
+and producing a report.
+
+By default, looks for shifts in level that are in effect at the most
+recent run using change-point detection over every metric series
+(see change_point.py), controlling the false discovery rate across all
+of them, and reports the TVM commits between which each change started.
+The 'stddev' detector instead reports any measurement that is more than
+a standard deviation off from its historic mean.
+
+Statistics are kept per experiment under (output dir)/state and updated
+with just the new runs of the experiment's series cache on each run
+(see running_stats.py and series_cache.py).
+
+If confirm_reruns is set, the configurations behind each experiment's
+alerts are rerun right away with more reps (while the TVM build that
+produced the results is still in place), and only the alerts whose
+rerun value is closer to the shifted level than to the earlier one are
+reported.
 """
-import itertools
+import datetime
 import os
 import subprocess
 
 import numpy as np
 
 from common import (write_status, write_json, check_file_exists,
-                    get_timestamp, invoke_main, read_config,
-                    sort_data, traverse_fields, gather_stats,
-                    time_difference)
+                    invoke_main, read_config)
 from slack_util import generate_ping_list
 from dashboard_info import DashboardInfo
+from rerun_util import reduce_config, run_reduced_experiment, lookup_metric
+from change_point import detect_changes, benjamini_hochberg
+from series_cache import update_series_cache
+from running_stats import update_running_stats
+
+DETECTORS = {'cusum', 'pelt', 'stddev'}
+BASELINES = {'window', 'all', 'ewma'}
+
 
 def format_report(info, exp_alert, pings):
     ret = ''
@@ -28,9 +50,133 @@ def format_report(info, exp_alert, pings):
         exp_name = conf['title'] if 'title' in conf else exp
 
         ret += 'Alerts for {}:\n'.format(exp_name)
-        for (fields, mean, sd, current) in alert_list:
+        for (fields, description, _, _) in alert_list:
             field_str = ', '.join([str(field) for field in fields])
-            ret += '    ({}): {:.2e} (mean: {:.2e} +/- {:.2e})\n'.format(field_str, current, mean, sd)
+            ret += '    ({}): {}\n'.format(field_str, description)
+    return ret
+
+
+def load_stats(output_dir, info, exp, normalize, capacity, alpha):
+    """
+    Returns the experiment's RunningStats, normalized by calibration if
+    requested and the most recent run has been calibrated
+    """
+    # the dashboard keeps the cache up to date, but make sure
+    cache = update_series_cache(info.exp_series_dir(exp), info.exp_data_dir(exp))
+    if normalize:
+        stats = update_running_stats(os.path.join(output_dir, 'state', exp, 'calibrated'),
+                                     cache, capacity=capacity, alpha=alpha,
+                                     calibrated=True)
+        if stats.meta['latest_calibrated']:
+            return stats
+    return update_running_stats(os.path.join(output_dir, 'state', exp, 'raw'),
+                                cache, capacity=capacity, alpha=alpha)
+
+
+def windowed_series(stats, time_window):
+    """
+    Returns (list of metric fields, metrics x runs array of values,
+    epochs, TVM hashes) for the metrics in the most recent run, over
+    the runs in the time window (in days; all kept runs if < 1)
+    """
+    paths, values, epochs, hashes = stats.window()
+    if time_window >= 1 and len(epochs):
+        days = np.floor((epochs[-1] - epochs) / (24 * 60 * 60))
+        in_window = days <= time_window
+        values = values[:, in_window]
+        epochs = epochs[in_window]
+        hashes = [tvm_hash for (tvm_hash, keep) in zip(hashes, in_window) if keep]
+    return paths, values, epochs, hashes
+
+
+def stddev_alerts(paths, current, means, stds):
+    """
+    Returns (fields, description, earlier level, current level) for
+    every metric whose current value is more than a standard deviation
+    off from its past mean
+    """
+    ret = []
+    for fields, value, mean, std in zip(paths, current, means, stds):
+        if abs(value - mean) > std:
+            ret.append((fields, '{:.2e} (mean: {:.2e} +/- {:.2e})'.format(value, mean, std),
+                        mean, value))
+    return ret
+
+
+def window_baseline(paths, values):
+    """Same as RunningStats.baseline over the given window of runs"""
+    has_past = np.any(~np.isnan(values[:, :-1]), axis=1)
+    past = values[has_past, :-1]
+    return ([fields for (fields, keep) in zip(paths, has_past) if keep],
+            values[has_past, -1], np.nanmean(past, axis=1), np.nanstd(past, axis=1))
+
+
+def describe_run(epochs, hashes, idx):
+    timestamp = datetime.datetime.fromtimestamp(epochs[idx]).strftime('%m-%d-%Y-%H%M')
+    return '{} ({})'.format(hashes[idx] if hashes[idx] else 'unknown commit', timestamp)
+
+
+def change_alert(fields, values, epochs, hashes, start, p_value):
+    """
+    Returns (fields, description, earlier level, current level) for a
+    change starting at the given run
+    """
+    before = np.nanmedian(values[:start])
+    after = np.nanmedian(values[start:])
+    change = (after - before) / before if before != 0 else float('nan')
+    description = '{:.2e} -> {:.2e} ({:+.1%}, p = {:.2g}), starting between {} and {}'.format(
+        before, after, change, p_value,
+        describe_run(epochs, hashes, start - 1), describe_run(epochs, hashes, start))
+    return (fields, description, before, after)
+
+
+def current_tvm_hash():
+    if 'TVM_HOME' not in os.environ:
+        return None
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.environ['TVM_HOME']).decode('UTF-8').strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def confirm_alerts(info, exp, alerts, tvm_hash, reps, work_dir):
+    """
+    Reruns the configurations behind the experiment's alerts with the
+    given number of reps and returns the alerts that the rerun confirms
+    (with the rerun value noted). If the rerun is not possible (the TVM
+    build is not the one the results came from) or fails, returns every
+    alert with a note saying so.
+    """
+    def unconfirmed(reason):
+        return [(fields, '{} [not confirmed: {}]'.format(description, reason), before, after)
+                for (fields, description, before, after) in alerts]
+
+    conf = info.read_exp_config(exp)
+    if conf.get('tvm_remote', 'origin') != 'origin' or conf.get('tvm_branch', 'master') != 'master':
+        return unconfirmed('the experiment uses a TVM branch')
+    if 'EXPERIMENTS_DIR' not in os.environ:
+        return unconfirmed('experiments directory unknown')
+    current_hash = current_tvm_hash()
+    if current_hash is None or tvm_hash is None or not current_hash.startswith(tvm_hash[:7]):
+        return unconfirmed('TVM is no longer at {}'.format(tvm_hash))
+
+    config = reduce_config(conf, [fields for (fields, _, _, _) in alerts], reps=reps)
+    success, msg, entry = run_reduced_experiment(os.environ['EXPERIMENTS_DIR'], exp,
+                                                 config, os.path.join(work_dir, exp))
+    if not success:
+        return unconfirmed('rerun failed')
+
+    ret = []
+    for (fields, description, before, after) in alerts:
+        value = lookup_metric(entry, fields)
+        if not isinstance(value, (int, float)):
+            ret.append((fields, '{} [not confirmed: rerun did not measure it]'.format(
+                description), before, after))
+            continue
+        if abs(value - after) < abs(value - before):
+            ret.append((fields, '{}; confirmed by rerun: {:.2e}'.format(description, value),
+                        before, after))
     return ret
 
 
@@ -48,9 +194,36 @@ def main(config_dir, home_dir, output_dir):
     if 'time_window' in conf:
         time_window = int(conf['time_window'])
     pings = conf['notify'] if 'notify' in conf else []
+    # compare results scaled by the machine's calibration scores,
+    # so that machine-wide slowdowns do not flag every measurement
+    normalize = conf.get('normalize_by_calibration', False)
 
-    # map: exp -> [(fields w/ high SD, historic mean, SD, current)]
+    detector = conf.get('detector', 'cusum')
+    if detector not in DETECTORS:
+        write_status(output_dir, False, 'Unknown detector {} (expected one of {})'.format(
+            detector, ', '.join(sorted(DETECTORS))))
+        return 1
+    # what the stddev detector compares against: the runs in the time window,
+    # every past run, or an exponentially weighted average of them
+    baseline = conf.get('baseline', 'window' if time_window >= 1 else 'all')
+    if baseline not in BASELINES:
+        write_status(output_dir, False, 'Unknown baseline {} (expected one of {})'.format(
+            baseline, ', '.join(sorted(BASELINES))))
+        return 1
+    # number of recent runs kept for the detectors (should cover the time window)
+    capacity = int(conf.get('history_runs', 100))
+    alpha = float(conf.get('ewma_alpha', 0.1))
+    # change detection needs some history to say anything
+    min_runs = int(conf.get('min_runs', 5)) if detector != 'stddev' else 2
+    confirm = conf.get('confirm_reruns', False)
+    confirm_reps = int(conf.get('confirm_reps', 10))
+
+    # map: exp -> [(fields, description of the alert, earlier level, current level)]
     exp_alerts = {}
+    # map: exp -> TVM hash of the most recent run
+    exp_hashes = {}
+    # (exp, fields, values, epochs, hashes, change start, p-value) for every series tested
+    candidates = []
     for exp in info.all_present_experiments():
         if not info.exp_active(exp):
             continue
@@ -62,35 +235,47 @@ def main(config_dir, home_dir, output_dir):
         if not stage_statuses['analysis']['success']:
             continue
 
-        all_data = sort_data(info.exp_data_dir(exp))
-        if len(all_data) <= 1:
+        stats = load_stats(output_dir, info, exp, normalize, capacity, alpha)
+        paths, values, epochs, hashes = windowed_series(stats, time_window)
+        if len(epochs) < min_runs or not paths:
             continue
+        exp_hashes[exp] = hashes[-1]
 
-        exp_alerts[exp] = []
-        most_recent = all_data[-1]
-        past_data = all_data[:-1]
-        if time_window >= 1:
-            past_data = [entry for entry in past_data
-                         if time_difference(most_recent, entry).days <= time_window]
-
-        field_values = traverse_fields(most_recent)
-        for fields in itertools.product(*field_values):
-            current_stat, _ = gather_stats([most_recent], fields)
-            current = current_stat[0]
-            past_stats, _ = gather_stats(past_data, fields)
+        if detector == 'stddev':
+            if baseline == 'window':
+                alerts = stddev_alerts(*window_baseline(paths, values))
+            else:
+                alerts = stddev_alerts(*stats.baseline(baseline))
+            if alerts:
+                exp_alerts[exp] = alerts
+            continue
 
-            past_sd = np.std(past_stats)
-            past_mean = np.mean(past_stats)
-            if abs(current - past_mean) > past_sd:
-                exp_alerts[exp].append((fields, past_mean, past_sd, current))
+        starts, p_values = detect_changes(values, detector,
+                                          drift=float(conf.get('cusum_drift', 0.5)),
+                                          threshold=float(conf.get('cusum_threshold', 5.0)),
+                                          penalty=float(conf['penalty']) if 'penalty' in conf else None)
+        for row, fields in enumerate(paths):
+            candidates.append((exp, fields, values[row], epochs, hashes,
+                               starts[row], p_values[row]))
 
-        if not exp_alerts[exp]:
-            del exp_alerts[exp]
+    # false discovery rate control across every series of every experiment
+    rejected = benjamini_hochberg([candidate[-1] for candidate in candidates],
+                                  float(conf.get('fdr', 0.05)))
+    for (exp, fields, values, epochs, hashes, start, p_value), alert in zip(candidates, rejected):
+        if alert:
+            exp_alerts.setdefault(exp, []).append(
+                change_alert(fields, values, epochs, hashes, start, p_value))
 
+    if confirm:
+        for exp in list(exp_alerts.keys()):
+            exp_alerts[exp] = confirm_alerts(info, exp, exp_alerts[exp], exp_hashes[exp],
+                                             confirm_reps, os.path.join(output_dir, 'confirm'))
+            if not exp_alerts[exp]:
+                del exp_alerts[exp]
 
     if exp_alerts:
         report = {
-            'title': 'High SD Alerts',
+            'title': 'High SD Alerts' if detector == 'stddev' else 'Performance Change Alerts',
             'value': format_report(info, exp_alerts, pings)
         }
         write_json(output_dir, 'report.json', report)
@@ -0,0 +1,253 @@
+"""
+Persistent per-metric statistics for stat_alert, updated incrementally
+so that each night only the new runs are read (from the experiment's
+series cache; see series_cache.py) and the cost of an update is
+proportional to the number of metrics rather than the length of the
+history.
+
+For every metric path of an experiment (as in common.flatten_fields),
+the state keeps:
+- the running count, mean, and sum of squared deviations (Welford)
+  over every run
+- an exponentially weighted mean and variance (weight alpha on the
+  newest run)
+- a ring buffer of the values of the most recent `capacity` runs,
+  along with their epochs and TVM hashes, for the detectors and the
+  time window
+- the running statistics as they were before the most recent run
+  that had the metric, for comparing that run against its past
+
+If calibrated is set, only runs with calibration results are included
+and times are stored divided by the run's calibration index, then
+scaled back by the most recent one's when read, which gives the same
+values as calibration_util.normalize_by_calibration (metrics under
+common.NON_TIME_FIELDS are kept as they are).
+
+The whole state is a single .npz file, replaced atomically after each
+update. Only the number of runs seen and the cache generation are kept
+to tell where to resume, and the per-metric arrays grow geometrically,
+so an update costs the same however long the history is. The state is
+rebuilt from scratch if the parameters change or the cache has been
+rebuilt (e.g., because a data file was removed or an older one showed
+up).
+"""
+import json
+import os
+
+import numpy as np
+
+from common import idemp_mkdir, NON_TIME_FIELDS
+
+STATE_FILENAME = 'state.npz'
+STATE_VERSION = 3
+STAT_ARRAYS = ['count', 'mean', 'm2', 'ewma_mean', 'ewma_var']
+
+
+def path_key(fields):
+    return '/'.join(map(str, fields))
+
+
+class RunningStats:
+    def __init__(self, state_dir, capacity=100, alpha=0.1, calibrated=False):
+        self.state_dir = state_dir
+        self.params = {'version': STATE_VERSION, 'capacity': int(capacity),
+                       'alpha': float(alpha), 'calibrated': bool(calibrated)}
+        self.reset()
+        path = os.path.join(state_dir, STATE_FILENAME)
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                meta = json.loads(str(saved['meta']))
+                if meta['params'] == self.params:
+                    self.meta = meta
+                    self.arrays = {name: saved[name] for name in saved.files
+                                   if name != 'meta'}
+        self.rows = {path_key(fields): i for i, fields in enumerate(self.meta['paths'])}
+
+    def reset(self):
+        capacity = self.params['capacity']
+        self.meta = {
+            'params': self.params,
+            # series cache generation and number of its runs added so far
+            'generation': None,
+            'runs': 0,
+            'paths': [],
+            'last_epoch': None,
+            # position in the ring buffer of the next run and number of runs in it
+            'position': 0,
+            'filled': 0,
+            'tvm_hashes': [None] * capacity,
+            # calibration index of the most recent calibrated run and whether
+            # the most recent run overall was calibrated
+            'reference': 1.0,
+            'latest_calibrated': False
+        }
+        self.arrays = {'ring': np.empty((0, capacity)),
+                       'epochs': np.full(capacity, np.nan)}
+        for name in STAT_ARRAYS:
+            self.arrays[name] = np.empty(0)
+            self.arrays['prev_' + name] = np.empty(0)
+        self.rows = {}
+
+    def __len__(self):
+        return self.meta['filled']
+
+    def _add_path(self, fields):
+        row = len(self.meta['paths'])
+        self.rows[path_key(fields)] = row
+        self.meta['paths'].append(list(fields))
+        allocated = len(self.arrays['count'])
+        if row < allocated:
+            return
+        # the arrays grow geometrically, so adding metrics is amortized constant time
+        size = max(16, 2 * allocated)
+        ring = np.full((size, self.params['capacity']), np.nan)
+        ring[:allocated] = self.arrays['ring']
+        self.arrays['ring'] = ring
+        for name in STAT_ARRAYS:
+            for prefix in ('', 'prev_'):
+                grown = np.zeros(size)
+                grown[:allocated] = self.arrays[prefix + name]
+                self.arrays[prefix + name] = grown
+
+    def _add_run(self, values, epoch, tvm_hash, calibration):
+        """
+        Adds a run, given as a dict of metric fields to values, its
+        epoch, TVM hash, and calibration index (or None)
+        """
+        scale = 1.0
+        if self.params['calibrated']:
+            index = calibration
+            self.meta['latest_calibrated'] = index is not None
+            if index is None:
+                return
+            scale = 1.0 / index
+            self.meta['reference'] = index
+
+        for fields in values:
+            if path_key(fields) not in self.rows:
+                self._add_path(fields)
+        rows = np.array([self.rows[path_key(fields)] for fields in values], dtype=np.int64)
+        x = np.array(list(values.values()), dtype=np.float64)
+        x[self._is_time(rows)] *= scale
+
+        arrays = self.arrays
+        for name in STAT_ARRAYS:
+            arrays['prev_' + name][rows] = arrays[name][rows]
+
+        # Welford's update
+        count = arrays['count'][rows] + 1
+        delta = x - arrays['mean'][rows]
+        mean = arrays['mean'][rows] + delta / count
+        arrays['m2'][rows] += delta * (x - mean)
+        arrays['mean'][rows] = mean
+        arrays['count'][rows] = count
+
+        # exponentially weighted mean and variance, starting from the first value
+        alpha = self.params['alpha']
+        first = count == 1
+        diff = x - arrays['ewma_mean'][rows]
+        ewma_mean = np.where(first, x, arrays['ewma_mean'][rows] + alpha * diff)
+        ewma_var = np.where(first, 0.0,
+                            (1 - alpha) * (arrays['ewma_var'][rows] + alpha * diff ** 2))
+        arrays['ewma_mean'][rows] = ewma_mean
+        arrays['ewma_var'][rows] = ewma_var
+
+        position = self.meta['position']
+        arrays['ring'][:, position] = np.nan
+        arrays['ring'][rows, position] = x
+        arrays['epochs'][position] = epoch
+        self.meta['tvm_hashes'][position] = tvm_hash
+        self.meta['position'] = (position + 1) % self.params['capacity']
+        self.meta['filled'] = min(self.meta['filled'] + 1, self.params['capacity'])
+
+    def update(self, cache, start):
+        """
+        Adds the runs of the series cache from the given position on
+        (sorted by timestamp and at least as recent as every run already
+        added) and saves the state
+        """
+        paths, values, epochs, files, hashes, calibration = cache.runs(start)
+        for i in range(len(files)):
+            present = np.flatnonzero(~np.isnan(values[:, i]))
+            self._add_run({paths[row]: values[row, i] for row in present},
+                          float(epochs[i]), hashes[i], calibration[i])
+            self.meta['last_epoch'] = float(epochs[i])
+        self.meta['generation'] = cache.index['generation']
+        self.meta['runs'] = start + len(files)
+        self.save()
+
+    def save(self):
+        idemp_mkdir(self.state_dir)
+        path = os.path.join(self.state_dir, STATE_FILENAME)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(self.meta)), **self.arrays)
+        os.replace(path + '.tmp', path)
+
+    def _is_time(self, rows):
+        return np.array([self.meta['paths'][row][0] not in NON_TIME_FIELDS
+                         for row in rows], dtype=bool)
+
+    def _scale(self, rows):
+        """Factor by which the stored values in the given rows are scaled when read"""
+        if not self.params['calibrated']:
+            return np.ones(len(rows))
+        return np.where(self._is_time(rows), self.meta['reference'], 1.0)
+
+    def window(self):
+        """
+        Returns (list of the fields of each metric in the most recent run,
+        array of their values with one row per metric and one column per
+        run in the ring buffer, oldest first, epochs, TVM hashes)
+        """
+        filled = self.meta['filled']
+        if not filled:
+            return ([], np.empty((0, 0)), np.empty(0), [])
+        order = (np.arange(filled) + self.meta['position'] - filled) % self.params['capacity']
+        num_paths = len(self.meta['paths'])
+        values = self.arrays['ring'][:num_paths, order] * \
+                 self._scale(np.arange(num_paths))[:, None]
+        current = np.flatnonzero(~np.isnan(values[:, -1]))
+        return ([tuple(self.meta['paths'][row]) for row in current], values[current],
+                self.arrays['epochs'][order], [self.meta['tvm_hashes'][i] for i in order])
+
+    def baseline(self, kind='all'):
+        """
+        Returns (list of the fields of each metric in the most recent run,
+        their values in it, their means and stds over the runs before it).
+        kind is 'all' for the statistics over every earlier run or 'ewma'
+        for the exponentially weighted ones
+        """
+        paths, values, _, _ = self.window()
+        if not paths:
+            return ([], np.empty(0), np.empty(0), np.empty(0))
+        rows = np.array([self.rows[path_key(fields)] for fields in paths], dtype=np.int64)
+        scale = self._scale(rows)
+        count = self.arrays['prev_count'][rows]
+        if kind == 'ewma':
+            means = self.arrays['prev_ewma_mean'][rows]
+            variances = self.arrays['prev_ewma_var'][rows]
+        else:
+            means = self.arrays['prev_mean'][rows]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                variances = self.arrays['prev_m2'][rows] / count
+        has_past = count > 0
+        return ([fields for (fields, keep) in zip(paths, has_past) if keep],
+                values[has_past, -1], means[has_past] * scale[has_past],
+                np.sqrt(variances[has_past]) * scale[has_past])
+
+
+def update_running_stats(state_dir, cache, **params):
+    """
+    Adds the runs of the experiment's series cache (a
+    series_cache.SeriesCache, brought up to date with the data files)
+    that the state has not seen yet, rebuilding it if needed (see above),
+    and returns the RunningStats. params are passed on to RunningStats
+    """
+    stats = RunningStats(state_dir, **params)
+    if stats.meta['generation'] != cache.index['generation'] or \
+       stats.meta['runs'] > len(cache):
+        stats.reset()
+    start = stats.meta['runs']
+    if start < len(cache) or not os.path.exists(os.path.join(state_dir, STATE_FILENAME)):
+        stats.update(cache, start)
+    return stats
@@ -8,8 +8,10 @@ import os
 import shutil
 
 from common import (read_config, write_status, idemp_mkdir,
-                    invoke_main, sort_data)
+                    invoke_main, render_exception)
+from results_store import sort_data
 from dashboard_info import DashboardInfo
+from perf_diff import diff_runs, latest_runs, write_diff
 
 PAGE_PREFIX_TEMPLATE = '''
 <hmtl>
@@ -86,7 +88,7 @@ def main(config_dir, home_dir, out_dir):
     os.chdir(out_dir)
 
     page_prefix = init_page_prefix_template(deadline_config)
-    page_body = gen_page_body(exp_titles, score_titles)
+    page_body = gen_diff_link(info, out_dir) + gen_page_body(exp_titles, score_titles)
     page_suffix = init_page_suffix_template(deadline_config)
     with open(os.path.join(out_dir, 'index.html'), 'w') as f:
         f.write(page_prefix)
@@ -100,6 +102,25 @@ def score_successful(info):
             and info.subsys_stage_status('score', 'run')['success'])
 
 
+def gen_diff_link(info, out_dir):
+    """
+    Writes a diff of the two most recent runs (see perf_diff.py)
+    to diff.html and returns a link to it for the page
+    """
+    # the diff page is a convenience, so failing to make it is not fatal
+    try:
+        latest = latest_runs(info.exp_data)
+        if latest is None:
+            return ''
+        before, after = latest
+        rows = diff_runs(info.exp_data, before, after, sync=False)
+        write_diff(rows, before, after, 'html', os.path.join(out_dir, 'diff.html'))
+    except Exception as e:
+        print(render_exception(e))
+        return ''
+    return '<div align="center"><a href="diff.html">Changes since the previous run ({})</a></div>\n'.format(before)
+
+
 def gen_page_body(exp_titles, score_titles):
     page_body = ''
     for (curr_dir, _, files) in os.walk('./graph'):
@@ -201,6 +222,7 @@ def prepare_exp_data_pages(info, out_dir):
         stage_statuses = info.exp_stage_statuses(exp)
         if 'analysis' not in stage_statuses or not stage_statuses['analysis']['success']:
             continue
+        # the pages show every field of every run
         all_exp_data = sort_data(info.exp_data_dir(exp))
 
         # customize the formatting here so that it's at
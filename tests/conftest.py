@@ -0,0 +1,9 @@
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# the shared modules import each other by name, as the experiment scripts do
+sys.path.insert(0, os.path.join(TEST_DIR, '..', 'shared', 'python'))
+# as do the modules of the subsystems run from their own directories
+sys.path.insert(0, os.path.join(TEST_DIR, '..', 'subsystem', 'stat_alert'))
@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+
+import numpy as np
+
+from analysis_util import (TrialTable, load_trial_table, obtain_data_rows,
+                           robust_summary, bootstrap_cis)
+
+
+def _write_trials(data_dir, filename, rows, append=False):
+    with open(os.path.join(data_dir, filename), 'a' if append else 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['network', 'batch_size', 'rep', 'run', 'time'])
+        writer.writerows(rows)
+
+
+def _rows():
+    rows = []
+    for network in ['resnet-18', 'vgg-16']:
+        for batch_size in [1, 4]:
+            for rep in range(3):
+                for run in range(2):
+                    time = 0.01 * batch_size * (2 if network == 'vgg-16' else 1) + 0.001 * rep
+                    rows.append([network, batch_size, rep, run, time])
+    return rows
+
+
+def test_select_and_rows_match_a_scan(tmp_path):
+    data_dir = str(tmp_path)
+    rows = _rows()
+    # appended runs leave a second header row in the middle
+    _write_trials(data_dir, 'tvm-cnn.csv', rows[:10])
+    _write_trials(data_dir, 'tvm-cnn.csv', rows[10:], append=True)
+    table = TrialTable(os.path.join(data_dir, 'tvm-cnn.csv'), ['network', 'batch_size'])
+    assert len(table) == len(rows)
+
+    selected = table.rows({'network': 'vgg-16', 'batch_size': 4})
+    expected = [row for row in rows if row[0] == 'vgg-16' and row[1] == 4]
+    assert [(row['network'], row['batch_size'], row['rep'], row['run'], float(row['time']))
+            for row in selected] == \
+        [(network, str(batch_size), str(rep), str(run), time)
+         for (network, batch_size, rep, run, time) in expected]
+    assert table.rows({'network': 'mobilenet'}) == []
+    assert len(table.select({})) == len(rows)
+
+
+def test_reps_and_means(tmp_path):
+    data_dir = str(tmp_path)
+    _write_trials(data_dir, 'tvm-cnn.csv', _rows())
+    table = TrialTable(os.path.join(data_dir, 'tvm-cnn.csv'), ['network', 'batch_size'])
+    params = {'network': 'resnet-18', 'batch_size': 1}
+    assert np.allclose(table.rep_means(params, 3), [0.01, 0.011, 0.012])
+    # only the first num_reps reps count
+    assert np.isclose(table.mean(params, 2), 0.0105)
+    summary = table.summarize(params, 2)
+    assert summary['n'] == 4 and summary['num_reps'] == 2
+    assert np.isclose(summary['mean'], 0.0105)
+    assert table.mean({'network': 'mobilenet'}, 3) is None
+
+
+def test_tables_are_reloaded_when_the_file_changes(tmp_path):
+    data_dir = str(tmp_path)
+    rows = _rows()
+    _write_trials(data_dir, 'tvm-cnn.csv', rows)
+    table = load_trial_table(data_dir, 'tvm', 'cnn', ['network', 'batch_size'])
+    assert load_trial_table(data_dir, 'tvm', 'cnn', ['network', 'batch_size']) is table
+
+    _write_trials(data_dir, 'tvm-cnn.csv', rows[:4])
+    # make sure the modification time differs
+    stat = os.stat(os.path.join(data_dir, 'tvm-cnn.csv'))
+    os.utime(os.path.join(data_dir, 'tvm-cnn.csv'), (stat.st_atime, stat.st_mtime + 10))
+    assert len(obtain_data_rows(data_dir, 'tvm', 'cnn', ['network', 'batch_size'], {})) == 4
+
+
+def test_robust_summary():
+    times = [1.0, 1.2, 1.1, 2.0, 2.2, 2.1, 50.0]
+    reps = [0, 0, 0, 1, 1, 1, 1]
+    summary = robust_summary(times, reps)
+    assert summary['n'] == 7 and summary['num_reps'] == 2
+    assert np.isclose(summary['mean'], np.mean(times))
+    assert summary['median'] == 2.0
+    assert np.allclose(summary['rep_means'], [1.1, 14.075])
+    assert np.isclose(summary['between_rep_var'], np.var([1.1, 14.075], ddof=1))
+    assert np.isclose(summary['within_rep_var'],
+                      (np.var(times[:3]) + np.var(times[3:])) / 2)
+    assert summary['num_outliers'] == 1
+    assert summary['mean_ci'][0] <= summary['mean'] <= summary['mean_ci'][1]
+    assert summary['median_ci'][0] <= summary['median'] <= summary['median_ci'][1]
+    # fixed seed, so the intervals are reproducible
+    assert robust_summary(times, reps) == summary
+    # everything can go straight into JSON
+    assert json.loads(json.dumps(summary)) == summary
+
+
+def test_robust_summary_of_nothing():
+    summary = robust_summary([], [])
+    assert summary['n'] == 0 and np.isnan(summary['mean'])
+
+
+def test_bootstrap_cis_narrow_with_more_data():
+    values = np.random.RandomState(1).randn(1000)
+    (low, high), _ = bootstrap_cis(values)
+    (small_low, small_high), _ = bootstrap_cis(values[:50])
+    assert low < 0 < high
+    assert high - low < small_high - small_low
@@ -0,0 +1,58 @@
+import numpy as np
+
+from change_point import (robust_standardize, cusum, pelt, pelt_starts,
+                          benjamini_hochberg, detect_changes)
+
+
+def _series(seed, num_runs=40, shift_at=None, shift=0.0):
+    values = 1.0 + 0.01 * np.random.RandomState(seed).randn(num_runs)
+    if shift_at is not None:
+        values[shift_at:] += shift
+    return values
+
+
+def test_robust_standardize_ignores_outliers_and_missing_values():
+    values = np.array([[1.0, 1.1, 0.9, 1.0, 100.0, np.nan],
+                       [2.0, 2.0, 2.0, 2.0, 2.0, 2.0]])
+    z, medians, scales = robust_standardize(values)
+    assert medians.tolist() == [1.0, 2.0]
+    # one wild run barely moves the scale
+    assert scales[0] < 0.2
+    assert np.isnan(z[0, -1])
+    # constant rows are all zeros
+    assert z[1].tolist() == [0.0] * 6
+
+
+def test_pelt_finds_the_change_points():
+    series = np.concatenate([np.zeros(20), 5 * np.ones(15), np.zeros(10)])
+    assert pelt(series, penalty=2 * np.log(len(series))) == [20, 35]
+    assert pelt(np.zeros(30), penalty=2 * np.log(30)) == []
+
+
+def test_detectors_locate_a_shift_at_the_latest_runs():
+    values = np.vstack([_series(0), _series(1, shift_at=30, shift=0.1)])
+    for detector in ['cusum', 'pelt']:
+        starts, p_values = detect_changes(values, detector=detector)
+        assert starts[1] == 30
+        assert p_values[1] < 1e-3
+        # PELT may split the noise of the first series, but not significantly
+        assert benjamini_hochberg(p_values).tolist() == [False, True]
+
+
+def test_missing_runs_do_not_trigger_alarms():
+    values = _series(2)
+    values[::3] = np.nan
+    z, _, _ = robust_standardize(values[None, :])
+    alarms, _ = cusum(z)
+    assert not alarms.any()
+    alarms, _ = pelt_starts(z)
+    assert not alarms.any()
+
+
+def test_benjamini_hochberg():
+    p_values = [0.001, 0.008, 0.039, 0.041, 0.042, 0.06, 0.074, 0.205, 0.212, 0.216]
+    # the largest rank with p <= 0.05 * rank / 10 is the second
+    assert benjamini_hochberg(p_values).tolist() == [True, True] + [False] * 8
+    assert benjamini_hochberg(p_values[::-1]).tolist() == [False] * 8 + [True, True]
+    assert not benjamini_hochberg([0.5, 0.9]).any()
+    assert benjamini_hochberg([]).tolist() == []
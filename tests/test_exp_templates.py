@@ -0,0 +1,41 @@
+import csv
+import os
+
+from exp_templates import build_result_cube, common_sweep_dims
+
+PARAMETER_NAMES = ['device', 'network', 'batch_size', 'opt_level']
+
+
+def _generate_data_query(config, dev, network, settings):
+    return ('relay', 'cnn_comp', config['n_times_per_input'], PARAMETER_NAMES,
+            {'device': dev, 'network': network, 'batch_size': config['batch_sizes'][0],
+             'opt_level': settings['opt_level']})
+
+
+def test_build_result_cube(tmp_path):
+    data_dir = str(tmp_path)
+    config = {'devices': ['gpu', 'cpu'], 'networks': ['resnet-18'],
+              'batch_sizes': [4, 1], 'n_times_per_input': 2}
+    listing_settings = {'O3': {'opt_level': 3}, 'O0': {'opt_level': 0}}
+    with open(os.path.join(data_dir, 'relay-cnn_comp.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(PARAMETER_NAMES + ['rep', 'run', 'time'])
+        for dev in ['cpu', 'gpu']:
+            for batch_size in [1, 4]:
+                # nothing measured for the GPU at O0 with batch size 4
+                for opt_level in ([0, 3] if dev == 'cpu' or batch_size == 1 else [3]):
+                    time = batch_size * (10 if opt_level == 0 else 1) * (1 if dev == 'cpu' else 0.1)
+                    for rep in range(3):
+                        # the last rep is past n_times_per_input, so it is left out
+                        writer.writerow([dev, 'resnet-18', batch_size, opt_level,
+                                         rep, 0, time + (100 if rep == 2 else 0)])
+
+    sweep_dims = common_sweep_dims([('batch_size', 'batch_sizes')])
+    cube = build_result_cube(config, data_dir, listing_settings, _generate_data_query, sweep_dims)
+    assert cube['dims'] == ['device', 'listing', 'network', 'batch_size']
+    assert cube['coords'] == {'device': ['cpu', 'gpu'], 'listing': ['O0', 'O3'],
+                              'network': ['resnet-18'], 'batch_size': [1, 4]}
+    values = cube['values']
+    assert values[0] == [[[10.0, 40.0]], [[1.0, 4.0]]]
+    assert values[1][0] == [[1.0, None]]
+    assert values[1][1][0][1] == 0.4
@@ -0,0 +1,58 @@
+import math
+import os
+
+from common import write_json
+from perf_diff import diff_entries, diff_runs, latest_runs, standard_error, welch_p_value
+
+
+def _entry(day, times, std=0.1):
+    return {
+        'timestamp': '03-{:02d}-2020-0200'.format(day),
+        'tvm_hash': 'abc{}'.format(day),
+        'cpu': {'Relay': dict(times)},
+        'detailed': {'cpu': {'Relay': {
+            network: {'mean': time, 'std': std, 'n': 100, 'num_reps': 1}
+            for (network, time) in times.items()}}}
+    }
+
+
+def test_standard_error_prefers_reps():
+    assert standard_error({'num_reps': 4, 'between_rep_var': 4.0, 'std': 1.0, 'n': 100}) == 1.0
+    assert standard_error({'num_reps': 1, 'std': 1.0, 'n': 100}) == 0.1
+    assert standard_error({'num_reps': 1, 'n': 1}) is None
+    assert standard_error(None) is None
+
+
+def test_welch_p_value():
+    assert welch_p_value(1.0, 0.1, 1.0, 0.1) == 1.0
+    # two standard errors of the difference apart: p is about 0.05
+    se = math.sqrt(0.005)
+    assert math.isclose(welch_p_value(1.0, se, 1.2, se), math.erfc(2 / math.sqrt(2)))
+    assert welch_p_value(1.0, 0.0, 2.0, 0.0) == 0.0
+
+
+def test_diff_entries():
+    before = _entry(1, {'resnet-18': 1.0, 'vgg-16': 2.0})
+    after = _entry(2, {'resnet-18': 1.5, 'vgg-16': 2.0, 'mobilenet': 1.0})
+    rows = {row['metric']: row for row in diff_entries('cnn_comp', before, after)}
+    # only metrics present in both runs, and not the detailed summaries
+    assert set(rows) == {'cpu/Relay/resnet-18', 'cpu/Relay/vgg-16'}
+    assert rows['cpu/Relay/resnet-18']['change'] == 0.5
+    assert rows['cpu/Relay/resnet-18']['p_value'] < 1e-6
+    assert rows['cpu/Relay/vgg-16']['change'] == 0.0
+    assert rows['cpu/Relay/vgg-16']['p_value'] == 1.0
+
+
+def test_diff_runs_orders_regressions_first(tmp_path):
+    data_dir = os.path.join(str(tmp_path), 'results', 'experiments', 'data')
+    exp_dir = os.path.join(data_dir, 'cnn_comp')
+    os.makedirs(exp_dir)
+    write_json(exp_dir, 'data_1.json', _entry(1, {'a': 1.0, 'b': 1.0, 'c': 0.0}))
+    write_json(exp_dir, 'data_2.json', _entry(2, {'a': 0.5, 'b': 2.0, 'c': 1.0}))
+    assert latest_runs(data_dir) == ('03-01-2020-0200', '03-02-2020-0200')
+
+    rows = diff_runs(data_dir, '03-01-2020-0200', 'abc2')
+    assert [row['metric'] for row in rows] == ['cpu/Relay/b', 'cpu/Relay/a', 'cpu/Relay/c']
+    # the change from 0 is undefined
+    assert rows[-1]['change'] is None
+    assert diff_runs(data_dir, '03-01-2020-0200', 'missing') == []
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+# relay_util needs TVM (and its AoT compiler) to be importable
+pytest.importorskip('tvm')
+from relay_util import graph_stats, fused_ops, NOP_FUNC
+
+OP_NAMES = sorted(['nn_conv2d', 'nn_relu', 'add', 'nn_batch_norm', 'nn_dense', 'reshape'],
+                  key=len, reverse=True)
+
+
+def test_fused_ops():
+    assert fused_ops('fused_nn_conv2d_add_nn_relu_3', OP_NAMES) == ['nn_conv2d', 'add', 'nn_relu']
+    assert fused_ops('fused_reshape', OP_NAMES) == ['reshape']
+    assert fused_ops('fused_unknown_op_1', OP_NAMES) is None
+
+
+def _graph():
+    # data and weight -> conv+relu (twice, in place of each other) -> reshape (a no-op) -> dense
+    nodes = [
+        {'op': 'null', 'name': 'data', 'inputs': []},
+        {'op': 'null', 'name': 'weight', 'inputs': []},
+        {'op': 'tvm_op', 'name': 'conv0', 'attrs': {'func_name': 'fused_nn_conv2d_nn_relu'},
+         'inputs': [[0, 0, 0], [1, 0, 0]]},
+        {'op': 'tvm_op', 'name': 'conv1', 'attrs': {'func_name': 'fused_nn_conv2d_nn_relu'},
+         'inputs': [[2, 0, 0], [1, 0, 0]]},
+        {'op': 'tvm_op', 'name': 'reshape', 'attrs': {'func_name': NOP_FUNC},
+         'inputs': [[3, 0, 0]]},
+        {'op': 'tvm_op', 'name': 'dense', 'attrs': {'func_name': 'fused_nn_dense_add_1'},
+         'inputs': [[4, 0, 0]]},
+    ]
+    return json.dumps({
+        'nodes': nodes,
+        'node_row_ptr': list(range(len(nodes) + 1)),
+        'attrs': {
+            'storage_id': ['list_int', [0, 1, 2, 3, 3, 2]],
+            'shape': ['list_shape', [[1, 3, 8, 8], [3, 3, 3, 3], [1, 3, 8, 8], [1, 3, 8, 8],
+                                     [1, 192], [1, 10]]],
+            'dltype': ['list_str', ['float32'] * 5 + ['float16']]
+        }
+    })
+
+
+def test_graph_stats():
+    stats = graph_stats(_graph(), OP_NAMES)
+    assert stats['kernels'] == 3
+    assert stats['nop_kernels'] == 1
+    assert stats['kernel_types'] == 2
+    assert stats['ops_per_kernel'] == 2.0
+    # the inputs' buffers are not counted; reused buffers count once, at their largest
+    assert stats['allocations'] == 2
+    assert stats['storage_mb'] == 2 * 192 * 4 / (1024 * 1024)
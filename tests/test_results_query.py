@@ -0,0 +1,65 @@
+import os
+
+from common import write_json
+from results_query import query_results, results_to_arrays
+
+
+def _write_runs(tmp_path):
+    data_dir = os.path.join(str(tmp_path), 'results', 'experiments', 'data')
+    for experiment, days in [('cnn_comp', [1, 2, 3]), ('char_rnn', [2])]:
+        exp_dir = os.path.join(data_dir, experiment)
+        os.makedirs(exp_dir)
+        for day in days:
+            write_json(exp_dir, 'data_{}.json'.format(day), {
+                'timestamp': '03-{:02d}-2020-0200'.format(day),
+                'tvm_hash': 'abc{}'.format(day),
+                'cpu': {'Relay': {'resnet-18': float(day)}, 'MxNet': {'resnet-18': 2.0 * day}},
+                'gpu': {'Relay': {'resnet-18': day / 10}},
+                # a device whose name starts with another's
+                'cpu2': {'Relay': {'resnet-18': 3.0 * day}},
+                'compile_time': {'cpu': {'Relay': {'resnet-18': 100.0}}},
+                'time_delta': 3600.0
+            })
+    return data_dir
+
+
+def test_device_and_framework_filters(tmp_path):
+    data_dir = _write_runs(tmp_path)
+    rows = query_results(data_dir, experiments=['cnn_comp'], device='cpu', framework='Relay')
+    assert [(row[0], row[3], row[4], row[5]) for row in rows] == [
+        ('cnn_comp', 'abc{}'.format(day), 'cpu/Relay/resnet-18', float(day))
+        for day in [1, 2, 3]]
+
+
+def test_path_glob_and_ignored_fields(tmp_path):
+    data_dir = _write_runs(tmp_path)
+    rows = query_results(data_dir)
+    assert not any(row[4] == 'time_delta' for row in rows)
+    # setup costs are kept
+    assert any(row[4] == 'compile_time/cpu/Relay/resnet-18' for row in rows)
+
+    assert [row[4] for row in query_results(data_dir, path_glob='time_*')] == \
+        ['time_delta'] * 4
+
+    # as in fnmatch, * also matches across fields
+    rows = query_results(data_dir, path_glob='*/Relay/resnet-*')
+    assert {row[4] for row in rows} == {'cpu/Relay/resnet-18', 'gpu/Relay/resnet-18',
+                                        'cpu2/Relay/resnet-18',
+                                        'compile_time/cpu/Relay/resnet-18'}
+    assert {row[0] for row in rows} == {'cnn_comp', 'char_rnn'}
+
+
+def test_time_and_hash_filters(tmp_path):
+    data_dir = _write_runs(tmp_path)
+    rows = query_results(data_dir, experiments=['cnn_comp'], path_glob='gpu/*',
+                         since='2020-03-02', until='03-03-2020-0200')
+    assert [row[1] for row in rows] == ['03-02-2020-0200', '03-03-2020-0200']
+
+    rows = query_results(data_dir, path_glob='gpu/*', last_hashes=1)
+    assert sorted((row[0], row[3]) for row in rows) == [('char_rnn', 'abc2'),
+                                                        ('cnn_comp', 'abc3')]
+
+    rows = query_results(data_dir, path_glob='gpu/*', tvm_hashes=['abc1'])
+    arrays = results_to_arrays(rows)
+    assert arrays['value'].tolist() == [0.1]
+    assert arrays['experiment'].tolist() == ['cnn_comp']
@@ -0,0 +1,85 @@
+import os
+
+from common import write_json
+from results_store import (ResultsStore, append_data_file, sort_data, sort_data_files,
+                           store_path)
+
+
+def _entry(day, value):
+    return {
+        'timestamp': '03-{:02d}-2020-0200'.format(day),
+        'tvm_hash': 'abc{}'.format(day),
+        # field names like pass specs can hold any character
+        'cpu': {'Relay': {'resnet-18': value, 'FuseOps/FoldConstant': 2 * value}},
+        'detailed': {'cpu': {'Relay': {'resnet-18': {'rep_means': [value, value]}}}},
+        'notes': 'day {}'.format(day),
+        'success': True
+    }
+
+
+def _make_data_dir(tmp_path, days):
+    data_dir = os.path.join(str(tmp_path), 'results', 'experiments', 'data', 'exp')
+    os.makedirs(data_dir)
+    entries = []
+    for day in days:
+        entry = _entry(day, float(day))
+        write_json(data_dir, 'data_{}.json'.format(day), entry)
+        entries.append(entry)
+    return data_dir, entries
+
+
+def test_sort_data_returns_full_entries_by_timestamp(tmp_path):
+    # written out of order, so they can only come back sorted by timestamp
+    data_dir, entries = _make_data_dir(tmp_path, [3, 1, 2])
+    expected = sorted(entries, key=lambda entry: entry['timestamp'])
+    assert sort_data(data_dir) == expected
+    assert os.path.exists(store_path(data_dir))
+    # the second read comes from the store
+    assert sort_data(data_dir) == expected
+
+
+def test_partial_entries_keep_numeric_fields(tmp_path):
+    data_dir, entries = _make_data_dir(tmp_path, [1, 2, 3])
+    partial = sort_data(data_dir, full=False)
+    # only the most recent entry is read in full
+    assert partial[-1] == entries[-1]
+    for entry, original in zip(partial[:-1], entries[:-1]):
+        assert entry == {'timestamp': original['timestamp'],
+                         'tvm_hash': original['tvm_hash'],
+                         'cpu': original['cpu']}
+    # keys containing '/' are not split into nested fields
+    assert partial[0]['cpu']['Relay']['FuseOps/FoldConstant'] == 2.0
+
+
+def test_files_removed_from_the_directory_are_left_out(tmp_path):
+    data_dir, entries = _make_data_dir(tmp_path, [1, 2, 3])
+    sort_data(data_dir)
+    os.remove(os.path.join(data_dir, 'data_2.json'))
+    assert [name for (name, _) in sort_data_files(data_dir)] == ['data_1.json', 'data_3.json']
+
+
+def test_append_data_file_and_metric_history(tmp_path):
+    data_dir, entries = _make_data_dir(tmp_path, [1, 2])
+    sort_data(data_dir)
+    entry = _entry(3, 5.0)
+    write_json(data_dir, 'data_3.json', entry)
+    assert append_data_file(data_dir, 'data_3.json')
+    # already added
+    assert not append_data_file(data_dir, 'data_3.json')
+    with ResultsStore(store_path(data_dir)) as store:
+        assert store.filenames('exp') == {'data_1.json', 'data_2.json', 'data_3.json'}
+        assert store.raw_entry('exp', 'data_3.json') == entry
+        assert store.metric_history('exp', ['cpu', 'Relay', 'FuseOps/FoldConstant']) == \
+            ([2.0, 4.0, 10.0], [entries[0]['timestamp'], entries[1]['timestamp'],
+                                entry['timestamp']])
+        assert store.find_run('exp', tvm_hash='abc2') == entries[1]
+
+
+def test_other_directories_are_read_directly(tmp_path):
+    data_dir = os.path.join(str(tmp_path), 'telemetry')
+    os.makedirs(data_dir)
+    entries = [_entry(2, 1.0), _entry(1, 2.0)]
+    for i, entry in enumerate(entries):
+        write_json(data_dir, 'data_{}.json'.format(i), entry)
+    assert sort_data(data_dir) == [entries[1], entries[0]]
+    assert not os.path.exists(store_path(data_dir))
@@ -0,0 +1,96 @@
+import datetime
+import os
+
+import numpy as np
+
+from common import write_json
+from series_cache import series_dir, update_series_cache
+from running_stats import update_running_stats
+
+START = datetime.datetime(2020, 3, 1)
+
+
+def _add(data_dir, day, time, calibration=None):
+    entry = {
+        'timestamp': (START + datetime.timedelta(days=day)).strftime('%m-%d-%Y-%H%M'),
+        'tvm_hash': 'abc{}'.format(day),
+        'cpu': {'Relay': {'resnet-18': time}},
+        'compile_time': {'cpu': {'Relay': {'resnet-18': 10 * time}}}
+    }
+    if calibration is not None:
+        entry['calibration'] = {'mean': {'gemm': calibration, 'stream': calibration,
+                                         'random_access': calibration}}
+    write_json(data_dir, 'data_{}.json'.format(day), entry)
+
+
+def _setup(tmp_path, times):
+    data_dir = os.path.join(str(tmp_path), 'results', 'experiments', 'data', 'exp')
+    os.makedirs(data_dir)
+    for day, time in enumerate(times):
+        _add(data_dir, day, time)
+    return data_dir
+
+
+def _stats(tmp_path, data_dir, state_name='state', **params):
+    cache = update_series_cache(series_dir(data_dir), data_dir)
+    return update_running_stats(os.path.join(str(tmp_path), state_name), cache,
+                                capacity=4, alpha=0.5, **params)
+
+
+def test_baseline_is_over_the_earlier_runs(tmp_path):
+    times = [1.0, 2.0, 4.0, 3.0, 5.0, 6.0]
+    data_dir = _setup(tmp_path, times)
+    stats = _stats(tmp_path, data_dir)
+    assert len(stats) == 4
+    paths, values, epochs, hashes = stats.window()
+    row = paths.index(('cpu', 'Relay', 'resnet-18'))
+    assert values[row].tolist() == times[-4:]
+    assert hashes == ['abc2', 'abc3', 'abc4', 'abc5']
+    assert np.all(np.diff(epochs) > 0)
+
+    paths, latest, means, stds = stats.baseline()
+    row = paths.index(('cpu', 'Relay', 'resnet-18'))
+    assert latest[row] == 6.0
+    assert np.isclose(means[row], np.mean(times[:-1]))
+    assert np.isclose(stds[row], np.std(times[:-1]))
+
+
+def test_incremental_updates_match_a_rebuild(tmp_path):
+    data_dir = _setup(tmp_path, [1.0, 2.0, 4.0])
+    _stats(tmp_path, data_dir)
+    for day, time in [(3, 3.0), (4, 5.0), (5, 2.5)]:
+        _add(data_dir, day, time)
+        stats = _stats(tmp_path, data_dir)
+    rebuilt = _stats(tmp_path, data_dir, state_name='rebuilt')
+    assert stats.meta['runs'] == rebuilt.meta['runs'] == 6
+    for name in rebuilt.arrays:
+        assert np.allclose(stats.arrays[name], rebuilt.arrays[name], equal_nan=True), name
+
+
+def test_rebuilt_cache_resets_the_state(tmp_path):
+    data_dir = _setup(tmp_path, [1.0, 2.0, 4.0, 3.0])
+    _stats(tmp_path, data_dir)
+    os.remove(os.path.join(data_dir, 'data_0.json'))
+    stats = _stats(tmp_path, data_dir)
+    assert stats.meta['runs'] == 3
+    paths, _, means, _ = stats.baseline()
+    # the mean of the remaining runs before the latest
+    assert np.isclose(means[paths.index(('cpu', 'Relay', 'resnet-18'))], 3.0)
+
+
+def test_calibrated_times_are_scaled_to_the_latest_run(tmp_path):
+    data_dir = os.path.join(str(tmp_path), 'results', 'experiments', 'data', 'exp')
+    os.makedirs(data_dir)
+    # the machine was twice as slow for the first two runs
+    _add(data_dir, 0, 2.0, calibration=2.0)
+    _add(data_dir, 1, 4.0, calibration=2.0)
+    _add(data_dir, 2, 5.0)
+    _add(data_dir, 3, 1.5, calibration=1.0)
+    stats = _stats(tmp_path, data_dir, calibrated=True)
+    # the uncalibrated run is left out
+    assert len(stats) == 3
+    paths, values, _, _ = stats.window()
+    assert values[paths.index(('cpu', 'Relay', 'resnet-18'))].tolist() == [1.0, 2.0, 1.5]
+    # other measurements than times are not scaled
+    assert values[paths.index(('compile_time', 'cpu', 'Relay', 'resnet-18'))].tolist() == \
+        [20.0, 40.0, 15.0]
@@ -0,0 +1,112 @@
+import datetime
+import os
+
+import numpy as np
+
+from common import write_json, metric_series
+from results_store import sort_data
+from series_cache import SeriesCache, series_dir, update_series_cache, INDEX_FILENAME
+
+START = datetime.datetime(2020, 3, 1)
+
+
+def _make_data_dir(tmp_path):
+    data_dir = os.path.join(str(tmp_path), 'results', 'experiments', 'data', 'exp')
+    os.makedirs(data_dir)
+    return data_dir
+
+
+def _add(data_dir, day):
+    entry = {
+        'timestamp': (START + datetime.timedelta(days=day)).strftime('%m-%d-%Y-%H%M'),
+        'tvm_hash': 'abc{}'.format(day),
+        'cpu': {'Relay': {'resnet-18': float(day)}}
+    }
+    # a metric that only some runs have
+    if day % 2:
+        entry['cpu']['MxNet'] = {'resnet-18': 10.0 + day}
+    write_json(data_dir, 'data_{}.json'.format(day), entry)
+    return entry
+
+
+def _assert_matches_data(cache, data_dir):
+    expected = metric_series(sort_data(data_dir))
+    series = cache.metric_series()
+    assert set(series) == set(expected)
+    for fields, (values, times) in expected.items():
+        assert np.allclose(series[fields][0], values)
+        assert series[fields][1] == times
+
+
+def test_new_files_are_appended(tmp_path):
+    data_dir = _make_data_dir(tmp_path)
+    cache_dir = series_dir(data_dir)
+    for day in range(3):
+        _add(data_dir, day)
+    cache = update_series_cache(cache_dir, data_dir)
+    generation = cache.index['generation']
+    assert cache.index['files'] == ['data_0.json', 'data_1.json', 'data_2.json']
+
+    _add(data_dir, 3)
+    cache = update_series_cache(cache_dir, data_dir)
+    # appended rather than rebuilt
+    assert cache.index['generation'] == generation
+    assert len(cache) == 4
+    _assert_matches_data(cache, data_dir)
+    assert np.isnan(cache.column(['cpu', 'MxNet', 'resnet-18'])[0])
+    # a fresh reader sees the same cache
+    assert SeriesCache(cache_dir).index == cache.index
+
+
+def test_removed_file_rebuilds(tmp_path):
+    data_dir = _make_data_dir(tmp_path)
+    cache_dir = series_dir(data_dir)
+    for day in range(4):
+        _add(data_dir, day)
+    generation = update_series_cache(cache_dir, data_dir).index['generation']
+
+    os.remove(os.path.join(data_dir, 'data_1.json'))
+    cache = update_series_cache(cache_dir, data_dir)
+    assert cache.index['generation'] != generation
+    assert cache.index['files'] == ['data_0.json', 'data_2.json', 'data_3.json']
+    _assert_matches_data(cache, data_dir)
+
+
+def test_out_of_order_file_rebuilds(tmp_path):
+    data_dir = _make_data_dir(tmp_path)
+    cache_dir = series_dir(data_dir)
+    for day in [0, 2, 3]:
+        _add(data_dir, day)
+    generation = update_series_cache(cache_dir, data_dir).index['generation']
+
+    # older than the newest cached run, so it cannot just be appended
+    _add(data_dir, 1)
+    cache = update_series_cache(cache_dir, data_dir)
+    assert cache.index['generation'] != generation
+    assert cache.index['files'] == ['data_0.json', 'data_1.json', 'data_2.json', 'data_3.json']
+    assert cache.column(['cpu', 'Relay', 'resnet-18']).tolist() == [0.0, 1.0, 2.0, 3.0]
+    _assert_matches_data(cache, data_dir)
+
+
+def test_corrupt_index_rebuilds(tmp_path):
+    data_dir = _make_data_dir(tmp_path)
+    cache_dir = series_dir(data_dir)
+    for day in range(3):
+        _add(data_dir, day)
+    update_series_cache(cache_dir, data_dir)
+    with open(os.path.join(cache_dir, INDEX_FILENAME), 'w') as f:
+        f.write('{"version": ')
+    cache = update_series_cache(cache_dir, data_dir)
+    assert len(cache) == 3
+    _assert_matches_data(cache, data_dir)
+
+
+def test_metric_series_after_epoch(tmp_path):
+    data_dir = _make_data_dir(tmp_path)
+    for day in range(5):
+        _add(data_dir, day)
+    cache = update_series_cache(series_dir(data_dir), data_dir)
+    series = cache.metric_series(after_epoch=cache.epochs()[2])
+    assert series[('cpu', 'Relay', 'resnet-18')][0] == [3.0, 4.0]
+    # missing from the most recent run, so not included
+    assert ('cpu', 'MxNet', 'resnet-18') not in series
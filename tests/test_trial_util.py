@@ -0,0 +1,66 @@
+import csv
+import os
+
+import trial_util
+from trial_util import run_trials, isolation_settings
+
+
+def _setup(name):
+    # calls made so far, so a trial can fail partway through a rep
+    return [name, [0]]
+
+
+def _trial(name, calls):
+    calls[0] += 1
+    if calls[0] < 2:
+        return
+    if name == 'crash':
+        os._exit(1)
+    if name == 'raise':
+        raise Exception('failed partway through')
+
+
+def _teardown(name, calls):
+    pass
+
+
+def _read_rows(tmp_path, suffix=''):
+    with open(os.path.join(str(tmp_path), 'test-isolated{}.csv'.format(suffix)),
+              newline='') as csvfile:
+        return list(csv.DictReader(csvfile))
+
+
+def test_isolated_failures_leave_no_rows(tmp_path):
+    isolation = isolation_settings({'isolation': {'enable': True}})
+    success, msg = run_trials('test', 'isolated', 0, 3, 1,
+                              _trial, _setup, _teardown,
+                              ['name'], [['ok', 'crash', 'raise', 'fine']],
+                              path_prefix=str(tmp_path), isolation=isolation)
+    # a partly failed sweep is still a failure
+    assert not success
+    assert '2 of 4 combinations failed' in msg
+
+    rows = _read_rows(tmp_path)
+    names = [row['name'] for row in rows]
+    # the failed combinations had measured a row before failing
+    assert 'crash' not in names
+    assert 'raise' not in names
+    assert names.count('ok') == 3
+    assert names.count('fine') == 3
+
+    failed = sorted(row['name'] for row in _read_rows(tmp_path, '-failed'))
+    assert failed == ['crash', 'raise']
+
+
+def test_worker_dying_after_its_chunk_blames_nothing(tmp_path, monkeypatch):
+    # every worker dies after reporting on its whole chunk but before 'chunk_done'
+    monkeypatch.setattr(trial_util, 'rss_mb', lambda: os._exit(1))
+    isolation = isolation_settings({'isolation': {'enable': True, 'chunk_size': 2}})
+    success, msg = run_trials('test', 'isolated', 0, 3, 1,
+                              _trial, _setup, _teardown,
+                              ['name'], [['ok', 'fine', 'good']],
+                              path_prefix=str(tmp_path), isolation=isolation)
+    assert success, msg
+    names = [row['name'] for row in _read_rows(tmp_path)]
+    assert sorted(set(names)) == ['fine', 'good', 'ok']
+    assert len(names) == 9
@@ -0,0 +1,130 @@
+import os
+import stat
+import subprocess
+
+from tvm_bisect import ancestry_path, bisect, Measurer
+
+# stands in for build_tvm_branch.sh: checks out the commit and "builds" it
+# by copying its speed file into build/, failing on commits marked broken
+BUILD_SCRIPT = '''#!/bin/bash
+cd "$TVM_HOME"
+git checkout --quiet "$2"
+if [ -e BROKEN ]; then
+    exit 1
+fi
+mkdir -p build
+cp speed build/libtvm.so
+'''
+
+# stub experiment whose one metric is the speed of the current build
+RUN_SCRIPT = '''#!/bin/bash
+speed=$(cat "$TVM_HOME/build/libtvm.so")
+echo "{\\"cpu\\": {\\"Relay\\": {\\"net\\": $speed}}}" > "$2/data.json"
+echo '{"success": true, "message": "success"}' > "$2/status.json"
+'''
+
+ANALYZE_SCRIPT = '''#!/bin/bash
+cp "$2/data.json" "$3/data.json"
+echo '{"success": true, "message": "success"}' > "$3/status.json"
+'''
+
+
+def _write_script(dirname, filename, contents):
+    path = os.path.join(dirname, filename)
+    with open(path, 'w') as f:
+        f.write(contents)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def _git(repo, *args):
+    return subprocess.check_output(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args),
+        cwd=repo).decode('UTF-8').strip()
+
+
+def _make_tvm_repo(repo, num_commits, first_bad, broken=()):
+    """
+    Makes a repo of num_commits commits whose speed file goes from 1 to 2
+    at the commit of index first_bad, with the commits of the indices in
+    broken failing to build. Returns the commit hashes, oldest first
+    """
+    os.makedirs(repo)
+    _git(repo, 'init', '--quiet')
+    commits = []
+    for i in range(num_commits):
+        with open(os.path.join(repo, 'speed'), 'w') as f:
+            f.write('2.0' if i >= first_bad else '1.0')
+        if i in broken:
+            open(os.path.join(repo, 'BROKEN'), 'w').close()
+        elif os.path.exists(os.path.join(repo, 'BROKEN')):
+            os.remove(os.path.join(repo, 'BROKEN'))
+        _git(repo, 'add', '--all')
+        _git(repo, 'commit', '--quiet', '--allow-empty', '-m', 'commit {}'.format(i))
+        commits.append(_git(repo, 'rev-parse', 'HEAD'))
+    with open(os.path.join(repo, '.git', 'info', 'exclude'), 'a') as f:
+        f.write('build/\n')
+    return commits
+
+
+def _bisect(tmp_path, commits):
+    tmp_path = str(tmp_path)
+    tvm_home = os.path.join(tmp_path, 'tvm')
+    scripts_dir = os.path.join(tmp_path, 'scripts')
+    exp_dir = os.path.join(tmp_path, 'experiments', 'stub')
+    os.makedirs(scripts_dir)
+    os.makedirs(exp_dir)
+    build_script = _write_script(scripts_dir, 'build.sh', BUILD_SCRIPT)
+    _write_script(exp_dir, 'run.sh', RUN_SCRIPT)
+    _write_script(exp_dir, 'analyze.sh', ANALYZE_SCRIPT)
+
+    env = dict(os.environ, TVM_HOME=tvm_home)
+    measurer = Measurer(os.path.join(tmp_path, 'experiments'), 'stub', {},
+                        ['cpu', 'Relay', 'net'], os.path.join(tmp_path, 'work'), env=env)
+    path = ancestry_path(tvm_home, commits[0], commits[-1])
+    assert path == commits[1:]
+    return bisect(tvm_home, path, commits[0], build_script,
+                  os.path.join(tmp_path, 'cache'), measurer)
+
+
+def test_bisect_finds_first_bad_commit(tmp_path):
+    commits = _make_tvm_repo(os.path.join(str(tmp_path), 'tvm'), 10, 6)
+    result = _bisect(tmp_path, commits)
+    assert result['first_bad'] == commits[6]
+    assert result['last_good'] == commits[5]
+    assert result['skipped'] == []
+    assert result['untested'] == []
+    assert result['good_mean'] == 1.0
+    assert result['bad_mean'] == 2.0
+    # the endpoints were only built once, then restored from the cache
+    assert sorted(os.listdir(os.path.join(str(tmp_path), 'cache'))) == \
+        sorted(commit for commit in commits if commit in result['measurements'])
+
+
+def test_bisect_skips_failed_builds(tmp_path):
+    # the first commit tried is the middle one, which fails to build
+    commits = _make_tvm_repo(os.path.join(str(tmp_path), 'tvm'), 10, 3, broken=(4,))
+    result = _bisect(tmp_path, commits)
+    assert result['first_bad'] == commits[3]
+    assert result['last_good'] == commits[2]
+    assert result['skipped'] == [commits[4]]
+    assert result['untested'] == []
+    assert commits[4] not in result['measurements']
+
+
+def test_bisect_reports_untestable_commits(tmp_path):
+    # the commit before the first bad one cannot be built, so either could be first
+    commits = _make_tvm_repo(os.path.join(str(tmp_path), 'tvm'), 10, 6, broken=(5,))
+    result = _bisect(tmp_path, commits)
+    assert result['first_bad'] == commits[6]
+    assert result['last_good'] == commits[4]
+    assert result['skipped'] == [commits[5]]
+    assert result['untested'] == [commits[5]]
+    assert commits[5] in result['message'] and commits[6] in result['message']
+
+
+def test_bisect_stops_if_an_endpoint_does_not_build(tmp_path):
+    commits = _make_tvm_repo(os.path.join(str(tmp_path), 'tvm'), 4, 2, broken=(3,))
+    result = _bisect(tmp_path, commits)
+    assert result['first_bad'] is None
+    assert result['message'] == 'Could not build {}'.format(commits[3])